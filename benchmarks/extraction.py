@@ -0,0 +1,147 @@
+# benchmarks/extraction.py
+"""Field extraction from large pages: full parse into a tree vs the incremental Extractor.
+
+    PYTHONPATH=. python benchmarks/extraction.py [--size-kb 100 1000] [--repeat 3] [--chunk-kb 64]
+
+full:         join the whole body, build a tree of every element, then query it
+incremental:  feed body chunks to Extractor, which stops once the fields are found
+              (fields near the top, like a product page with a long review list)
+to-the-end:   the same Extractor with a field in the page footer, so the whole page is scanned
+
+Peak memory is measured with tracemalloc and covers the body and everything
+built from it; the page itself is generated beforehand.
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from html.parser import HTMLParser
+
+# scraper_server modules import each other by bare name, as they do when run from that directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scraper_server"))
+from extraction import VOID_ELEMENTS, Extractor, Field, compile_fields
+
+FIELDS = {
+    "title": "div.product h1.title",
+    "price": Field("div.product span.price", transform=float),
+    "image": Field("div.product img.main", attr="src"),
+    "rating": "div.product span.rating",
+}
+FOOTER_FIELDS = {**FIELDS, "copyright": "footer p.copyright"}
+
+def make_page(kilobytes: int) -> str:
+    head = (
+        "<html><head><title>Widget</title></head><body>"
+        '<div class="product"><h1 class="title">Big Widget</h1><img class="main" src="/img/widget.png">'
+        '<span class="price">19.99</span><span class="rating">4.5</span></div><div class="reviews">'
+    )
+    review = '<div class="review"><p class="author">Someone</p><p class="body">Works as described, would buy again. <b>5/5</b></p></div>'
+    tail = '</div><footer><p class="copyright">Example Ltd</p></footer></body></html>'
+    count = max(0, (kilobytes * 1024 - len(head) - len(tail)) // len(review))
+    return head + review * count + tail
+
+class Node:
+    __slots__ = ("tag", "attrs", "children")
+
+    def __init__(self, tag: str, attrs: dict):
+        self.tag = tag
+        self.attrs = attrs
+        self.children = []
+
+class TreeBuilder(HTMLParser):
+    # What a plain full parse does: every element and text run kept until the page is queried
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = Node("#document", {})
+        self.stack = [self.root]
+
+    def handle_starttag(self, tag, attrs):
+        node = Node(tag, {name: value or "" for name, value in attrs})
+        self.stack[-1].children.append(node)
+        if tag not in VOID_ELEMENTS:
+            self.stack.append(node)
+
+    def handle_endtag(self, tag):
+        for index in range(len(self.stack) - 1, 0, -1):
+            if self.stack[index].tag == tag:
+                del self.stack[index:]
+                return
+
+    def handle_data(self, data):
+        self.stack[-1].children.append(data)
+
+def text_of(node: Node) -> str:
+    parts = []
+    pending = [node]
+    while pending:
+        item = pending.pop()
+        if isinstance(item, str):
+            parts.append(item)
+        else:
+            pending.extend(reversed(item.children))
+    return " ".join("".join(parts).split())
+
+def query(root: Node, fields: dict) -> dict:
+    values = {}
+    compiled = compile_fields(fields)
+    pending = [(root, [])]
+    while pending and len(values) < len(compiled):
+        node, ancestors = pending.pop()
+        stack = ancestors + [(node.tag, node.attrs)]
+        for name, field in compiled.items():
+            if name not in values and field.selector.matches(stack):
+                raw = node.attrs.get(field.attr) if field.attr else text_of(node)
+                values[name] = field.value(raw)
+        pending.extend((child, stack) for child in reversed(node.children) if isinstance(child, Node))
+    return {name: values.get(name) for name in compiled}
+
+def chunks(page: str, size: int):
+    for start in range(0, len(page), size):
+        yield page[start:start + size]
+
+def full(page: str, chunk_size: int, fields: dict) -> dict:
+    body = "".join(chunks(page, chunk_size))
+    builder = TreeBuilder()
+    builder.feed(body)
+    builder.close()
+    return query(builder.root, fields)
+
+def incremental(page: str, chunk_size: int, fields: dict) -> dict:
+    extractor = Extractor(fields)
+    for chunk in chunks(page, chunk_size):
+        if extractor.feed(chunk):
+            break
+    return extractor.result()
+
+def measure(fn, page: str, chunk_size: int, fields: dict, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(page, chunk_size, fields)
+        best = min(best, time.perf_counter() - started)
+    tracemalloc.start()
+    fn(page, chunk_size, fields)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, best, peak
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-kb", type=int, nargs="+", default=[100, 1000], help="Page sizes")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--chunk-kb", type=int, default=64, help="Size of each body chunk fed to the parser")
+    args = parser.parse_args()
+    chunk_size = args.chunk_kb * 1024
+
+    print(f"{'page KB':>8} {'mode':<12} {'pages/s':>9} {'ms/page':>9} {'peak KB':>9}")
+    for size in args.size_kb:
+        page = make_page(size)
+        expected, _, _ = measure(full, page, chunk_size, FOOTER_FIELDS, 1)
+        for name, fn, fields in (("full", full, FOOTER_FIELDS), ("incremental", incremental, FIELDS), ("to-the-end", incremental, FOOTER_FIELDS)):
+            result, seconds, peak = measure(fn, page, chunk_size, fields, args.repeat)
+            assert result == {field: expected[field] for field in fields}, result
+            print(f"{len(page) // 1024:>8} {name:<12} {1 / seconds:>9.1f} {seconds * 1000:>9.2f} {peak // 1024:>9}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+# benchmarks/fetch_session.py
+"""Scraper HTTP fetches against a local stub site: a fresh client per fetch vs the server's shared Fetcher.
+
+    PYTHONPATH=. python benchmarks/fetch_session.py [--requests 2000] [--concurrency 32] [--pages 200] [--connect-ms 20] [--latency-ms 5] [--size-kb 64] [--change-rate 0.1]
+
+fresh:    new httpx.AsyncClient per fetch (connect + resolve every time, full body every time)
+pooled:   the Fetcher's keep-alive session without conditional requests
+fetcher:  Fetcher.fetch(): keep-alive, cached DNS, per-host limit and ETag revalidation
+
+The stub serves --pages pages with ETags and Last-Modified, answers 304 to
+matching validators, and changes a --change-rate fraction of pages between
+rounds. Loopback connects are free, so each new connection sleeps
+--connect-ms to stand in for the TCP/TLS handshake to a real site.
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import httpx
+
+# scraper_server modules import each other by bare name, as they do when run from that directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scraper_server"))
+from fetcher import Fetcher
+
+class StubSite:
+    def __init__(self, pages: int, size: int, connect_latency: float, latency: float):
+        self.connect_latency = connect_latency
+        self.latency = latency
+        self.size = size
+        self.versions = [0] * pages
+        self.modified = [time.time() - 3600] * pages
+        self.connections = 0
+        self.bytes_sent = 0
+        self.not_modified = 0
+        self.lock = threading.Lock()
+
+    def change(self, fraction: float):
+        for page in random.sample(range(len(self.versions)), int(len(self.versions) * fraction)):
+            self.versions[page] += 1
+            self.modified[page] = time.time()
+
+    def reset_counters(self):
+        with self.lock:
+            self.connections = self.bytes_sent = self.not_modified = 0
+
+    def handler(site):
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with site.lock:
+                    site.connections += 1
+                time.sleep(site.connect_latency)
+
+            def do_GET(self):
+                time.sleep(site.latency)
+                page = int(self.path.rsplit("/", 1)[-1]) % len(site.versions)
+                etag = f'"{page}-{site.versions[page]}"'
+                headers = {"ETag": etag, "Last-Modified": formatdate(site.modified[page], usegmt=True)}
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    for name, value in headers.items():
+                        self.send_header(name, value)
+                    self.end_headers()
+                    with site.lock:
+                        site.not_modified += 1
+                    return
+                seed = hashlib.sha256(etag.encode()).digest()
+                body = seed * (site.size // len(seed) + 1)
+                body = body[:site.size]
+                self.send_response(200)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                with site.lock:
+                    site.bytes_sent += len(body)
+
+            def log_message(self, *args):
+                pass
+        return Handler
+
+def serve(site: StubSite) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), site.handler())
+    server.daemon_threads = True
+    server.request_queue_size = 1024
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+async def fetch_fresh(url: str) -> httpx.Response:
+    async with httpx.AsyncClient() as client:
+        return await client.get(url)
+
+async def drive(fetch, urls, concurrency: int) -> list:
+    latencies = []
+    queue = iter(urls)
+
+    async def worker():
+        for url in queue:
+            started = time.perf_counter()
+            response = await fetch(url)
+            assert response.status_code == 200, response.status_code
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies
+
+async def bench(name: str, fetch, site: StubSite, args, base_url: str) -> dict:
+    random.seed(1)
+    site.versions = [0] * args.pages
+    site.reset_counters()
+    rounds = max(1, args.requests // args.pages)
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(rounds):
+        # Every round re-scrapes the whole site, as a periodic crawl would
+        urls = [f"{base_url}/page/{page}" for page in random.sample(range(args.pages), args.pages)]
+        latencies += await drive(fetch, urls, args.concurrency)
+        site.change(args.change_rate)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "name": name,
+        "requests": len(latencies),
+        "rps": len(latencies) / elapsed,
+        "p50": statistics.median(latencies) * 1000,
+        "p95": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "connections": site.connections,
+        "mb": site.bytes_sent / (1024 * 1024),
+        "not_modified": site.not_modified,
+    }
+
+async def main_async(args):
+    site = StubSite(args.pages, args.size_kb * 1024, args.connect_ms / 1000, args.latency_ms / 1000)
+    server = serve(site)
+    # "localhost" rather than the IP so the fresh client pays for a lookup like it would against a real site
+    base_url = f"http://localhost:{server.server_address[1]}"
+    results = [await bench("fresh", fetch_fresh, site, args, base_url)]
+
+    for name in ("pooled", "fetcher"):
+        # A new Fetcher per mode so neither starts with warm connections or cached pages
+        fetcher = Fetcher(per_host_limit=args.concurrency, max_keepalive_connections=args.concurrency)
+        fetcher.start()
+        fetch = fetcher.session().get if name == "pooled" else fetcher.fetch
+        results.append(await bench(name, fetch, site, args, base_url))
+        await fetcher.close()
+    server.shutdown()
+
+    print(f"{'mode':<9} {'requests':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'conns':>6} {'MB sent':>8} {'304s':>6}")
+    for result in results:
+        print(f"{result['name']:<9} {result['requests']:>8} {result['rps']:>8.0f} {result['p50']:>8.1f} {result['p95']:>8.1f} {result['connections']:>6} {result['mb']:>8.1f} {result['not_modified']:>6}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000, help="Total fetches per mode (rounded to whole crawls of --pages)")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--connect-ms", type=float, default=20.0, help="Simulated handshake cost of a new connection")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="Server think time per request")
+    parser.add_argument("--size-kb", type=int, default=64, help="Page size")
+    parser.add_argument("--change-rate", type=float, default=0.1, help="Fraction of pages changed between crawls")
+    asyncio.run(main_async(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+# benchmarks/load_test.py
+"""End-to-end load test of /submit: license check, balancing and scraping.
+
+    PYTHONPATH=. python benchmarks/load_test.py [--servers 2] [--rps 200] [--duration 30]
+    PYTHONPATH=. python benchmarks/load_test.py --replay traffic.jsonl [--rps 200]
+
+Starts license_server, public_server and N scraper servers on localhost with
+generated configs, and a synthetic scraper that sleeps for --io-latency and
+burns --cpu-ms of CPU per job. Requests are sent open-loop at the target rate
+and latency is measured from each request's scheduled send time, so a stalled
+server shows up as latency instead of a lower send rate. The per-phase split
+comes from the Server-Timing header of /submit.
+
+Each line of a replay file is a /submit body ({"scraper_name", "params"},
+optionally "license_key" and "at", the send time in seconds from the start).
+Lines without "at" are spread at --rps; lines that are not /submit bodies are
+skipped. The synthetic scraper honours "io_latency", "cpu_seconds" and
+"response_bytes" in params, so recorded traffic can carry its own costs.
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from typing import Dict, Iterator, List, Optional, Tuple
+import httpx
+from common.metrics import parse_server_timing
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONFIG_DIR = os.path.join(ROOT, "config")
+SCRAPER_NAME = "bench_scraper"
+LICENSE_KEY = "bench-license"
+REGISTRY_TOKEN = "bench-registry-token"
+PHASES = ("client", "total", "license", "select", "upstream", "scrape")
+
+SYNTHETIC_SCRAPER = '''# Generated by benchmarks/load_test.py
+import asyncio
+import time
+
+MODE = {mode!r}
+CONCURRENCY = {concurrency}
+CACHE_TTL = 0
+IDEMPOTENT = True
+
+IO_LATENCY = {io_latency}
+CPU_SECONDS = {cpu_seconds}
+RESPONSE_BYTES = {response_bytes}
+
+def burn(seconds):
+    # thread_time so concurrent jobs in other threads don't shorten this one
+    deadline = time.thread_time() + seconds
+    while time.thread_time() < deadline:
+        pass
+
+def result(params):
+    return {{"payload": "x" * params.get("response_bytes", RESPONSE_BYTES)}}
+'''
+
+SYNC_RUN = '''
+def run(params):
+    time.sleep(params.get("io_latency", IO_LATENCY))
+    burn(params.get("cpu_seconds", CPU_SECONDS))
+    return result(params)
+'''
+
+ASYNC_RUN = '''
+async def run(params):
+    await asyncio.sleep(params.get("io_latency", IO_LATENCY))
+    burn(params.get("cpu_seconds", CPU_SECONDS))
+    return result(params)
+'''
+
+def uvicorn_command(port: int) -> List[str]:
+    return ["-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--no-access-log", "--log-level", "warning"]
+
+def load_config(name: str) -> dict:
+    with open(os.path.join(CONFIG_DIR, name)) as f:
+        return json.load(f)
+
+def write_json(path: str, data: dict) -> str:
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+    return path
+
+class Cluster:
+    """license_server, public_server and N scraper servers running as local subprocesses."""
+
+    def __init__(self, args, workdir: str):
+        self.args = args
+        self.workdir = workdir
+        self.license_port = args.base_port
+        self.public_port = args.base_port + 1
+        self.scraper_ports = [args.base_port + 2 + i for i in range(args.servers)]
+        self.admin_uuid = str(uuid.uuid4())
+        self.processes: List[Tuple[str, subprocess.Popen, str]] = []
+        self.startup: Dict[str, float] = {}  # Service -> seconds from process start to ready, from its /readyz
+
+    @property
+    def public_url(self) -> str:
+        return f"http://127.0.0.1:{self.public_port}"
+
+    @property
+    def license_url(self) -> str:
+        return f"http://127.0.0.1:{self.license_port}"
+
+    def write_configs(self) -> Dict[str, str]:
+        paths = {}
+        config = load_config("license_server_config.json")
+        config["license_server"].update(ip="127.0.0.1", port=self.license_port, database_url=f"sqlite:///{self.workdir}/licenses.db")
+        paths["license_server"] = write_json(os.path.join(self.workdir, "license_server_config.json"), config)
+
+        config = load_config("public_server_config.json")
+        config["license_server"] = {"ip": "127.0.0.1", "port": self.license_port}
+        config["scraper_servers"] = []
+        config["registry"] = {"token": REGISTRY_TOKEN}
+        config["public_server"].update(ip="127.0.0.1", port=self.public_port, admin_uuid=self.admin_uuid)
+        config["job_queue"]["path"] = os.path.join(self.workdir, "jobs.db")
+        config.setdefault("usage_stats", {})["path"] = os.path.join(self.workdir, "usage_stats.db")
+        config["result_cache"].update(enabled=self.args.cache, disk_path=None)
+        paths["public_server"] = write_json(os.path.join(self.workdir, "public_server_config.json"), config)
+
+        for i, port in enumerate(self.scraper_ports):
+            config = load_config("scraper_server_1_config.json")
+            server = config["scraper_server"]
+            server.update(name=f"bench_scraper_server_{i + 1}", ip="127.0.0.1", port=port, allowed_scrapers=["all"], access_log=False)
+            server["public_server"] = {"ip": "127.0.0.1", "port": self.public_port}
+            server["job_queue"]["enabled"] = False
+            server["registration"].update(enabled=True, token=REGISTRY_TOKEN)
+            paths[server["name"]] = write_json(os.path.join(self.workdir, f"{server['name']}_config.json"), config)
+        return paths
+
+    def write_scraper(self) -> str:
+        directory = os.path.join(self.workdir, "scrapers")
+        os.makedirs(directory, exist_ok=True)
+        source = SYNTHETIC_SCRAPER.format(
+            mode=self.args.mode,
+            concurrency=self.args.scraper_concurrency,
+            io_latency=self.args.io_latency,
+            cpu_seconds=self.args.cpu_ms / 1000,
+            response_bytes=self.args.response_bytes,
+        ) + (ASYNC_RUN if self.args.mode == "async" else SYNC_RUN)
+        with open(os.path.join(directory, f"{SCRAPER_NAME}.py"), "w") as f:
+            f.write(source)
+        return directory
+
+    def spawn(self, name: str, service_dir: str, command: List[str], env: Dict[str, str]):
+        log_path = os.path.join(self.workdir, f"{name}.log")
+        log = open(log_path, "w")
+        process = subprocess.Popen(
+            [sys.executable, *command],
+            cwd=os.path.join(ROOT, service_dir),
+            env={**os.environ, "PYTHONPATH": ROOT, "LOG_LEVEL": self.args.log_level, **env},
+            stdout=log,
+            stderr=subprocess.STDOUT,
+        )
+        log.close()
+        self.processes.append((name, process, log_path))
+
+    def wait_until(self, description: str, check, timeout: float = 30.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            for name, process, log_path in self.processes:
+                if process.poll() is not None:
+                    with open(log_path) as f:
+                        raise RuntimeError(f"{name} exited during startup:\n{f.read()[-2000:]}")
+            try:
+                if check():
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError(f"Timed out waiting for {description}")
+
+    def wait_ready(self, name: str, base_url: str):
+        self.wait_until(name, lambda: httpx.get(f"{base_url}/readyz").status_code == 200)
+        self.startup[name] = httpx.get(f"{base_url}/readyz").json()["startup_seconds"]
+
+    def start(self):
+        paths = self.write_configs()
+        scrapers = self.write_scraper()
+        self.spawn("license_server", "license_server", uvicorn_command(self.license_port), {"LICENSE_SERVER_CONFIG": paths["license_server"]})
+        self.wait_ready("license_server", self.license_url)
+        response = httpx.post(f"{self.license_url}/create_license", json={
+            "key": LICENSE_KEY,
+            "valid_until": "2999-12-31",
+            "scrapers": ["all"],
+            "usage_per_month": 10 ** 12,
+        })
+        response.raise_for_status()
+
+        self.spawn("public_server", "public_server", uvicorn_command(self.public_port), {"PUBLIC_SERVER_CONFIG": paths["public_server"]})
+        self.wait_ready("public_server", self.public_url)
+        for i, port in enumerate(self.scraper_ports):
+            name = f"bench_scraper_server_{i + 1}"
+            command = ["run.py", "--config", paths[name], "--scraper-dir", scrapers, "--workers", str(self.args.scraper_workers)]
+            self.spawn(name, "scraper_server", command, {})
+        for i, port in enumerate(self.scraper_ports):
+            self.wait_ready(f"bench_scraper_server_{i + 1}", f"http://127.0.0.1:{port}")
+        self.wait_until(
+            f"{len(self.scraper_ports)} scraper servers to register",
+            lambda: len(httpx.get(f"{self.public_url}/server_loads").json()["servers"]) == len(self.scraper_ports),
+        )
+
+    def stop(self):
+        # Reverse start order, so public_server can still flush usage to license_server on shutdown
+        for _, process, _ in reversed(self.processes):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        self.processes = []
+
+def synthetic_schedule(rps: float, duration: float) -> Iterator[Tuple[float, dict]]:
+    # Distinct params per request so the result cache (if enabled) never short-circuits a scrape
+    for i in range(int(rps * duration)):
+        yield i / rps, {"license_key": LICENSE_KEY, "scraper_name": SCRAPER_NAME, "params": {"request": i}}
+
+def replay_schedule(path: str, rps: float) -> Iterator[Tuple[float, dict]]:
+    index = 0
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if not isinstance(record, dict) or "scraper_name" not in record or not isinstance(record.get("params", {}), dict):
+                continue
+            at = record.get("at", index / rps)
+            index += 1
+            yield float(at), {
+                "license_key": record.get("license_key", LICENSE_KEY),
+                "scraper_name": record["scraper_name"],
+                "params": record.get("params", {}),
+            }
+
+async def send(client: httpx.AsyncClient, body: dict, scheduled: float, results: list):
+    try:
+        response = await client.post("/submit", json=body)
+        status = str(response.status_code)
+        timings = parse_server_timing(response.headers.get("Server-Timing"))
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+        timings = {}
+    timings["client"] = time.perf_counter() - scheduled
+    results.append((status, timings))
+
+async def drive(base_url: str, schedule: Iterator[Tuple[float, dict]], warmup: int, max_connections: int, timeout: float) -> Tuple[list, float]:
+    limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout) as client:
+        # Warm-up fills connection pools, the license cache and the balancer's latency windows
+        for i in range(warmup):
+            await client.post("/submit", json={"license_key": LICENSE_KEY, "scraper_name": SCRAPER_NAME, "params": {"warmup": i}})
+        results = []
+        tasks = set()
+        start = time.perf_counter()
+        for at, body in schedule:
+            scheduled = start + at
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            task = asyncio.create_task(send(client, body, scheduled, results))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.wait(tasks)
+        return results, time.perf_counter() - start
+
+def percentile(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))]
+
+def summarize(results: list, elapsed: float, target_rps: Optional[float]) -> dict:
+    statuses: Dict[str, int] = {}
+    for status, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    ok = [timings for status, timings in results if status == "200"]
+    phases = {}
+    for phase in PHASES:
+        values = [timings[phase] for timings in ok if phase in timings]
+        if values:
+            phases[phase] = {
+                "count": len(values),
+                "mean": sum(values) / len(values),
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "p99": percentile(values, 99),
+            }
+    return {
+        "requests": len(results),
+        "statuses": statuses,
+        "elapsed": elapsed,
+        "target_rps": target_rps,
+        "throughput": len(ok) / elapsed if elapsed else 0.0,
+        "phases": phases,
+    }
+
+def print_summary(summary: dict):
+    startup = "  ".join(f"{name} {seconds:.2f}s" for name, seconds in summary.get("startup", {}).items())
+    print(f"startup:    {startup}")
+    print(f"requests:   {summary['requests']}  statuses: {summary['statuses']}")
+    target = f" (target {summary['target_rps']:.0f})" if summary["target_rps"] else ""
+    print(f"throughput: {summary['throughput']:.1f} ok/s over {summary['elapsed']:.1f}s{target}")
+    print(f"{'phase':>10} {'count':>7} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for phase, stats in summary["phases"].items():
+        print(
+            f"{phase:>10} {stats['count']:>7} {stats['mean'] * 1000:>9.2f} {stats['p50'] * 1000:>9.2f} "
+            f"{stats['p95'] * 1000:>9.2f} {stats['p99'] * 1000:>9.2f}"
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--servers", type=int, default=2, help="Scraper servers to start")
+    parser.add_argument("--scraper-workers", type=int, default=1, help="Worker processes per scraper server")
+    parser.add_argument("--rps", type=float, default=100.0, help="Target requests per second")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of synthetic traffic")
+    parser.add_argument("--replay", help="JSONL file of /submit bodies to send instead of synthetic traffic")
+    parser.add_argument("--io-latency", type=float, default=0.02, help="Seconds the synthetic scraper waits per job")
+    parser.add_argument("--cpu-ms", type=float, default=1.0, help="CPU milliseconds the synthetic scraper burns per job")
+    parser.add_argument("--response-bytes", type=int, default=1024)
+    parser.add_argument("--mode", choices=("async", "thread", "process"), default="thread", help="Synthetic scraper MODE")
+    parser.add_argument("--scraper-concurrency", type=int, default=64, help="Synthetic scraper CONCURRENCY per server")
+    parser.add_argument("--cache", action="store_true", help="Enable public_server's result cache")
+    parser.add_argument("--warmup", type=int, default=20, help="Sequential requests sent before measuring")
+    parser.add_argument("--max-connections", type=int, default=500)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--base-port", type=int, default=18000, help="license_server port; the others follow")
+    parser.add_argument("--log-level", default="WARNING", help="LOG_LEVEL of the services")
+    parser.add_argument("--json", help="Also write the summary to this file, e.g. to compare runs")
+    parser.add_argument("--keep", action="store_true", help="Keep the working directory (configs, logs, databases)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="scraper_bench_")
+    cluster = Cluster(args, workdir)
+    try:
+        cluster.start()
+        if args.replay:
+            schedule = replay_schedule(args.replay, args.rps)
+        else:
+            schedule = synthetic_schedule(args.rps, args.duration)
+        results, elapsed = asyncio.run(drive(cluster.public_url, schedule, args.warmup, args.max_connections, args.timeout))
+    finally:
+        cluster.stop()
+        if args.keep:
+            print(f"Working directory: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    summary = summarize(results, elapsed, None if args.replay else args.rps)
+    summary["startup"] = cluster.startup
+    summary["settings"] = {key: value for key, value in vars(args).items() if key not in ("json", "keep")}
+    print_summary(summary)
+    if args.json:
+        write_json(args.json, summary)
+
+if __name__ == "__main__":
+    main()
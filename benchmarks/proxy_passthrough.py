@@ -0,0 +1,59 @@
+# benchmarks/proxy_passthrough.py
+"""CPU cost per MB of turning a scraper server's /scrape body into public_server's /submit body.
+
+    PYTHONPATH=. python benchmarks/proxy_passthrough.py [--sizes 0.01 1 10] [--repeat 5]
+
+reparse:      decode, validate against ClientResponse, encode again (the old /submit path)
+passthrough:  wrap the upstream bytes in a pre-built envelope (the current /submit path)
+"""
+import argparse
+import json
+import time
+from pydantic import BaseModel, TypeAdapter
+from common import serialization
+from common.serialization import envelope
+
+class ClientResponse(BaseModel):  # Same shape as public_server's response model
+    status: str
+    data: dict
+
+client_response = TypeAdapter(ClientResponse)
+
+def make_body(megabytes: float) -> bytes:
+    record = {"url": "https://example.com/item/000000", "title": "Example item title", "price": 19.99, "tags": ["a", "b", "c"], "in_stock": True}
+    per_record = len(json.dumps(record))
+    count = max(1, int(megabytes * 1024 * 1024 / per_record))
+    return json.dumps({"status": "success", "data": {"records": [record] * count}}).encode()
+
+def reparse(body: bytes) -> bytes:
+    return client_response.dump_json(client_response.validate_python({"status": "success", "data": json.loads(body)}))
+
+def passthrough(body: bytes) -> bytes:
+    return envelope(body)
+
+def cpu_seconds(fn, body: bytes, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.process_time()
+        fn(body)
+        best = min(best, time.process_time() - started)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=float, nargs="+", default=[0.01, 1, 10], help="Body sizes in MB")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"orjson: {'yes' if serialization.orjson is not None else 'no'}")
+    print(f"{'size MB':>10} {'reparse ms/MB':>15} {'passthrough ms/MB':>18} {'speedup':>9}")
+    for size in args.sizes:
+        body = make_body(size)
+        assert json.loads(reparse(body)) == json.loads(passthrough(body))
+        megabytes = len(body) / (1024 * 1024)
+        slow = cpu_seconds(reparse, body, args.repeat) / megabytes * 1000
+        fast = cpu_seconds(passthrough, body, args.repeat) / megabytes * 1000
+        print(f"{megabytes:>10.2f} {slow:>15.2f} {fast:>18.3f} {slow / max(fast, 1e-9):>8.0f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+# common/http_client.py
+import httpx
+from typing import Dict, Optional
+
+class HTTPClientPool:
+    """One keep-alive httpx.AsyncClient per upstream base URL.
+
+    Clients are created lazily and share the same pool limits and timeouts,
+    so every upstream gets its own bounded set of reusable connections.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        connect_timeout: float = 2.0,
+        timeout: float = 30.0,
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.clients: Dict[str, httpx.AsyncClient] = {}
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict]) -> "HTTPClientPool":
+        config = config or {}
+        return cls(
+            max_connections=config.get("max_connections", 100),
+            max_keepalive_connections=config.get("max_keepalive_connections", 20),
+            keepalive_expiry=config.get("keepalive_expiry", 30.0),
+            connect_timeout=config.get("connect_timeout", 2.0),
+            timeout=config.get("timeout", 30.0),
+        )
+
+    def get(self, base_url: str) -> httpx.AsyncClient:
+        client = self.clients.get(base_url)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(base_url=base_url, limits=self.limits, timeout=self.timeout)
+            self.clients[base_url] = client
+        return client
+
+    def for_server(self, server: Dict) -> httpx.AsyncClient:
+        return self.get(f"http://{server['ip']}:{server['port']}")
+
+    async def close(self):
+        clients = list(self.clients.values())
+        self.clients.clear()
+        for client in clients:
+            await client.aclose()
@@ -1,9 +1,11 @@
 # common/logging.py
 import logging
+import os
 
 def setup_logging(name: str):
     logger = logging.getLogger(name)
-    logger.setLevel(logging.INFO)
+    # Per-request messages are logged at DEBUG; set LOG_LEVEL=DEBUG to see them
+    logger.setLevel(os.environ.get("LOG_LEVEL", "INFO").upper())
     handler = logging.StreamHandler()
     formatter = logging.Formatter(
         '[%(asctime)s] %(levelname)s in %(module)s: %(message)s'
@@ -0,0 +1,190 @@
+# common/metrics.py
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; spans a cache hit on the same host up to a slow scrape
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Sequence[str]) -> Tuple[str, ...]:
+        if len(labels) != len(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}")
+        return tuple(str(label) for label in labels)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = list(self.values.items())
+        return [f"{self.name}{_labels(self.label_names, key)} {_number(value)}" for key, value in values]
+
+class Gauge(Metric):
+    """A settable gauge, or one read from `function` at scrape time.
+
+    `function` returns a number, or a dict of label tuple -> number for
+    labelled gauges. Use kind="counter" for values that only grow but are
+    counted elsewhere (e.g. cache hits).
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), function: Optional[Callable] = None, kind: str = "gauge"):
+        super().__init__(name, documentation, labels)
+        self.kind = kind
+        self.function = function
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, *labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = value
+
+    def inc(self, *labels: str, amount: float = 1):
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def samples(self) -> List[str]:
+        if self.function is not None:
+            result = self.function()
+            values = result.items() if isinstance(result, dict) else [((), result)]
+        else:
+            with self._lock:
+                values = list(self.values.items())
+        return [f"{self.name}{_labels(self.label_names, self._key(key))} {_number(value)}" for key, value in values]
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (last one is +Inf), sum]
+        self.values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self.values.get(key)
+            if series is None:
+                series = [[0] * (len(self.buckets) + 1), 0.0]
+                self.values[key] = series
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, *labels: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = [(key, list(counts), total) for key, (counts, total) in self.values.items()]
+        lines = []
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {cumulative}")
+        return lines
+
+def server_timing(timings: Dict[str, float]) -> str:
+    # Server-Timing header value from phase name -> seconds (the header uses milliseconds)
+    return ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in timings.items())
+
+def parse_server_timing(header: Optional[str]) -> Dict[str, float]:
+    timings = {}
+    for entry in (header or "").split(","):
+        name, _, params = entry.strip().partition(";")
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if name and key == "dur":
+                try:
+                    timings[name] = float(value) / 1000
+                except ValueError:
+                    pass
+    return timings
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        # Modules may be imported twice (e.g. by a reloader); keep the first instance
+        return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels: Sequence[str] = (), function: Optional[Callable] = None, kind: str = "gauge") -> Gauge:
+        return self.register(Gauge(name, documentation, labels, function, kind))
+
+    def histogram(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def render(self) -> str:
+        blocks = []
+        for metric in list(self.metrics.values()):
+            try:
+                blocks.append(metric.render())
+            except Exception:
+                continue  # A failing callback must not take down the whole scrape
+        return "\n".join(blocks) + "\n"
+
+# One registry per process, shared by every module of a service
+registry = Registry()
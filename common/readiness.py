@@ -0,0 +1,71 @@
+# common/readiness.py
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+from common.logging import setup_logging
+from common.metrics import registry
+
+try:
+    import psutil
+except ImportError:  # Optional; startup is then timed from when this module was imported
+    psutil = None
+
+logger = setup_logging("readiness")
+
+_IMPORTED_AT = time.time()
+
+STARTUP_SECONDS = registry.gauge("startup_seconds", "Seconds from process start until the service was ready")
+STARTUP_PHASE_SECONDS = registry.gauge("startup_phase_seconds", "Time spent in each startup phase", ["phase"])
+
+def process_age() -> float:
+    if psutil is not None:
+        return time.time() - psutil.Process().create_time()
+    return time.time() - _IMPORTED_AT
+
+class Readiness:
+    """Startup progress of one service process, behind its /healthz and /readyz.
+
+    /healthz only says the process answers. /readyz is 200 between
+    mark_ready() at the end of startup and mark_not_ready() when shutdown
+    begins, 503 otherwise. Startup is timed from process start, so imports
+    count too, with the phases wrapped in phase() broken out; it's logged,
+    with a warning past `target` seconds, and exported as startup_seconds.
+    """
+
+    def __init__(self, service: str, target: Optional[float] = None):
+        self.service = service
+        self.target = target
+        self.ready = False
+        self.startup_seconds: Optional[float] = None
+        self.phases: Dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - started
+            STARTUP_PHASE_SECONDS.set(self.phases[name], name)
+
+    def mark_ready(self):
+        self.startup_seconds = process_age()
+        self.ready = True
+        STARTUP_SECONDS.set(self.startup_seconds)
+        phases = ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in self.phases.items())
+        message = f"{self.service} ready {self.startup_seconds:.2f}s after process start" + (f" ({phases})" if phases else "")
+        if self.target is not None and self.startup_seconds > self.target:
+            logger.warning(f"{message}, over the {self.target}s target")
+        else:
+            logger.info(message)
+
+    def mark_not_ready(self):
+        self.ready = False
+
+    def status(self) -> Dict:
+        return {
+            "service": self.service,
+            "ready": self.ready,
+            "startup_seconds": None if self.startup_seconds is None else round(self.startup_seconds, 3),
+            "phases": {name: round(seconds, 4) for name, seconds in self.phases.items()},
+        }
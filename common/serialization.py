@@ -0,0 +1,36 @@
+# common/serialization.py
+import json
+from typing import Any, Union
+from starlette.responses import JSONResponse as StarletteJSONResponse
+
+try:
+    import orjson
+except ImportError:  # Optional; falls back to the standard library
+    orjson = None
+
+def dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def loads(data: Union[bytes, str]) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def ndjson_line(obj: Any) -> bytes:
+    return dumps(obj) + b"\n"
+
+def envelope(body: bytes, status: str = "success") -> bytes:
+    # Wraps an already-encoded JSON body as {"status": ..., "data": <body>} without parsing it
+    return b'{"status":' + dumps(status) + b',"data":' + body + b"}"
+
+class JSONResponse(StarletteJSONResponse):
+    """JSONResponse rendered with orjson when it is installed.
+
+    Routes with a response_model are better left to FastAPI's own Pydantic
+    serializer, which a custom default_response_class would bypass.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
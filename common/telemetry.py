@@ -0,0 +1,69 @@
+# common/telemetry.py
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict
+from common.utils import get_cpu_usage, get_memory_usage
+
+class LoadSampler:
+    """Samples CPU and memory in a background thread and counts in-flight jobs.
+
+    `/load` handlers read `snapshot()`, which never blocks on psutil.
+    """
+
+    def __init__(self, interval: float = 1.0):
+        self.interval = interval
+        self.cpu = 0.0
+        self.memory = 0.0
+        self.in_flight = 0
+        self.sampled_at = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        get_cpu_usage(interval=None)  # Prime psutil so later samples cover a full interval
+        self.sample()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="load-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval * 2)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        cpu = get_cpu_usage(interval=None)
+        memory = get_memory_usage()
+        with self._lock:
+            self.cpu = cpu
+            self.memory = memory
+            self.sampled_at = time.time()
+
+    @contextmanager
+    def track(self):
+        with self._lock:
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "load": max(self.cpu, self.memory),
+                "cpu": self.cpu,
+                "memory": self.memory,
+                "in_flight": self.in_flight,
+                "timestamp": self.sampled_at,
+            }
@@ -1,8 +1,9 @@
 # common/utils.py
 import psutil
 
-def get_cpu_usage() -> float:
-    return psutil.cpu_percent(interval=1)
+def get_cpu_usage(interval: float = 1) -> float:
+    # interval=None is non-blocking: it reports usage since the previous call
+    return psutil.cpu_percent(interval=interval)
 
 def get_memory_usage() -> float:
     return psutil.virtual_memory().percent
@@ -3,8 +3,12 @@ from flask import Flask, render_template, request, redirect, url_for, flash, ses
 import requests
 import json
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from common.authentication import validate_uuid
 from common.logging import setup_logging
+from common.readiness import Readiness
 from functools import wraps
 
 # Setup logging
@@ -19,9 +23,18 @@ with open(CONFIG_PATH) as f:
     config = json.load(f)
 
 ADMIN_UUID = config['god_panel']['admin_uuid']
+# Everything is set up at import; the panel is ready once this module has loaded
+readiness = Readiness("god_panel", target=config['god_panel'].get('startup_target'))
 LICENSE_SERVER_URL = f"http://{config['license_server']['ip']}:{config['license_server']['port']}/"
 PUBLIC_SERVER_URL = f"http://{config['public_server']['ip']}:{config['public_server']['port']}/"
-SCRAPER_SERVERS = config['scraper_servers']
+
+# Current loads are fetched from all scraper servers concurrently and shared between page views for cache_ttl seconds
+SERVER_LOADS_CONFIG = config.get('server_loads', {})
+LOADS_CACHE_TTL = SERVER_LOADS_CONFIG.get('cache_ttl', 5.0)
+LOAD_TIMEOUT = SERVER_LOADS_CONFIG.get('timeout', 2.0)
+load_fetcher = ThreadPoolExecutor(max_workers=SERVER_LOADS_CONFIG.get('max_workers', 16), thread_name_prefix="load")
+loads_cache = {"loads": None, "fetched_at": 0.0}
+loads_lock = threading.Lock()
 
 # Authentication Decorator
 def login_required(f):
@@ -67,9 +80,12 @@ def licenses():
 @login_required
 def api_list_licenses():
     try:
-        response = requests.get(f"{LICENSE_SERVER_URL}list_licenses", timeout=5)
-        licenses = response.json().get("licenses", [])
-        return jsonify({"licenses": licenses})
+        # Filters and the page cursor (after) are passed through; the license server pages in key order
+        response = requests.get(f"{LICENSE_SERVER_URL}list_licenses", params=request.args, timeout=5)
+        if response.status_code != 200:
+            return jsonify({"error": response.json().get('detail', 'Failed to fetch licenses')}), response.status_code
+        data = response.json()
+        return jsonify({"licenses": data.get("licenses", []), "next_after": data.get("next_after")})
     except requests.RequestException:
         logger.error("Failed to fetch licenses from License Server")
         return jsonify({"error": "Failed to fetch licenses"}), 500
@@ -96,6 +112,39 @@ def api_create_license():
         logger.error("License server error during license creation")
         return jsonify({"error": "License server error"}), 500
 
+def invalidate_cached_license(key):
+    # The public server caches entitlements; drop a changed or deleted key right away instead of waiting for its TTL
+    try:
+        requests.post(
+            f"{PUBLIC_SERVER_URL}admin/invalidate_license",
+            json={"key": key},
+            headers={"X-Admin-UUID": ADMIN_UUID},
+            timeout=5
+        )
+    except requests.RequestException:
+        logger.warning(f"Failed to invalidate cached license {key} on Public Server")
+
+@app.route('/api/update_license', methods=['POST'])
+@login_required
+def api_update_license():
+    data = request.json
+    if not data or 'key' not in data:
+        return jsonify({"error": "License key is required"}), 400
+    key = data['key']
+    try:
+        response = requests.post(f"{LICENSE_SERVER_URL}update_license", json=data, timeout=5)
+        if response.status_code == 200:
+            logger.info(f"License {key} updated successfully")
+            invalidate_cached_license(key)
+            return jsonify({"status": "License updated"}), 200
+        else:
+            error_detail = response.json().get('detail', 'Failed to update license.')
+            logger.warning(f"License update failed: {error_detail}")
+            return jsonify({"error": error_detail}), response.status_code
+    except requests.RequestException:
+        logger.error("License server error during license update")
+        return jsonify({"error": "License server error"}), 500
+
 @app.route('/api/delete_license', methods=['POST'])
 @login_required
 def api_delete_license():
@@ -107,6 +156,7 @@ def api_delete_license():
         response = requests.post(f"{LICENSE_SERVER_URL}delete_license", json={"key": key}, timeout=5)
         if response.status_code == 200:
             logger.info(f"License {key} deleted successfully")
+            invalidate_cached_license(key)
             return jsonify({"status": "License deleted"}), 200
         else:
             error_detail = response.json().get('detail', 'Failed to delete license.')
@@ -121,20 +171,75 @@ def api_delete_license():
 def server_loads():
     return render_template('server_loads.html')
 
+def get_scraper_servers():
+    # Scraper servers register with the Public Server, so it is the source of truth for the server list
+    response = requests.get(f"{PUBLIC_SERVER_URL}server_loads", timeout=5)
+    response.raise_for_status()
+    return response.json().get("servers", [])
+
+def fetch_server_load(server):
+    try:
+        response = requests.get(f"http://{server['ip']}:{server['port']}/load", timeout=LOAD_TIMEOUT)
+        if response.status_code == 200:
+            return response.json()
+        return {"load": "Error"}
+    except requests.RequestException:
+        return {"load": "Unreachable"}
+
+def get_server_loads():
+    with loads_lock:
+        # One refresh at a time; concurrent page views wait for it and share the result
+        if loads_cache["loads"] is None or time.monotonic() - loads_cache["fetched_at"] >= LOADS_CACHE_TTL:
+            scraper_servers = get_scraper_servers()
+            results = load_fetcher.map(fetch_server_load, scraper_servers)
+            loads_cache["loads"] = {server['name']: result for server, result in zip(scraper_servers, results)}
+            loads_cache["fetched_at"] = time.monotonic()
+        return loads_cache["loads"]
+
 @app.route('/api/server_loads', methods=['GET'])
 @login_required
 def api_server_loads():
-    loads = {}
-    for server in SCRAPER_SERVERS:
-        try:
-            response = requests.get(f"http://{server['ip']}:{server['port']}/load", timeout=5)
-            if response.status_code == 200:
-                loads[server['name']] = response.json().get("load", "Unknown")
-            else:
-                loads[server['name']] = "Error"
-        except requests.RequestException:
-            loads[server['name']] = "Unreachable"
-    return jsonify({"server_loads": loads})
+    try:
+        loads = get_server_loads()
+    except requests.RequestException:
+        logger.error("Failed to fetch scraper servers from Public Server")
+        return jsonify({"error": "Failed to fetch scraper servers"}), 500
+    return jsonify({
+        "server_loads": {name: telemetry.get("load", "Unknown") for name, telemetry in loads.items()},
+        "telemetry": loads
+    })
+
+@app.route('/api/cache_stats', methods=['GET'])
+@login_required
+def api_cache_stats():
+    try:
+        response = requests.get(f"{PUBLIC_SERVER_URL}cache/stats", timeout=5)
+        return jsonify({"cache_stats": response.json()})
+    except requests.RequestException:
+        logger.error("Failed to fetch cache stats from Public Server")
+        return jsonify({"error": "Failed to fetch cache stats"}), 500
+
+@app.route('/usage')
+@login_required
+def usage():
+    return render_template('usage.html')
+
+@app.route('/api/usage_stats', methods=['GET'])
+@login_required
+def api_usage_stats():
+    try:
+        response = requests.get(
+            f"{PUBLIC_SERVER_URL}stats/usage",
+            params=request.args,
+            headers={"X-Admin-UUID": ADMIN_UUID},
+            timeout=10
+        )
+        if response.status_code != 200:
+            return jsonify({"error": response.json().get('detail', 'Failed to fetch usage stats')}), response.status_code
+        return jsonify(response.json())
+    except requests.RequestException:
+        logger.error("Failed to fetch usage stats from Public Server")
+        return jsonify({"error": "Failed to fetch usage stats"}), 500
 
 @app.route('/api/restart_services', methods=['POST'])
 @login_required
@@ -147,5 +252,15 @@ def api_restart_services():
     logger.info("Services restarted successfully")
     return jsonify({"status": "Services restarted"}), 200
 
+@app.route('/healthz')
+def healthz():
+    return jsonify({"status": "ok"})
+
+@app.route('/readyz')
+def readyz():
+    return jsonify(readiness.status()), 200 if readiness.ready else 503
+
+readiness.mark_ready()
+
 if __name__ == '__main__':
-    app.run(host=config['god_panel']['ip'], port=config['god_panel']['port'], debug=False, host='0.0.0.0')
+    app.run(host=config['god_panel']['ip'], port=config['god_panel']['port'], debug=False)
@@ -5,19 +5,66 @@ document.addEventListener('DOMContentLoaded', function() {
     const licensesTableBody = document.getElementById('licenses-table-body');
     const addLicenseBtn = document.getElementById('add-license-btn');
     const addLicenseModal = document.getElementById('add-license-modal');
-    const closeModalSpan = document.querySelector('.close');
     const addLicenseForm = document.getElementById('add-license-form');
+    const editLimitsModal = document.getElementById('edit-limits-modal');
+    const editLimitsForm = document.getElementById('edit-limits-form');
+    const licenseFilters = document.getElementById('license-filters');
+    const loadMoreLicensesBtn = document.getElementById('load-more-licenses-btn');
+    let editingKey = null;
+    let nextAfter = null;
 
-    // Fetch and display licenses
-    function fetchLicenses() {
-        fetch('/api/licenses')
+    // Empty limit inputs mean "unlimited"
+    function readLimit(id, parse) {
+        const value = document.getElementById(id).value;
+        return value === '' ? null : parse(value);
+    }
+
+    function readLimits(prefix) {
+        return {
+            rate_limit: readLimit(`${prefix}rate_limit`, parseFloat),
+            burst: readLimit(`${prefix}burst`, v => parseInt(v)),
+            max_in_flight: readLimit(`${prefix}max_in_flight`, v => parseInt(v))
+        };
+    }
+
+    function formatLimit(value) {
+        return value === null || value === undefined ? 'Unlimited' : value;
+    }
+
+    function licenseQuery() {
+        const params = new URLSearchParams();
+        const filters = {
+            key_prefix: document.getElementById('filter_key_prefix').value,
+            scraper: document.getElementById('filter_scraper').value,
+            expires_before: document.getElementById('filter_expires_before').value,
+            min_usage: document.getElementById('filter_min_usage').value
+        };
+        for (const [name, value] of Object.entries(filters)) {
+            if (value !== '') {
+                params.set(name, value);
+            }
+        }
+        return params;
+    }
+
+    // Fetch and display one page of licenses; more=true appends the next page
+    function fetchLicenses(more = false) {
+        const params = licenseQuery();
+        if (more && nextAfter !== null) {
+            params.set('after', nextAfter);
+        }
+        fetch(`/api/licenses?${params}`)
             .then(response => response.json())
             .then(data => {
                 if (data.error) {
                     alert(data.error);
                     return;
                 }
-                licensesTableBody.innerHTML = '';
+                if (!more) {
+                    licensesTableBody.innerHTML = '';
+                }
+                nextAfter = data.next_after;
+                loadMoreLicensesBtn.style.display = nextAfter === null ? 'none' : 'inline-block';
                 data.licenses.forEach(license => {
                     const row = document.createElement('tr');
 
@@ -27,10 +74,20 @@ document.addEventListener('DOMContentLoaded', function() {
                         <td>${license.scrapers.join(', ')}</td>
                         <td>${license.usage_per_month}</td>
                         <td>${license.usage_count}</td>
+                        <td>${license.period_end ?? '-'} (${license.billing_cycle})</td>
+                        <td>${formatLimit(license.rate_limit)}</td>
+                        <td>${formatLimit(license.burst)}</td>
+                        <td>${formatLimit(license.max_in_flight)}</td>
                         <td>
+                            <button class="edit-limits-btn" data-key="${license.key}">Edit Limits</button>
                             <button class="delete-license-btn" data-key="${license.key}">Delete</button>
                         </td>
                     `;
+                    row.dataset.limits = JSON.stringify({
+                        rate_limit: license.rate_limit,
+                        burst: license.burst,
+                        max_in_flight: license.max_in_flight
+                    });
                     licensesTableBody.appendChild(row);
                 });
             })
@@ -39,92 +96,148 @@ document.addEventListener('DOMContentLoaded', function() {
             });
     }
 
-    fetchLicenses();
+    // License elements only exist on the licenses page
+    if (licensesTableBody) {
+        fetchLicenses();
 
-    // Open Add License Modal
-    addLicenseBtn.addEventListener('click', function() {
-        addLicenseModal.style.display = 'block';
-    });
+        licenseFilters.addEventListener('submit', function(event) {
+            event.preventDefault();
+            fetchLicenses();
+        });
 
-    // Close Modal
-    closeModalSpan.addEventListener('click', function() {
-        addLicenseModal.style.display = 'none';
-    });
+        loadMoreLicensesBtn.addEventListener('click', function() {
+            fetchLicenses(true);
+        });
 
-    window.addEventListener('click', function(event) {
-        if (event.target == addLicenseModal) {
-            addLicenseModal.style.display = 'none';
-        }
-    });
-
-    // Handle Add License Form Submission
-    addLicenseForm.addEventListener('submit', function(event) {
-        event.preventDefault();
-        const key = document.getElementById('key').value;
-        const valid_until = document.getElementById('valid_until').value;
-        const scrapersSelect = document.getElementById('scrapers');
-        const selectedScrapers = Array.from(scrapersSelect.selectedOptions).map(option => option.value);
-        const usage_per_month = document.getElementById('usage_per_month').value;
-
-        const payload = {
-            key,
-            valid_until,
-            scrapers: selectedScrapers,
-            usage_per_month: parseInt(usage_per_month)
-        };
+        // Open Add License Modal
+        addLicenseBtn.addEventListener('click', function() {
+            addLicenseModal.style.display = 'block';
+        });
 
-        fetch('/api/create_license', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify(payload)
-        })
-        .then(response => response.json().then(data => ({ status: response.status, body: data })))
-        .then(result => {
-            if (result.status === 200) {
-                alert('License created successfully.');
-                addLicenseModal.style.display = 'none';
-                addLicenseForm.reset();
-                fetchLicenses();
-            } else {
-                alert(`Error: ${result.body.error}`);
+        // Close Modals
+        document.querySelectorAll('.modal .close').forEach(span => {
+            span.addEventListener('click', function() {
+                span.closest('.modal').style.display = 'none';
+            });
+        });
+
+        window.addEventListener('click', function(event) {
+            if (event.target == addLicenseModal || event.target == editLimitsModal) {
+                event.target.style.display = 'none';
             }
-        })
-        .catch(error => {
-            console.error('Error creating license:', error);
-            alert('Failed to create license.');
         });
-    });
-
-    // Handle Delete License
-    licensesTableBody.addEventListener('click', function(event) {
-        if (event.target && event.target.matches('button.delete-license-btn')) {
-            const key = event.target.getAttribute('data-key');
-            if (confirm(`Are you sure you want to delete license ${key}?`)) {
-                fetch('/api/delete_license', {
-                    method: 'POST',
-                    headers: {
-                        'Content-Type': 'application/json'
-                    },
-                    body: JSON.stringify({ key })
-                })
-                .then(response => response.json().then(data => ({ status: response.status, body: data })))
-                .then(result => {
-                    if (result.status === 200) {
-                        alert('License deleted successfully.');
-                        fetchLicenses();
-                    } else {
-                        alert(`Error: ${result.body.error}`);
-                    }
-                })
-                .catch(error => {
-                    console.error('Error deleting license:', error);
-                    alert('Failed to delete license.');
-                });
+
+        // Handle Add License Form Submission
+        addLicenseForm.addEventListener('submit', function(event) {
+            event.preventDefault();
+            const key = document.getElementById('key').value;
+            const valid_until = document.getElementById('valid_until').value;
+            const scrapersSelect = document.getElementById('scrapers');
+            const selectedScrapers = Array.from(scrapersSelect.selectedOptions).map(option => option.value);
+            const usage_per_month = document.getElementById('usage_per_month').value;
+
+            const payload = {
+                key,
+                valid_until,
+                scrapers: selectedScrapers,
+                usage_per_month: parseInt(usage_per_month),
+                billing_cycle: document.getElementById('billing_cycle').value,
+                ...readLimits('')
+            };
+
+            fetch('/api/create_license', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify(payload)
+            })
+            .then(response => response.json().then(data => ({ status: response.status, body: data })))
+            .then(result => {
+                if (result.status === 200) {
+                    alert('License created successfully.');
+                    addLicenseModal.style.display = 'none';
+                    addLicenseForm.reset();
+                    fetchLicenses();
+                } else {
+                    alert(`Error: ${result.body.error}`);
+                }
+            })
+            .catch(error => {
+                console.error('Error creating license:', error);
+                alert('Failed to create license.');
+            });
+        });
+
+        // Handle Edit Limits
+        licensesTableBody.addEventListener('click', function(event) {
+            if (event.target && event.target.matches('button.edit-limits-btn')) {
+                editingKey = event.target.getAttribute('data-key');
+                const limits = JSON.parse(event.target.closest('tr').dataset.limits);
+                document.getElementById('edit-key').textContent = editingKey;
+                for (const [name, value] of Object.entries(limits)) {
+                    document.getElementById(`edit_${name}`).value = value === null ? '' : value;
+                }
+                editLimitsModal.style.display = 'block';
             }
-        }
-    });
+        });
+
+        editLimitsForm.addEventListener('submit', function(event) {
+            event.preventDefault();
+            const payload = { key: editingKey, ...readLimits('edit_') };
+
+            fetch('/api/update_license', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify(payload)
+            })
+            .then(response => response.json().then(data => ({ status: response.status, body: data })))
+            .then(result => {
+                if (result.status === 200) {
+                    alert('License limits updated successfully.');
+                    editLimitsModal.style.display = 'none';
+                    fetchLicenses();
+                } else {
+                    alert(`Error: ${result.body.error}`);
+                }
+            })
+            .catch(error => {
+                console.error('Error updating license:', error);
+                alert('Failed to update license.');
+            });
+        });
+
+        // Handle Delete License
+        licensesTableBody.addEventListener('click', function(event) {
+            if (event.target && event.target.matches('button.delete-license-btn')) {
+                const key = event.target.getAttribute('data-key');
+                if (confirm(`Are you sure you want to delete license ${key}?`)) {
+                    fetch('/api/delete_license', {
+                        method: 'POST',
+                        headers: {
+                            'Content-Type': 'application/json'
+                        },
+                        body: JSON.stringify({ key })
+                    })
+                    .then(response => response.json().then(data => ({ status: response.status, body: data })))
+                    .then(result => {
+                        if (result.status === 200) {
+                            alert('License deleted successfully.');
+                            fetchLicenses();
+                        } else {
+                            alert(`Error: ${result.body.error}`);
+                        }
+                    })
+                    .catch(error => {
+                        console.error('Error deleting license:', error);
+                        alert('Failed to delete license.');
+                    });
+                }
+            }
+        });
+    }
 
     // Server Loads
     const serverLoadsTableBody = document.getElementById('server-loads-table-body');
@@ -138,11 +251,14 @@ document.addEventListener('DOMContentLoaded', function() {
                     return;
                 }
                 serverLoadsTableBody.innerHTML = '';
-                for (const [name, load] of Object.entries(data.server_loads)) {
+                for (const [name, telemetry] of Object.entries(data.telemetry)) {
                     const row = document.createElement('tr');
                     row.innerHTML = `
                         <td>${name}</td>
-                        <td>${load}</td>
+                        <td>${telemetry.load}</td>
+                        <td>${telemetry.cpu ?? '-'}</td>
+                        <td>${telemetry.memory ?? '-'}</td>
+                        <td>${telemetry.in_flight ?? '-'}</td>
                     `;
                     serverLoadsTableBody.appendChild(row);
                 }
@@ -157,6 +273,116 @@ document.addEventListener('DOMContentLoaded', function() {
         fetchServerLoads();
     }
 
+    // Result Cache Stats
+    const cacheStatsTableBody = document.getElementById('cache-stats-table-body');
+
+    function fetchCacheStats() {
+        fetch('/api/cache_stats')
+            .then(response => response.json())
+            .then(data => {
+                if (data.error) {
+                    alert(data.error);
+                    return;
+                }
+                const stats = data.cache_stats;
+                const rows = {
+                    'Enabled': stats.enabled,
+                    'Hits': stats.hits,
+                    'Disk Hits': stats.disk_hits,
+                    'Misses': stats.misses,
+                    'Coalesced': stats.coalesced,
+                    'Hit Rate': `${(stats.hit_rate * 100).toFixed(1)}%`,
+                    'Entries': stats.memory_entries,
+                    'Memory (bytes)': stats.memory_bytes
+                };
+                cacheStatsTableBody.innerHTML = '';
+                for (const [name, value] of Object.entries(rows)) {
+                    const row = document.createElement('tr');
+                    row.innerHTML = `
+                        <td>${name}</td>
+                        <td>${value}</td>
+                    `;
+                    cacheStatsTableBody.appendChild(row);
+                }
+            })
+            .catch(error => {
+                console.error('Error fetching cache stats:', error);
+            });
+    }
+
+    if (cacheStatsTableBody) {
+        fetchCacheStats();
+    }
+
+    // Usage History
+    const usageCharts = document.querySelectorAll('canvas[data-dimension]');
+    const usageWindow = document.getElementById('usage-window');
+    const chartColors = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b', '#e377c2', '#7f7f7f', '#bcbd22', '#17becf'];
+
+    function drawChart(canvas, series, column, since, until) {
+        // Plain canvas line chart, one line per name; gaps in a series are drawn as zero
+        const ctx = canvas.getContext('2d');
+        const width = canvas.width, height = canvas.height, pad = 40;
+        ctx.clearRect(0, 0, width, height);
+        let max = 0;
+        for (const points of Object.values(series)) {
+            for (const point of points) {
+                max = Math.max(max, point[column] || 0);
+            }
+        }
+        ctx.strokeStyle = '#999';
+        ctx.strokeRect(pad, 10, width - pad - 10, height - pad);
+        ctx.fillStyle = '#333';
+        ctx.font = '11px sans-serif';
+        ctx.fillText(column === 1 ? String(max) : `${(max * 1000).toFixed(0)} ms`, 2, 18);
+        ctx.fillText(new Date(since * 1000).toLocaleTimeString(), pad, height - 12);
+        ctx.fillText(new Date(until * 1000).toLocaleTimeString(), width - 90, height - 12);
+        const x = t => pad + (t - since) / (until - since) * (width - pad - 10);
+        const y = v => 10 + (height - pad) * (1 - (max ? (v || 0) / max : 0));
+        Object.entries(series).forEach(([name, points], index) => {
+            const color = chartColors[index % chartColors.length];
+            ctx.strokeStyle = color;
+            ctx.beginPath();
+            points.forEach((point, i) => {
+                if (i === 0) {
+                    ctx.moveTo(x(point[0]), y(point[column]));
+                } else {
+                    ctx.lineTo(x(point[0]), y(point[column]));
+                }
+            });
+            ctx.stroke();
+            ctx.fillStyle = color;
+            ctx.fillText(name, width - 150, 24 + index * 13);
+        });
+    }
+
+    function fetchUsage(canvas) {
+        const minutes = Number(usageWindow.value);
+        // Coarser buckets for longer windows keep each series at a few hundred points
+        const resolution = minutes > 2880 ? 3600 : (minutes > 360 ? 600 : 60);
+        const params = new URLSearchParams({ dimension: canvas.dataset.dimension, minutes, resolution });
+        fetch(`/api/usage_stats?${params}`)
+            .then(response => response.json())
+            .then(data => {
+                if (data.error) {
+                    alert(data.error);
+                    return;
+                }
+                const column = canvas.dataset.column === 'latency' ? 3 : 1;
+                drawChart(canvas, data.series, column, data.since, data.until);
+            })
+            .catch(error => {
+                console.error('Error fetching usage stats:', error);
+            });
+    }
+
+    if (usageCharts.length) {
+        const refreshUsage = () => usageCharts.forEach(fetchUsage);
+        usageWindow.addEventListener('change', refreshUsage);
+        refreshUsage();
+        setInterval(refreshUsage, 60000);
+    }
+
     // Restart Services
     const restartServicesBtn = document.getElementById('restart-services-btn');
     if (restartServicesBtn) {
@@ -0,0 +1,80 @@
+# license_server/billing.py
+import calendar
+from datetime import date
+from typing import Iterable, Optional, Tuple
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from models import License
+from common.logging import setup_logging
+
+logger = setup_logging("billing")
+
+CALENDAR = "calendar"  # Periods start on the 1st of each month
+ANNIVERSARY = "anniversary"  # Periods start on the day of the month the license was created
+BILLING_CYCLES = (CALENDAR, ANNIVERSARY)
+
+def add_months(anchor: date, months: int) -> date:
+    # Same day of the month, clamped to short months; always counted from the anchor so Jan 31 -> Feb 28 -> Mar 31
+    month_index = anchor.month - 1 + months
+    year, month = anchor.year + month_index // 12, month_index % 12 + 1
+    return date(year, month, min(anchor.day, calendar.monthrange(year, month)[1]))
+
+def current_period(cycle: Optional[str], anchor: Optional[date], today: date) -> Tuple[date, date]:
+    # (start, end) of the period containing today; end is exclusive and is when usage resets
+    if cycle != ANNIVERSARY or anchor is None:
+        anchor = date(today.year, 1, 1)
+    months = (today.year - anchor.year) * 12 + today.month - anchor.month
+    if add_months(anchor, months) > today:
+        months -= 1
+    return add_months(anchor, months), add_months(anchor, months + 1)
+
+def is_due(license: License, today: date) -> bool:
+    return license.period_end is None or license.period_end <= today
+
+def roll_over(db: Session, license: License, today: date) -> bool:
+    """Start the license's current period with zero usage; the caller commits.
+
+    Conditional on the period_end that was read, so when several workers (or a
+    sweep and a request) race, exactly one of them resets the usage.
+    """
+    _, period_end = current_period(license.billing_cycle, license.billing_anchor, today)
+    result = db.execute(
+        update(License)
+        .where(License.key == license.key, License.period_end == license.period_end)
+        .values(usage_count=0, period_end=period_end)
+        .execution_options(synchronize_session=False)
+    )
+    db.expire(license)
+    return result.rowcount == 1
+
+def roll_over_due(db: Session, keys: Iterable[str], today: date) -> int:
+    # Resets the given licenses whose period has ended; the caller commits
+    due = db.query(License).filter(License.key.in_(list(keys)), License.period_end <= today).all()
+    return sum(roll_over(db, license, today) for license in due)
+
+def sweep(session_factory, today: date, chunk_size: int = 500) -> int:
+    """Roll over every license whose period has ended, chunk_size rows per transaction.
+
+    Licenses with traffic are rolled over on first access anyway; this covers
+    idle ones so listings and reports are current. Safe to run from several
+    workers at once, or from a cron job calling /roll_over_usage.
+    """
+    total = 0
+    while True:
+        with session_factory() as db:
+            due = (
+                db.query(License)
+                .filter(License.period_end <= today)
+                .order_by(License.period_end)
+                .limit(chunk_size)
+                .all()
+            )
+            if not due:
+                break
+            total += sum(roll_over(db, license, today) for license in due)
+            db.commit()
+        if len(due) < chunk_size:
+            break
+    if total:
+        logger.info(f"Rolled over usage for {total} licenses")
+    return total
@@ -1,47 +1,136 @@
 # license_server/main.py
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Response
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
-from models import License
-from database import get_engine, get_session, init_db
+from models import License, LicenseScraper, USAGE_RATIO
+from database import get_engine, get_sessionmaker, init_db
+from billing import BILLING_CYCLES, current_period, is_due, roll_over, roll_over_due, sweep
+from sqlalchemy import delete, update
 from sqlalchemy.orm import Session
+from contextlib import asynccontextmanager
 from datetime import datetime
+from typing import Dict, List, Optional
+import asyncio
 import json
 import os
-import threading
-import time
 from common.logging import setup_logging
+from common.metrics import CONTENT_TYPE, registry
+from common.readiness import Readiness
 
 # Setup logging
 logger = setup_logging("license_server")
 
-app = FastAPI()
-
 # Load configuration
-CONFIG_PATH = os.path.join(os.path.dirname(__file__), '..', 'config', 'license_server_config.json')
+CONFIG_PATH = os.environ.get("LICENSE_SERVER_CONFIG", os.path.join(os.path.dirname(__file__), '..', 'config', 'license_server_config.json'))
 with open(CONFIG_PATH) as f:
     config = json.load(f)
 
+# The engine connects lazily; the schema is created and migrated in the lifespan
 engine = get_engine(CONFIG_PATH)
-init_db(engine)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = get_sessionmaker(engine)
+readiness = Readiness("license_server", target=config["license_server"].get("startup_target"))
+
+MAX_PAGE_SIZE = config["license_server"].get("max_page_size", 1000)
+MAX_BULK = config["license_server"].get("max_bulk", 5000)  # Licenses per bulk create/delete request
+BILLING_CONFIG = config["license_server"].get("billing", {})
+SWEEP_CHUNK_SIZE = BILLING_CONFIG.get("sweep_chunk_size", 500)
+
+async def sweep_in_background():
+    # Periods that ended while no worker was running are caught up in small transactions. Licenses with
+    # traffic roll over on first access anyway, so this doesn't need to hold up readiness.
+    try:
+        await asyncio.to_thread(sweep, SessionLocal, datetime.utcnow().date(), SWEEP_CHUNK_SIZE)
+    except Exception as e:
+        logger.error(f"Startup usage sweep failed: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    with readiness.phase("init_db"):
+        await asyncio.to_thread(init_db, engine)
+    sweep_task = asyncio.create_task(sweep_in_background()) if BILLING_CONFIG.get("sweep_on_startup", True) else None
+    readiness.mark_ready()
+    yield
+    readiness.mark_not_ready()
+    if sweep_task is not None:
+        sweep_task.cancel()
+    engine.dispose()
+
+app = FastAPI(lifespan=lifespan)
+
+REQUEST_SECONDS = registry.histogram("license_request_seconds", "License server endpoint latency", ["endpoint"])
+USAGE_RECORDED = registry.counter("license_usage_recorded_total", "Jobs charged to licenses", ["source"])
 
 # Pydantic Models
 class ValidateRequest(BaseModel):
     key: str
+    count: int = 1  # Number of jobs to charge, e.g. a whole batch
 
 class ValidateResponse(BaseModel):
     valid: bool
     scrapers: list
 
+class EntitlementsRequest(BaseModel):
+    key: str
+
+class EntitlementsResponse(BaseModel):
+    key: str
+    scrapers: list
+    valid_until: str
+    usage_per_month: int
+    usage_count: int
+    rate_limit: Optional[float] = None
+    burst: Optional[int] = None
+    max_in_flight: Optional[int] = None
+    billing_cycle: str = "calendar"
+    period_end: Optional[str] = None  # When usage_count next resets
+
+class BulkUsageRequest(BaseModel):
+    usage: Dict[str, int]  # License key -> jobs consumed since the last flush
+
 class CreateLicenseRequest(BaseModel):
     key: str
     valid_until: str  # ISO format date
     scrapers: list  # List of scraper names or ["all"]
     usage_per_month: int
+    rate_limit: Optional[float] = None  # Requests per second; None means unlimited
+    burst: Optional[int] = None
+    max_in_flight: Optional[int] = None
+    billing_cycle: str = "calendar"  # "calendar" or "anniversary" (monthly from the creation date)
+
+class UpdateLicenseRequest(BaseModel):
+    key: str  # Only the fields that are sent are changed; send null to remove a limit
+    valid_until: Optional[str] = None
+    scrapers: Optional[list] = None
+    usage_per_month: Optional[int] = None
+    rate_limit: Optional[float] = None
+    burst: Optional[int] = None
+    max_in_flight: Optional[int] = None
+    billing_cycle: Optional[str] = None
 
 class DeleteLicenseRequest(BaseModel):
     key: str
 
+class BulkCreateLicensesRequest(BaseModel):
+    licenses: List[CreateLicenseRequest]
+
+class BulkDeleteLicensesRequest(BaseModel):
+    keys: List[str]
+
+LIMIT_FIELDS = ("rate_limit", "burst", "max_in_flight")
+
+def invalid_limits(values: dict) -> bool:
+    return any(values.get(field) is not None and values[field] <= 0 for field in LIMIT_FIELDS)
+
+def unique(names: list) -> list:
+    # Entitlements are a set of rows; repeated names would collide on the primary key
+    return list(dict.fromkeys(names))
+
+def parse_date(value: str, field: str):
+    try:
+        return datetime.fromisoformat(value).date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid date format for {field}")
+
 # Dependency
 def get_db():
     db = SessionLocal()
@@ -50,50 +139,194 @@ def get_db():
     finally:
         db.close()
 
+def charge_usage(db: Session, key: str, count: int, today):
+    # Check and charge in one conditional UPDATE so concurrent requests can never over-spend the quota.
+    # A license whose period has ended is never charged here; it has to be rolled over first.
+    row = db.execute(
+        update(License)
+        .where(
+            License.key == key,
+            License.valid_until >= today,
+            License.period_end > today,
+            License.usage_count + count <= License.usage_per_month
+        )
+        .values(usage_count=License.usage_count + count)
+        .returning(License.key)
+    ).first()
+    db.commit()
+    return row
+
 # API Endpoints
 @app.post("/validate", response_model=ValidateResponse)
+@REQUEST_SECONDS.time("validate")
 def validate_license(request: ValidateRequest, db: Session = Depends(get_db)):
+    if request.count < 1:
+        raise HTTPException(status_code=400, detail="Invalid usage count")
+    today = datetime.utcnow().date()
+    row = charge_usage(db, request.key, request.count, today)
+    if row is None:
+        # Nothing was charged; look the license up to roll its period over or to report why
+        license = db.query(License).filter(License.key == request.key).first()
+        if not license:
+            logger.warning(f"Validation failed: Invalid key {request.key}")
+            raise HTTPException(status_code=400, detail="Invalid license key")
+        if license.valid_until < today:
+            logger.warning(f"Validation failed: License {request.key} expired")
+            raise HTTPException(status_code=400, detail="License expired")
+        if is_due(license, today):
+            roll_over(db, license, today)
+            db.commit()
+            row = charge_usage(db, request.key, request.count, today)
+        if row is None:
+            logger.warning(f"Validation failed: License {request.key} usage limit reached")
+            raise HTTPException(status_code=400, detail="License usage limit reached")
+    scrapers = [scraper for (scraper,) in db.query(LicenseScraper.scraper).filter(LicenseScraper.license_key == request.key)]
+    USAGE_RECORDED.inc("validate", amount=request.count)
+    logger.debug("License %s validated successfully", request.key)
+    return ValidateResponse(valid=True, scrapers=scrapers)
+
+def to_entitlements(license: License) -> EntitlementsResponse:
+    return EntitlementsResponse(
+        key=license.key,
+        scrapers=list(license.scrapers),
+        valid_until=license.valid_until.isoformat(),
+        usage_per_month=license.usage_per_month,
+        usage_count=license.usage_count,
+        rate_limit=license.rate_limit,
+        burst=license.burst,
+        max_in_flight=license.max_in_flight,
+        billing_cycle=license.billing_cycle or "calendar",
+        period_end=license.period_end.isoformat() if license.period_end else None
+    )
+
+@app.post("/entitlements", response_model=EntitlementsResponse)
+@REQUEST_SECONDS.time("entitlements")
+def get_entitlements(request: EntitlementsRequest, db: Session = Depends(get_db)):
+    # Read-only lookup for callers that meter usage themselves and report it via /usage_bulk
     license = db.query(License).filter(License.key == request.key).first()
     if not license:
-        logger.warning(f"Validation failed: Invalid key {request.key}")
-        raise HTTPException(status_code=400, detail="Invalid license key")
-    if license.valid_until < datetime.utcnow().date():
-        logger.warning(f"Validation failed: License {request.key} expired")
-        raise HTTPException(status_code=400, detail="License expired")
-    if license.usage_count >= license.usage_per_month:
-        logger.warning(f"Validation failed: License {request.key} usage limit reached")
-        raise HTTPException(status_code=400, detail="License usage limit reached")
-    # Update usage
-    license.usage_count += 1
-    db.commit()
-    scrapers = license.scrapers.split(",")
-    logger.info(f"License {request.key} validated successfully")
-    return ValidateResponse(valid=True, scrapers=scrapers)
+        logger.warning(f"Entitlements lookup failed: Invalid key {request.key}")
+        raise HTTPException(status_code=404, detail="Invalid license key")
+    today = datetime.utcnow().date()
+    if is_due(license, today):
+        roll_over(db, license, today)
+        db.commit()
+    return to_entitlements(license)
 
-@app.post("/create_license")
-def create_license(request: CreateLicenseRequest, db: Session = Depends(get_db)):
-    existing_license = db.query(License).filter(License.key == request.key).first()
-    if existing_license:
-        logger.warning(f"Creation failed: License key {request.key} already exists")
-        raise HTTPException(status_code=400, detail="License key already exists")
+@app.post("/usage_bulk")
+@REQUEST_SECONDS.time("usage_bulk")
+def record_bulk_usage(request: BulkUsageRequest, db: Session = Depends(get_db)):
+    # Usage already served is recorded as-is, even past the monthly limit, in one transaction
+    licenses = {}
+    keys = [key for key, count in request.usage.items() if count > 0]
+    if keys:
+        # Usage served after a period ended belongs to the new period
+        roll_over_due(db, keys, datetime.utcnow().date())
+    for key in keys:
+        # Increment in SQL rather than read-modify-write so concurrent flushes cannot lose updates
+        db.execute(
+            update(License)
+            .where(License.key == key)
+            .values(usage_count=License.usage_count + request.usage[key])
+        )
+    if keys:
+        db.commit()
+        for license in db.query(License).filter(License.key.in_(keys)):
+            licenses[license.key] = license
+    missing = [key for key in keys if key not in licenses]
+    USAGE_RECORDED.inc("usage_bulk", amount=sum(request.usage[key] for key in licenses))
+    logger.debug("Recorded bulk usage for %d licenses", len(licenses))
+    return {
+        "licenses": {key: to_entitlements(license) for key, license in licenses.items()},
+        "missing": missing
+    }
+
+def build_license(request: CreateLicenseRequest) -> License:
     try:
         valid_until_date = datetime.fromisoformat(request.valid_until).date()
     except ValueError:
         logger.error(f"Creation failed: Invalid date format for license {request.key}")
         raise HTTPException(status_code=400, detail="Invalid date format")
-    scrapers = ",".join(request.scrapers)
-    new_license = License(
+    if invalid_limits(request.model_dump()):
+        logger.error(f"Creation failed: Invalid limits for license {request.key}")
+        raise HTTPException(status_code=400, detail="Limits must be positive")
+    if request.billing_cycle not in BILLING_CYCLES:
+        raise HTTPException(status_code=400, detail=f"Billing cycle must be one of {', '.join(BILLING_CYCLES)}")
+    today = datetime.utcnow().date()
+    return License(
         key=request.key,
         valid_until=valid_until_date,
-        scrapers=scrapers,
+        scrapers=unique(request.scrapers),
         usage_per_month=request.usage_per_month,
-        usage_count=0
+        usage_count=0,
+        rate_limit=request.rate_limit,
+        burst=request.burst,
+        max_in_flight=request.max_in_flight,
+        billing_cycle=request.billing_cycle,
+        billing_anchor=today,
+        period_end=current_period(request.billing_cycle, today, today)[1]
     )
-    db.add(new_license)
+
+@app.post("/create_license")
+def create_license(request: CreateLicenseRequest, db: Session = Depends(get_db)):
+    existing_license = db.query(License.key).filter(License.key == request.key).first()
+    if existing_license:
+        logger.warning(f"Creation failed: License key {request.key} already exists")
+        raise HTTPException(status_code=400, detail="License key already exists")
+    db.add(build_license(request))
     db.commit()
     logger.info(f"License {request.key} created successfully")
     return {"status": "License created"}
 
+@app.post("/create_licenses")
+def create_licenses(request: BulkCreateLicensesRequest, db: Session = Depends(get_db)):
+    # All or nothing: one invalid or existing key rejects the whole batch
+    if len(request.licenses) > MAX_BULK:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK} licenses per request")
+    keys = [license.key for license in request.licenses]
+    if len(set(keys)) != len(keys):
+        raise HTTPException(status_code=400, detail="Duplicate license keys in request")
+    existing = sorted(key for (key,) in db.query(License.key).filter(License.key.in_(keys)))
+    if existing:
+        logger.warning(f"Bulk creation failed: {len(existing)} license keys already exist")
+        raise HTTPException(status_code=400, detail=f"License keys already exist: {', '.join(existing[:10])}")
+    db.add_all([build_license(license) for license in request.licenses])
+    db.commit()
+    logger.info(f"{len(keys)} licenses created successfully")
+    return {"status": "Licenses created", "created": len(keys)}
+
+@app.post("/update_license")
+def update_license(request: UpdateLicenseRequest, db: Session = Depends(get_db)):
+    license = db.query(License).filter(License.key == request.key).first()
+    if not license:
+        logger.warning(f"Update failed: License key {request.key} not found")
+        raise HTTPException(status_code=404, detail="License key not found")
+    changes = request.model_dump(include=request.model_fields_set - {"key"})
+    if invalid_limits(changes):
+        logger.error(f"Update failed: Invalid limits for license {request.key}")
+        raise HTTPException(status_code=400, detail="Limits must be positive")
+    if changes.get("valid_until") is not None:
+        try:
+            changes["valid_until"] = datetime.fromisoformat(changes["valid_until"]).date()
+        except ValueError:
+            logger.error(f"Update failed: Invalid date format for license {request.key}")
+            raise HTTPException(status_code=400, detail="Invalid date format")
+    if changes.get("scrapers") is not None:
+        changes["scrapers"] = unique(changes["scrapers"])
+    if changes.get("billing_cycle") is not None:
+        if changes["billing_cycle"] not in BILLING_CYCLES:
+            raise HTTPException(status_code=400, detail=f"Billing cycle must be one of {', '.join(BILLING_CYCLES)}")
+        # Usage carries over into the period of the new cycle that contains today
+        changes["billing_anchor"] = license.billing_anchor or datetime.utcnow().date()
+        changes["period_end"] = current_period(changes["billing_cycle"], changes["billing_anchor"], datetime.utcnow().date())[1]
+    for field, value in changes.items():
+        if value is None and field not in LIMIT_FIELDS:
+            continue  # Only limits can be cleared
+        setattr(license, field, value)
+    db.commit()
+    logger.info(f"License {request.key} updated successfully")
+    return {"status": "License updated"}
+
 @app.post("/delete_license")
 def delete_license(request: DeleteLicenseRequest, db: Session = Depends(get_db)):
     license = db.query(License).filter(License.key == request.key).first()
@@ -105,44 +338,79 @@ def delete_license(request: DeleteLicenseRequest, db: Session = Depends(get_db))
     logger.info(f"License {request.key} deleted successfully")
     return {"status": "License deleted"}
 
+@app.post("/delete_licenses")
+def delete_licenses(request: BulkDeleteLicensesRequest, db: Session = Depends(get_db)):
+    if len(request.keys) > MAX_BULK:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK} licenses per request")
+    keys = unique(request.keys)
+    found = [key for (key,) in db.query(License.key).filter(License.key.in_(keys))]
+    if found:
+        # Entitlements are removed explicitly too, for databases that don't enforce the cascade
+        db.execute(delete(LicenseScraper).where(LicenseScraper.license_key.in_(found)))
+        db.execute(delete(License).where(License.key.in_(found)))
+        db.commit()
+    found_keys = set(found)
+    logger.info(f"{len(found)} licenses deleted successfully")
+    return {"status": "Licenses deleted", "deleted": found, "missing": [key for key in keys if key not in found_keys]}
+
 @app.get("/list_licenses")
-def list_licenses(db: Session = Depends(get_db)):
-    licenses = db.query(License).all()
-    result = []
-    for license in licenses:
-        result.append({
-            "key": license.key,
-            "valid_until": license.valid_until.isoformat(),
-            "scrapers": license.scrapers.split(","),
-            "usage_per_month": license.usage_per_month,
-            "usage_count": license.usage_count
-        })
-    logger.info("List licenses requested")
-    return {"licenses": result}
-
-# Background Task to Reset Monthly Usage
-def reset_monthly_usage():
-    while True:
-        now = datetime.utcnow()
-        # Calculate next reset time (first day of next month at 00:00 UTC)
-        if now.month == 12:
-            next_reset = datetime(year=now.year + 1, month=1, day=1)
-        else:
-            next_reset = datetime(year=now.year, month=now.month + 1, day=1)
-        delta_seconds = (next_reset - now).total_seconds()
-        logger.info(f"Next monthly usage reset in {delta_seconds} seconds")
-        time.sleep(delta_seconds)
-        # Reset usage_count
-        with SessionLocal() as db:
-            db.query(License).update({License.usage_count: 0})
-            db.commit()
-            logger.info("Monthly usage counts reset")
+def list_licenses(
+    limit: int = 100,
+    after: Optional[str] = None,
+    key_prefix: Optional[str] = None,
+    scraper: Optional[str] = None,
+    expires_after: Optional[str] = None,
+    expires_before: Optional[str] = None,
+    min_usage: Optional[float] = None,
+    max_usage: Optional[float] = None,
+    db: Session = Depends(get_db)
+):
+    # Keyset pagination in key order: pass the returned next_after as `after` for the next page.
+    # Usage filters are percentages of usage_per_month; scraper also matches licenses entitled to "all".
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"Limit must be between 1 and {MAX_PAGE_SIZE}")
+    query = db.query(License)
+    if after is not None:
+        query = query.filter(License.key > after)
+    if key_prefix:
+        # A key range rather than LIKE, so the primary key index is used
+        query = query.filter(License.key >= key_prefix, License.key < key_prefix + "\U0010ffff")
+    if scraper:
+        query = query.filter(License.scraper_entries.any(LicenseScraper.scraper.in_((scraper, "all"))))
+    if expires_after:
+        query = query.filter(License.valid_until >= parse_date(expires_after, "expires_after"))
+    if expires_before:
+        query = query.filter(License.valid_until < parse_date(expires_before, "expires_before"))
+    if min_usage is not None:
+        query = query.filter(USAGE_RATIO >= min_usage / 100)
+    if max_usage is not None:
+        query = query.filter(USAGE_RATIO <= max_usage / 100)
+    licenses = query.order_by(License.key).limit(limit + 1).all()
+    next_after = licenses[limit - 1].key if len(licenses) > limit else None
+    logger.debug("Listed %d licenses", min(len(licenses), limit))
+    return {
+        "licenses": [to_entitlements(license) for license in licenses[:limit]],
+        "next_after": next_after
+    }
+
+@app.get("/metrics")
+def metrics():
+    return Response(content=registry.render(), media_type=CONTENT_TYPE)
+
+@app.get("/healthz")
+def healthz():
+    return {"status": "ok"}
+
+@app.get("/readyz")
+def readyz():
+    return JSONResponse(readiness.status(), status_code=200 if readiness.ready else 503)
 
-# Start background thread
-reset_thread = threading.Thread(target=reset_monthly_usage, daemon=True)
-reset_thread.start()
+@app.post("/roll_over_usage")
+def roll_over_usage():
+    # Resets idle licenses whose period has ended; licenses with traffic are reset on first access anyway.
+    # Idempotent, so a cron job may call it on every worker as often as it likes.
+    return {"rolled_over": sweep(SessionLocal, datetime.utcnow().date(), SWEEP_CHUNK_SIZE)}
 
 if __name__ == "__main__":
     import uvicorn
-    from sqlalchemy.orm import sessionmaker
-    uvicorn.run(app, host=config["license_server"]["ip"], port=config["license_server"]["port"])
+    uvicorn.run(app, host=config["license_server"]["ip"], port=config["license_server"]["port"], access_log=config["license_server"].get("access_log", False))
@@ -1,14 +1,38 @@
 # license_server/models.py
-from sqlalchemy import Column, String, Integer, Date
+from sqlalchemy import Column, String, Integer, Float, Date, ForeignKey, Index, cast, func, literal_column
+from sqlalchemy.ext.associationproxy import association_proxy
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import relationship
 
 Base = declarative_base()
 
+class LicenseScraper(Base):
+    __tablename__ = 'license_scrapers'
+
+    license_key = Column(String, ForeignKey('licenses.key', ondelete="CASCADE"), primary_key=True)
+    scraper = Column(String, primary_key=True, index=True)  # Scraper name or "all"
+
 class License(Base):
     __tablename__ = 'licenses'
 
     key = Column(String, primary_key=True, index=True)
-    valid_until = Column(Date, nullable=False)
-    scrapers = Column(String, nullable=False)  # Comma-separated scraper names or "all"
+    valid_until = Column(Date, nullable=False, index=True)
     usage_per_month = Column(Integer, nullable=False)
     usage_count = Column(Integer, default=0)
+    # Edge limits enforced by the public server; NULL means unlimited
+    rate_limit = Column(Float, nullable=True)  # Requests per second (token bucket refill rate)
+    burst = Column(Integer, nullable=True)  # Token bucket size; defaults to the rate
+    max_in_flight = Column(Integer, nullable=True)  # Concurrent requests
+    # Billing period: usage_count counts jobs since the last reset, which happens lazily once period_end has passed
+    billing_cycle = Column(String, nullable=True)  # "calendar" (NULL) or "anniversary"
+    billing_anchor = Column(Date, nullable=True)  # Day anniversary periods start from, usually the creation date
+    period_end = Column(Date, nullable=True, index=True)  # Exclusive end of the current period
+
+    # Entitlements are rows in license_scrapers; selectin loads them for a whole page in one query
+    scraper_entries = relationship(LicenseScraper, cascade="all, delete-orphan", passive_deletes=True, lazy="selectin")
+    scrapers = association_proxy("scraper_entries", "scraper", creator=lambda scraper: LicenseScraper(scraper=scraper))
+
+# Fraction of the monthly quota used; indexed so usage filters don't scan the table.
+# No bound parameters in here, or queries would not match the indexed expression.
+USAGE_RATIO = cast(License.usage_count, Float) / func.nullif(License.usage_per_month, literal_column("0"))
+Index("ix_licenses_usage_ratio", USAGE_RATIO)
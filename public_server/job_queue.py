@@ -0,0 +1,244 @@
+# public_server/job_queue.py
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+from common.logging import setup_logging
+
+logger = setup_logging("job_queue")
+
+TERMINAL_STATUSES = ("success", "error")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    license_key TEXT NOT NULL,
+    scraper_name TEXT NOT NULL,
+    params TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_expires REAL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+DROP INDEX IF EXISTS ix_jobs_pending;
+CREATE INDEX IF NOT EXISTS ix_jobs_priority ON jobs (status, priority, scraper_name);
+CREATE INDEX IF NOT EXISTS ix_jobs_license ON jobs (license_key, status, priority, scraper_name, created_at);
+CREATE INDEX IF NOT EXISTS ix_jobs_lease ON jobs (status, lease_expires);
+CREATE TABLE IF NOT EXISTS license_turns (
+    license_key TEXT PRIMARY KEY,
+    last_served REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_license_turns_served ON license_turns (last_served);
+-- Every license with queued work has a turn row; covers queues from before enqueue added them
+INSERT OR IGNORE INTO license_turns (license_key, last_served)
+    SELECT DISTINCT license_key, 0 FROM jobs WHERE status IN ('pending', 'running');
+"""
+
+class JobQueue:
+    """Durable SQLite-backed job queue shared by the public server and pulling scraper servers.
+
+    Claims are ordered by priority first, then by the license that was served
+    least recently, so within a priority level every license takes turns no
+    matter how many jobs it has queued. Claimed jobs hold a lease; if a worker
+    dies the lease expires and the job is handed out again, up to max_attempts.
+
+    A claim walks the priority levels from the top, picks the license whose
+    turn it is from license_turns, then takes that license's oldest job; each
+    step is an index lookup, so claiming doesn't sort the pending jobs.
+    purge() drops the turn rows of licenses with nothing queued or running,
+    so the turn scan grows with the licenses that have work, not with every
+    license that ever used the queue.
+    """
+
+    def __init__(self, path: str, lease_seconds: float = 300.0, max_attempts: int = 3, max_priority: int = 9, retention_seconds: float = 86400.0):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.max_priority = max_priority
+        self.retention_seconds = retention_seconds
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    @classmethod
+    def from_config(cls, config: Dict) -> "JobQueue":
+        return cls(
+            path=config.get("path", "./jobs.db"),
+            lease_seconds=config.get("lease_seconds", 300.0),
+            max_attempts=config.get("max_attempts", 3),
+            max_priority=config.get("max_priority", 9),
+            retention_seconds=config.get("retention_seconds", 86400.0),
+        )
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    def enqueue(self, license_key: str, scraper_name: str, params: dict, priority: int = 0) -> str:
+        job_id = str(uuid.uuid4())
+        priority = max(0, min(priority, self.max_priority))
+        with self._lock:
+            # One transaction, so purge() in another process can't drop the turn row between the two
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.execute(
+                    "INSERT INTO jobs (id, license_key, scraper_name, params, priority, status, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, 'pending', ?)",
+                    (job_id, license_key, scraper_name, json.dumps(params), priority, time.time()),
+                )
+                # A license that was never served, or not since its turn row was purged, goes first in its priority level
+                self.conn.execute(
+                    "INSERT OR IGNORE INTO license_turns (license_key, last_served) VALUES (?, 0)", (license_key,)
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return job_id
+
+    def _expire_leases(self, now: float):
+        self.conn.execute(
+            "UPDATE jobs SET status = 'error', error = 'Lease expired too many times', finished_at = ? "
+            "WHERE status = 'running' AND lease_expires < ? AND attempts >= ?",
+            (now, now, self.max_attempts),
+        )
+        self.conn.execute(
+            "UPDATE jobs SET status = 'pending', worker = NULL, lease_expires = NULL "
+            "WHERE status = 'running' AND lease_expires < ?",
+            (now,),
+        )
+
+    def _next_job(self, scraper_filter: str, args: tuple) -> Optional[sqlite3.Row]:
+        top = self.conn.execute("SELECT MAX(priority) FROM jobs WHERE status = 'pending'").fetchone()[0]
+        if top is None:
+            return None
+        # Priorities are clamped to 0..max_priority on enqueue, so this is a handful of index probes
+        for priority in range(top, -1, -1):
+            if self.conn.execute(
+                f"SELECT 1 FROM jobs j WHERE j.status = 'pending' AND j.priority = ? {scraper_filter} LIMIT 1",
+                (priority, *args),
+            ).fetchone() is None:
+                continue
+            license_row = self.conn.execute(
+                "SELECT t.license_key FROM license_turns t WHERE EXISTS ("
+                "SELECT 1 FROM jobs j WHERE j.license_key = t.license_key AND j.status = 'pending' "
+                f"AND j.priority = ? {scraper_filter}) ORDER BY t.last_served ASC LIMIT 1",
+                (priority, *args),
+            ).fetchone()
+            if license_row is None:
+                continue
+            return self.conn.execute(
+                "SELECT j.id, j.license_key, j.scraper_name, j.params FROM jobs j "
+                f"WHERE j.license_key = ? AND j.status = 'pending' AND j.priority = ? {scraper_filter} "
+                "ORDER BY j.created_at ASC LIMIT 1",
+                (license_row["license_key"], priority, *args),
+            ).fetchone()
+        return None
+
+    def claim(self, worker: str, scrapers: List[str], limit: int = 1) -> List[Dict]:
+        claimed = []
+        if limit <= 0 or not scrapers:
+            return claimed
+        if "all" in scrapers:
+            scraper_filter, args = "", ()
+        else:
+            scraper_filter = f"AND j.scraper_name IN ({','.join('?' * len(scrapers))})"
+            args = tuple(scrapers)
+        with self._lock:
+            now = time.time()
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._expire_leases(now)
+                for _ in range(limit):
+                    row = self._next_job(scraper_filter, args)
+                    if row is None:
+                        break
+                    now = time.time()
+                    self.conn.execute(
+                        "UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1, "
+                        "lease_expires = ?, started_at = ? WHERE id = ?",
+                        (worker, now + self.lease_seconds, now, row["id"]),
+                    )
+                    self.conn.execute(
+                        "UPDATE license_turns SET last_served = ? WHERE license_key = ?",
+                        (now, row["license_key"]),
+                    )
+                    claimed.append({
+                        "id": row["id"],
+                        "scraper_name": row["scraper_name"],
+                        "params": json.loads(row["params"]),
+                    })
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return claimed
+
+    def extend(self, worker: str, job_ids: List[str]):
+        if not job_ids:
+            return
+        with self._lock:
+            self.conn.execute(
+                f"UPDATE jobs SET lease_expires = ? WHERE worker = ? AND status = 'running' "
+                f"AND id IN ({','.join('?' * len(job_ids))})",
+                (time.time() + self.lease_seconds, worker, *job_ids),
+            )
+
+    def complete(self, job_id: str, worker: str, status: str, data=None, error: Optional[str] = None) -> bool:
+        with self._lock:
+            if status == "retry":
+                # The worker could not start the job (e.g. saturated); give it back without using an attempt
+                cursor = self.conn.execute(
+                    "UPDATE jobs SET status = 'pending', worker = NULL, lease_expires = NULL, attempts = attempts - 1 "
+                    "WHERE id = ? AND worker = ? AND status = 'running'",
+                    (job_id, worker),
+                )
+            else:
+                cursor = self.conn.execute(
+                    "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, lease_expires = NULL "
+                    "WHERE id = ? AND worker = ? AND status = 'running'",
+                    (status, None if data is None else json.dumps(data), error, time.time(), job_id, worker),
+                )
+        return cursor.rowcount == 1
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT id, scraper_name, priority, status, result, error, attempts, created_at, started_at, finished_at "
+                "FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["data"] = None if job.pop("result") is None else json.loads(row["result"])
+        return job
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self.conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def purge(self) -> int:
+        with self._lock:
+            cursor = self.conn.execute(
+                "DELETE FROM jobs WHERE status IN ('success', 'error') AND finished_at < ?",
+                (time.time() - self.retention_seconds,),
+            )
+            # Claims walk license_turns, so keep it to licenses with queued work; enqueue adds them back
+            self.conn.execute(
+                "DELETE FROM license_turns WHERE NOT EXISTS (SELECT 1 FROM jobs j WHERE j.license_key = license_turns.license_key "
+                "AND j.status IN ('pending', 'running'))"
+            )
+        return cursor.rowcount
@@ -0,0 +1,206 @@
+# public_server/license_cache.py
+import asyncio
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Dict, List, Optional
+from common.http_client import HTTPClientPool
+from common.logging import setup_logging
+
+logger = setup_logging("license_cache")
+
+class LicenseError(Exception):
+    pass
+
+class LicenseEntry:
+    def __init__(self, data: Dict):
+        self.key = data["key"]
+        self.scrapers: List[str] = data["scrapers"]
+        self.valid_until: date = datetime.fromisoformat(data["valid_until"]).date()
+        self.usage_per_month: int = data["usage_per_month"]
+        self.usage_count: int = data["usage_count"]  # As last reported by the license server
+        self.set_limits(data)
+        self.pending = 0  # Admitted here but not yet flushed to the license server
+        self.unsynced = 0  # Admitted since usage_count was last refreshed
+        self.fetched_at = time.monotonic()
+
+    def set_limits(self, data: Dict):
+        self.rate_limit: Optional[float] = data.get("rate_limit")
+        self.burst: Optional[int] = data.get("burst")
+        self.max_in_flight: Optional[int] = data.get("max_in_flight")
+
+    def remaining(self) -> int:
+        return self.usage_per_month - self.usage_count - self.pending
+
+class LicenseCache:
+    """TTL + LRU cache of license entitlements with locally metered usage.
+
+    Usage is counted in-process and written behind to the license server's
+    /usage_bulk endpoint every flush_interval seconds. A worker admits at most
+    max_unflushed jobs per license on a stale usage_count before it flushes
+    and refreshes synchronously, so with W public_server workers a license can
+    overshoot usage_per_month by at most W * max_unflushed jobs.
+    """
+
+    def __init__(self, http_pool: HTTPClientPool, license_server_url: str, timeout: float = 5.0, ttl: float = 30.0, negative_ttl: float = 5.0, max_entries: int = 10000, max_unflushed: int = 50, flush_interval: float = 2.0):
+        self.http_pool = http_pool
+        self.license_server_url = license_server_url
+        self.timeout = timeout
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.max_unflushed = max_unflushed
+        self.flush_interval = flush_interval
+        self.entries: "OrderedDict[str, LicenseEntry]" = OrderedDict()
+        self.invalid: Dict[str, float] = {}  # Unknown keys -> time.monotonic() they were looked up
+        self.unflushed: Dict[str, int] = {}
+        self._fetches: Dict[str, asyncio.Task] = {}
+        self._flush_lock = asyncio.Lock()
+        self._flusher: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_config(cls, http_pool: HTTPClientPool, license_server_url: str, timeout: float, config: Optional[Dict]) -> "LicenseCache":
+        config = config or {}
+        return cls(
+            http_pool,
+            license_server_url,
+            timeout=timeout,
+            ttl=config.get("ttl", 30.0),
+            negative_ttl=config.get("negative_ttl", 5.0),
+            max_entries=config.get("max_entries", 10000),
+            max_unflushed=config.get("max_unflushed", 50),
+            flush_interval=config.get("flush_interval", 2.0),
+        )
+
+    @property
+    def client(self):
+        return self.http_pool.get(self.license_server_url)
+
+    async def _fetch(self, key: str) -> Optional[LicenseEntry]:
+        response = await self.client.post("/entitlements", json={"key": key}, timeout=self.timeout)
+        if response.status_code in (400, 404):
+            return None
+        response.raise_for_status()
+        return LicenseEntry(response.json())
+
+    def _store(self, entry: LicenseEntry):
+        previous = self.entries.get(entry.key)
+        if previous is not None:
+            entry.pending = previous.pending  # Unflushed usage survives a refresh
+        self.entries[entry.key] = entry
+        self.entries.move_to_end(entry.key)
+        while len(self.entries) > self.max_entries:
+            # Evicted entries keep their usage in self.unflushed until the next flush
+            self.entries.popitem(last=False)
+
+    def peek(self, key: str) -> Optional[LicenseEntry]:
+        # Whatever is cached, however old; never goes to the license server
+        return self.entries.get(key)
+
+    async def get(self, key: str) -> Optional[LicenseEntry]:
+        now = time.monotonic()
+        entry = self.entries.get(key)
+        if entry is not None and now - entry.fetched_at < self.ttl:
+            self.entries.move_to_end(key)
+            return entry
+        invalid_at = self.invalid.get(key)
+        if invalid_at is not None and now - invalid_at < self.negative_ttl:
+            return None
+        # Concurrent misses for the same key share one upstream lookup, run as its own task so a
+        # cancelled caller (client gone, timeout) stops waiting without stranding the others
+        task = self._fetches.get(key)
+        if task is None:
+            task = asyncio.create_task(self._load(key))
+            self._fetches[key] = task
+            task.add_done_callback(lambda done: self._fetched(key, done))
+        return await asyncio.shield(task)
+
+    async def _load(self, key: str) -> Optional[LicenseEntry]:
+        entry = await self._fetch(key)
+        if entry is None:
+            self.invalid[key] = time.monotonic()
+            self.entries.pop(key, None)
+            return None
+        self.invalid.pop(key, None)
+        self._store(entry)
+        return self.entries[key]
+
+    def _fetched(self, key: str, task: asyncio.Task):
+        if self._fetches.get(key) is task:
+            del self._fetches[key]
+        if not task.cancelled():
+            task.exception()  # Mark retrieved even if every caller gave up; callers re-raise it themselves
+
+    async def acquire(self, key: str, count: int = 1) -> LicenseEntry:
+        entry = await self.get(key)
+        if entry is None:
+            raise LicenseError("Invalid license key")
+        if entry.valid_until < datetime.utcnow().date():
+            raise LicenseError("License expired")
+        if entry.unsynced + count > self.max_unflushed:
+            # Too much usage admitted on a stale count; sync before admitting more
+            await self.flush()
+            entry = await self.get(key)
+            if entry is None:
+                raise LicenseError("Invalid license key")
+        if entry.remaining() < count:
+            raise LicenseError("License usage limit reached")
+        entry.pending += count
+        entry.unsynced += count
+        self.unflushed[key] = self.unflushed.get(key, 0) + count
+        return entry
+
+    def invalidate(self, key: str):
+        self.entries.pop(key, None)
+        self.invalid.pop(key, None)
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self.unflushed:
+                return
+            usage, self.unflushed = self.unflushed, {}
+            try:
+                response = await self.client.post("/usage_bulk", json={"usage": usage}, timeout=self.timeout)
+                response.raise_for_status()
+                body = response.json()
+            except Exception:
+                for key, count in usage.items():
+                    self.unflushed[key] = self.unflushed.get(key, 0) + count
+                raise
+            now = time.monotonic()
+            for key, data in body.get("licenses", {}).items():
+                entry = self.entries.get(key)
+                if entry is None:
+                    continue
+                entry.pending -= usage.get(key, 0)
+                entry.scrapers = data["scrapers"]
+                entry.valid_until = datetime.fromisoformat(data["valid_until"]).date()
+                entry.usage_count = data["usage_count"]
+                entry.usage_per_month = data["usage_per_month"]
+                entry.set_limits(data)
+                entry.unsynced = 0
+                entry.fetched_at = now
+            for key in body.get("missing", []):
+                self.invalidate(key)
+            logger.debug(f"Flushed usage for {len(usage)} licenses")
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Usage flush failed: {e}")
+
+    def start(self):
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Final usage flush failed, {sum(self.unflushed.values())} jobs not recorded: {e}")
@@ -1,47 +1,354 @@
 # public_server/load_balancer.py
-import requests
+import httpx
 import asyncio
-from typing import List, Dict
-from common.utils import get_cpu_usage, get_memory_usage
+import time
+from contextlib import contextmanager
+from typing import List, Dict, Optional, Set, Tuple
+from strategies import Strategy, create_strategy
+from resilience import CircuitBreaker, LatencyTracker, ServerBusy
+from usage_stats import UsageStats
+from common.http_client import HTTPClientPool
 from common.logging import setup_logging
+from common.metrics import registry
 
 logger = setup_logging("load_balancer")
 
+SELECT_SECONDS = registry.histogram(
+    "balancer_select_seconds", "Time to pick a scraper server",
+    buckets=(0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.005)
+)
+UPSTREAM_SECONDS = registry.histogram(
+    "upstream_scrape_seconds", "Scraper server request latency by outcome", ["scraper", "server", "outcome"]
+)
+
+class ServerState:
+    """Last known telemetry for one scraper server."""
+
+    def __init__(self, server: Dict, dynamic: bool = False, breaker: Optional[CircuitBreaker] = None):
+        self.name = server['name']
+        self.breaker = breaker or CircuitBreaker()
+        self.configure(server)
+        self.dynamic = dynamic  # Registered itself and pushes telemetry, rather than listed in config and polled
+        self.last_seen = time.monotonic()
+        self.load = 100.0
+        self.cpu = 100.0
+        self.memory = 100.0
+        self.remote_in_flight = 0
+        self.ready = True  # Servers that don't report readiness are taken as ready once they report telemetry
+        # Worker id -> (last seen, telemetry) for nodes running several worker processes behind one port
+        self.workers: Dict[str, Tuple[float, Dict]] = {}
+        self.updated_at: Optional[float] = None  # time.monotonic() of the last successful poll
+        # Accounting done by this balancer itself, independent of /load
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.ewma_latency: Optional[float] = None
+
+    def configure(self, server: Dict):
+        self.server = server
+        self.scrapers = server.get('scrapers', [])
+        self.weight = float(server.get('weight', 1.0))
+
+    def update(self, telemetry: Dict, worker: Optional[str] = None):
+        if worker is not None:
+            self.workers[worker] = (time.monotonic(), telemetry)
+            telemetry = self._combined()
+        self._apply(telemetry)
+        self.updated_at = time.monotonic()
+
+    def _apply(self, telemetry: Dict):
+        self.load = telemetry.get("load", 100.0)
+        self.cpu = telemetry.get("cpu", self.load)
+        self.memory = telemetry.get("memory", self.load)
+        self.remote_in_flight = telemetry.get("in_flight", 0)
+        self.ready = telemetry.get("ready", True)
+
+    def _combined(self) -> Dict:
+        # The workers share the host and the port: host load is the worst sample, work in flight adds
+        # up, and the node is only ready once every worker taking connections is
+        reports = [telemetry for _, telemetry in self.workers.values()]
+        combined = {"in_flight": sum(report.get("in_flight", 0) for report in reports), "ready": all(report.get("ready", True) for report in reports)}
+        for key in ("load", "cpu", "memory"):
+            values = [report[key] for report in reports if key in report]
+            if values:
+                combined[key] = max(values)
+        return combined
+
+    def drop_worker(self, worker: str):
+        if self.workers.pop(worker, None) is not None and self.workers:
+            self._apply(self._combined())
+
+    def record_result(self, latency: float, success: bool, alpha: float):
+        self.completed += 1
+        if not success:
+            self.failed += 1
+            return  # Fast rejections and errors would make the server look quicker than it is
+        if self.ewma_latency is None:
+            self.ewma_latency = latency
+        else:
+            self.ewma_latency = alpha * latency + (1 - alpha) * self.ewma_latency
+
+    def is_healthy(self, now: float, ttl: float) -> bool:
+        return self.updated_at is not None and now - self.updated_at <= ttl
+
+    def to_dict(self, now: float, ttl: float) -> Dict:
+        return {
+            "name": self.name,
+            "ip": self.server['ip'],
+            "port": self.server['port'],
+            "scrapers": self.scrapers,
+            "dynamic": self.dynamic,
+            "load": self.load,
+            "cpu": self.cpu,
+            "memory": self.memory,
+            "in_flight": self.remote_in_flight,
+            "local_in_flight": self.in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "ewma_latency": self.ewma_latency,
+            "age": None if self.updated_at is None else round(now - self.updated_at, 3),
+            "healthy": self.is_healthy(now, ttl),
+            "ready": self.ready,
+            "workers": len(self.workers),
+            "circuit": self.breaker.state,
+        }
+
 class LoadBalancer:
-    def __init__(self, scraper_servers: List[Dict], threshold_cpu: float = 80.0, threshold_memory: float = 80.0):
+    def __init__(self, scraper_servers: List[Dict], http_pool: HTTPClientPool, threshold_cpu: float = 80.0, threshold_memory: float = 80.0, load_timeout: float = 5.0, poll_interval: float = 2.0, telemetry_ttl: float = 10.0, strategy: str = "least_outstanding", scraper_strategies: Optional[Dict[str, str]] = None, ewma_alpha: float = 0.3, registration_ttl: float = 30.0, breaker: Optional[Dict] = None, usage_stats: Optional[UsageStats] = None):
         self.scraper_servers = scraper_servers
+        self.http_pool = http_pool
         self.threshold_cpu = threshold_cpu
         self.threshold_memory = threshold_memory
+        self.load_timeout = load_timeout
+        self.poll_interval = poll_interval
+        self.telemetry_ttl = telemetry_ttl
+        self.ewma_alpha = ewma_alpha
+        self.registration_ttl = registration_ttl
+        self.breaker_config = breaker or {}
+        self.latencies: Dict[str, LatencyTracker] = {}  # Scraper name -> recent upstream latencies
+        self.idempotent: Set[str] = set()  # Scrapers that are safe to retry or hedge
+        self.usage_stats = usage_stats
+        self.servers: Dict[str, ServerState] = {}
+        self.by_scraper: Dict[str, Set[str]] = {}  # Scraper name (or "all") -> names of servers offering it
+        for server in scraper_servers:
+            self._add(ServerState(server, breaker=self._new_breaker()))
+        self.default_strategy = create_strategy(strategy)
+        self.scraper_strategies: Dict[str, Strategy] = {
+            name: create_strategy(strategy_name) for name, strategy_name in (scraper_strategies or {}).items()
+        }
+        self._poller: Optional[asyncio.Task] = None
+
+    def _new_breaker(self) -> CircuitBreaker:
+        return CircuitBreaker(
+            failure_threshold=self.breaker_config.get("failure_threshold", 5),
+            reset_timeout=self.breaker_config.get("reset_timeout", 10.0),
+            half_open_probes=self.breaker_config.get("half_open_probes", 1)
+        )
+
+    def _add(self, state: ServerState):
+        self.servers[state.name] = state
+        for scraper in state.scrapers:
+            self.by_scraper.setdefault(scraper, set()).add(state.name)
+
+    def _remove(self, name: str) -> Optional[ServerState]:
+        state = self.servers.pop(name, None)
+        if state is not None:
+            for scraper in state.scrapers:
+                names = self.by_scraper.get(scraper)
+                if names is not None:
+                    names.discard(name)
+                    if not names:
+                        del self.by_scraper[scraper]
+        return state
+
+    def register(self, server: Dict, telemetry: Optional[Dict] = None, worker: Optional[str] = None) -> ServerState:
+        # Re-registering keeps the balancer's own accounting for the server
+        state = self._remove(server['name'])
+        if state is None:
+            state = ServerState(server, dynamic=True, breaker=self._new_breaker())
+            logger.info(f"Registered scraper server {state.name} with scrapers {state.scrapers}")
+        else:
+            state.configure(server)
+            state.dynamic = True
+        state.last_seen = time.monotonic()
+        if telemetry:
+            state.update(telemetry, worker)
+        elif worker is not None:
+            state.workers[worker] = (state.last_seen, {})
+        self._add(state)
+        return state
 
-    async def get_server_load(self, server: Dict) -> float:
+    def heartbeat(self, name: str, telemetry: Dict, scrapers: Optional[List[str]] = None, worker: Optional[str] = None) -> bool:
+        state = self.servers.get(name)
+        if state is None:
+            return False  # Unknown (e.g. expired or after a restart); the server must register again
+        if scrapers is not None and scrapers != state.scrapers:
+            return False  # Scrapers changed; a full registration also brings their options
+        if worker is not None and worker not in state.workers:
+            return False  # A worker the balancer dropped; it registers again
+        state.last_seen = time.monotonic()
+        state.update(telemetry, worker)
+        return True
+
+    def deregister(self, name: str, worker: Optional[str] = None) -> bool:
+        state = self.servers.get(name)
+        if state is None:
+            return False
+        if worker is not None:
+            state.drop_worker(worker)
+            if state.workers:
+                logger.info(f"Worker {worker} of scraper server {name} left, {len(state.workers)} still serving")
+                return True
+        self._remove(name)
+        logger.info(f"Deregistered scraper server {name}")
+        return True
+
+    def expire(self):
+        now = time.monotonic()
+        for state in list(self.servers.values()):
+            if not state.dynamic:
+                continue
+            for worker, (seen, _) in list(state.workers.items()):
+                if now - seen > self.registration_ttl and len(state.workers) > 1:
+                    logger.warning(f"Worker {worker} of scraper server {state.name} missed its heartbeats, dropping it")
+                    state.drop_worker(worker)
+            if now - state.last_seen > self.registration_ttl:
+                logger.warning(f"Scraper server {state.name} missed its heartbeats, removing it")
+                self._remove(state.name)
+
+    async def get_server_load(self, server: Dict) -> Optional[Dict]:
         try:
-            response = requests.get(f"http://{server['ip']}:{server['port']}/load", timeout=5)
+            client = self.http_pool.for_server(server)
+            response = await client.get("/load", timeout=self.load_timeout)
             if response.status_code == 200:
-                load = response.json().get("load", 100.0)
-                logger.info(f"Load for {server['name']}: {load}%")
-                return load
-        except requests.RequestException:
+                return response.json()
+        except httpx.HTTPError:
             logger.error(f"Failed to get load from {server['name']}")
-        return 100.0  # Treat unreachable server as fully loaded
-
-    async def select_server(self, scraper_name: str) -> Dict:
-        eligible_servers = [
-            server for server in self.scraper_servers
-            if "all" in server.get("scrapers", []) or scraper_name in server.get("scrapers", [])
-        ]
-        if not eligible_servers:
+        return None
+
+    async def refresh(self):
+        # Registered servers push telemetry with their heartbeats; only statically configured ones are polled
+        states = [state for state in self.servers.values() if not state.dynamic]
+        results = await asyncio.gather(*[self.get_server_load(s.server) for s in states])
+        for state, telemetry in zip(states, results):
+            if telemetry is not None:
+                state.update(telemetry)
+                logger.debug(f"Load for {state.name}: {state.load}%")
+                # An answered poll is the probe for a half-open breaker; an open one blocks the traffic that would close it.
+                # A closed breaker is left alone so scrape failures between polls still add up
+                if state.breaker.state != CircuitBreaker.CLOSED and state.breaker.available():
+                    state.breaker.record_success()
+            else:
+                state.breaker.record_failure()
+
+    async def _poll_loop(self):
+        while True:
+            try:
+                self.expire()
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Load polling failed: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    def start(self):
+        if self._poller is None:
+            self._poller = asyncio.create_task(self._poll_loop())
+
+    async def stop(self):
+        if self._poller is not None:
+            self._poller.cancel()
+            try:
+                await self._poller
+            except asyncio.CancelledError:
+                pass
+            self._poller = None
+
+    def snapshot(self) -> List[Dict]:
+        now = time.monotonic()
+        return [state.to_dict(now, self.telemetry_ttl) for state in self.servers.values()]
+
+    def strategy_for(self, scraper_name: str) -> Strategy:
+        return self.scraper_strategies.get(scraper_name, self.default_strategy)
+
+    def select_server(self, scraper_name: str, exclude: Optional[Set[str]] = None) -> Optional[Dict]:
+        with SELECT_SECONDS.time():
+            return self._select(scraper_name, exclude)
+
+    def _select(self, scraper_name: str, exclude: Optional[Set[str]]) -> Optional[Dict]:
+        # Pure in-memory lookup over the cached load table; the poller keeps it fresh
+        now = time.monotonic()
+        exclude = exclude or set()
+        names = self.by_scraper.get(scraper_name, set()) | self.by_scraper.get("all", set())
+        eligible = [self.servers[name] for name in names if name not in exclude]
+        if not eligible:
             logger.warning(f"No eligible servers found for scraper {scraper_name}")
             return None
 
-        # Gather loads concurrently
-        loads = await asyncio.gather(*[self.get_server_load(s) for s in eligible_servers])
-        server_loads = list(zip(eligible_servers, loads))
-        # Sort by load ascending
-        server_loads.sort(key=lambda x: x[1])
-
-        for server, load in server_loads:
-            if load < self.threshold_cpu and load < self.threshold_memory:
-                logger.info(f"Selected server {server['name']} with load {load}%")
-                return server
-        logger.warning("No servers available below load thresholds")
-        return None
+        healthy = [s for s in eligible if s.ready and s.is_healthy(now, self.telemetry_ttl) and s.breaker.available(now)]
+        if not healthy:
+            logger.warning(f"No ready servers with fresh telemetry for scraper {scraper_name}")
+            return None
+
+        available = [s for s in healthy if s.cpu < self.threshold_cpu and s.memory < self.threshold_memory]
+        if not available:
+            logger.warning("No servers available below load thresholds")
+            return None
+
+        selected = self.strategy_for(scraper_name).select(available)
+        logger.debug("Selected server %s (in flight %s, load %s%%)", selected.name, selected.in_flight, selected.load)
+        return selected.server
+
+    def in_flight(self) -> Dict:
+        return {(state.name,): state.in_flight for state in self.servers.values()}
+
+    def latency_percentile(self, scraper_name: str, pct: float, min_samples: int = 20) -> Optional[float]:
+        tracker = self.latencies.get(scraper_name)
+        if tracker is None or len(tracker.samples) < min_samples:
+            return None
+        return tracker.percentile(pct)
+
+    @contextmanager
+    def track(self, server: Dict, scraper_name: Optional[str] = None):
+        # Counts a job against the server while it runs and feeds the EWMA, latency window and breaker
+        state = self.servers.get(server['name'])
+        if state is None:
+            yield
+            return
+        state.in_flight += 1
+        state.breaker.on_dispatch()
+        started = time.monotonic()
+        outcome = "failure"
+        try:
+            yield
+            outcome = "success"
+        except ServerBusy:
+            outcome = "busy"
+            raise
+        except (asyncio.CancelledError, GeneratorExit):
+            outcome = "cancelled"  # e.g. the losing side of a hedged request, or a client that hung up
+            raise
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code < 500:
+                outcome = "rejected"  # The server answered; the request itself was bad
+            raise
+        finally:
+            state.in_flight -= 1
+            latency = time.monotonic() - started
+            UPSTREAM_SECONDS.observe(latency, scraper_name or "", state.name, outcome)
+            if self.usage_stats is not None and outcome in ("success", "failure", "rejected"):
+                self.usage_stats.record("server", state.name, latency, error=outcome != "success")
+            if outcome == "success":
+                state.breaker.record_success()
+                state.record_result(latency, True, self.ewma_alpha)
+                if scraper_name is not None:
+                    self.latencies.setdefault(scraper_name, LatencyTracker()).record(latency)
+            elif outcome == "failure":
+                state.breaker.record_failure()
+                state.record_result(latency, False, self.ewma_alpha)
+            elif outcome == "rejected":
+                state.breaker.record_success()
+                state.record_result(latency, False, self.ewma_alpha)
+            else:
+                state.breaker.on_abandon()
+                if outcome == "busy":
+                    state.record_result(latency, False, self.ewma_alpha)
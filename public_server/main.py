@@ -1,27 +1,152 @@
 # public_server/main.py
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
-import requests
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Dict, List, Optional
+import asyncio
+import httpx
 import json
+import math
 import os
-import asyncio
+import time
 from load_balancer import LoadBalancer
+from job_queue import JobQueue, TERMINAL_STATUSES
+from license_cache import LicenseCache, LicenseEntry, LicenseError
+from result_cache import ResultCache
+from resilience import ServerBusy, NoServerAvailable
+from rate_limit import RateLimiter, RateLimited
+from usage_stats import UsageStats, DIMENSIONS
+from common.authentication import validate_uuid
+from common.http_client import HTTPClientPool
 from common.logging import setup_logging
+from common.metrics import CONTENT_TYPE, parse_server_timing, registry, server_timing
+from common.readiness import Readiness
+from common.serialization import JSONResponse, envelope, loads, ndjson_line
 
 # Setup logging
 logger = setup_logging("public_server")
 
-app = FastAPI()
-
 # Load configuration
-CONFIG_PATH = os.path.join(os.path.dirname(__file__), '..', 'config', 'public_server_config.json')
+CONFIG_PATH = os.environ.get("PUBLIC_SERVER_CONFIG", os.path.join(os.path.dirname(__file__), '..', 'config', 'public_server_config.json'))
 with open(CONFIG_PATH) as f:
     config = json.load(f)
 
-LICENSE_SERVER_URL = f"http://{config['license_server']['ip']}:{config['license_server']['port']}/validate"
+LICENSE_SERVER_URL = f"http://{config['license_server']['ip']}:{config['license_server']['port']}"
 SCRAPER_SERVERS = config['scraper_servers']
+ADMIN_UUID = config['public_server'].get('admin_uuid')
+readiness = Readiness("public_server", target=config['public_server'].get('startup_target'))
+# Shared secret scraper servers present when they register; None leaves registration open
+REGISTRY_TOKEN = config.get('registry', {}).get('token')
+HTTP_CLIENT_CONFIG = config.get('http_client', {})
+LICENSE_TIMEOUT = HTTP_CLIENT_CONFIG.get('license_timeout', 5.0)
+SCRAPE_TIMEOUT = HTTP_CLIENT_CONFIG.get('scrape_timeout', 30.0)
+RESILIENCE_CONFIG = config.get('resilience', {})
+MAX_RETRIES = RESILIENCE_CONFIG.get('max_retries', 1)
+HEDGE_CONFIG = RESILIENCE_CONFIG.get('hedge', {})
+HEDGE_ENABLED = HEDGE_CONFIG.get('enabled', False)
+HEDGE_PERCENTILE = HEDGE_CONFIG.get('percentile', 95)
+HEDGE_MIN_SAMPLES = HEDGE_CONFIG.get('min_samples', 20)
+HEDGE_MIN_DELAY = HEDGE_CONFIG.get('min_delay', 0.05)
+STREAM_TIMEOUT = httpx.Timeout(HTTP_CLIENT_CONFIG.get('stream_timeout', 300.0), connect=HTTP_CLIENT_CONFIG.get('connect_timeout', 2.0))
+BATCH_CONFIG = config.get('batch', {})
+BATCH_CHUNK_SIZE = BATCH_CONFIG.get('chunk_size', 50)
+MAX_BATCH_JOBS = BATCH_CONFIG.get('max_jobs', 5000)
+BATCH_TIMEOUT = BATCH_CONFIG.get('timeout', 300.0)
+
+# Minute-level request counts and latencies per license, scraper and server for the god panel's charts
+usage_stats = UsageStats.from_config(config.get('usage_stats'))
+
+# Keep-alive connection pools, one per upstream (license server and each scraper server)
+http_pool = HTTPClientPool.from_config(HTTP_CLIENT_CONFIG)
+load_balancer = LoadBalancer(
+    scraper_servers=SCRAPER_SERVERS,
+    http_pool=http_pool,
+    load_timeout=HTTP_CLIENT_CONFIG.get('load_timeout', 5.0),
+    breaker=config.get('resilience', {}).get('circuit_breaker'),
+    usage_stats=usage_stats,
+    **config.get('load_balancer', {})
+)
+
+license_cache = LicenseCache.from_config(http_pool, LICENSE_SERVER_URL, LICENSE_TIMEOUT, config.get('license_cache'))
+
+# Per-license request rate and concurrency limits, enforced before anything else is done for a request
+rate_limiter = RateLimiter(max_entries=config.get('license_cache', {}).get('max_entries', 10000))
+
+RESULT_CACHE_CONFIG = config.get('result_cache', {})
+result_cache = ResultCache.from_config(RESULT_CACHE_CONFIG)
+RESULT_CACHE_ENABLED = RESULT_CACHE_CONFIG.get('enabled', True)
+
+# Durable queue for asynchronous jobs; scraper servers pull from it
+JOB_QUEUE_CONFIG = config.get('job_queue', {})
+job_queue = JobQueue.from_config(JOB_QUEUE_CONFIG)
+MAX_LONG_POLL = JOB_QUEUE_CONFIG.get('max_long_poll', 60.0)
+# Wakes long-polls in this process as soon as a job finishes; other workers fall back to re-reading
+job_events: Dict[str, asyncio.Event] = {}
+
+async def purge_jobs_loop():
+    while True:
+        await asyncio.sleep(JOB_QUEUE_CONFIG.get('purge_interval', 600.0))
+        try:
+            purged = await asyncio.to_thread(job_queue.purge)
+            if purged:
+                logger.info(f"Purged {purged} finished jobs")
+        except Exception as e:
+            logger.error(f"Job purge failed: {e}")
+
+# Job counts by status for /metrics, refreshed in the background so a scrape never queries SQLite on the event loop
+job_counts: Dict[str, int] = {}
+
+async def refresh_job_counts_loop():
+    while True:
+        try:
+            counts = await asyncio.to_thread(job_queue.stats)
+            # Statuses that emptied out report 0 rather than their last count
+            job_counts.update({**dict.fromkeys(job_counts, 0), **counts})
+        except Exception as e:
+            logger.error(f"Job count refresh failed: {e}")
+        await asyncio.sleep(JOB_QUEUE_CONFIG.get('stats_interval', 15.0))
 
-load_balancer = LoadBalancer(scraper_servers=SCRAPER_SERVERS)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    with readiness.phase("background_tasks"):
+        load_balancer.start()
+        license_cache.start()
+        usage_stats.start()
+        purge_task = asyncio.create_task(purge_jobs_loop())
+        counts_task = asyncio.create_task(refresh_job_counts_loop())
+    readiness.mark_ready()
+    yield
+    readiness.mark_not_ready()
+    purge_task.cancel()
+    counts_task.cancel()
+    await license_cache.stop()
+    await usage_stats.stop()
+    await load_balancer.stop()
+    await http_pool.close()
+    job_queue.close()
+
+app = FastAPI(lifespan=lifespan, default_response_class=JSONResponse)
+
+# Metrics exposed on /metrics; callback gauges are read when Prometheus scrapes
+LICENSE_SECONDS = registry.histogram("license_validation_seconds", "License check and usage charge latency", ["outcome"])
+registry.gauge("rate_limited_requests_total", "Requests rejected by per-license limits", function=lambda: rate_limiter.rejected, kind="counter")
+registry.gauge("license_in_flight_requests", "Requests holding a per-license slot", function=lambda: sum(rate_limiter.in_flight.values()))
+registry.gauge("server_in_flight_requests", "Requests in flight per scraper server", ["server"], function=load_balancer.in_flight)
+registry.gauge("job_queue_jobs", "Jobs in the durable queue by status", ["status"], function=lambda: {(status,): count for status, count in job_counts.items()})
+registry.gauge(
+    "result_cache_lookups_total", "Result cache lookups by result", ["result"], kind="counter",
+    function=lambda: {(name,): result_cache.stats()[name] for name in ("hits", "disk_hits", "misses", "coalesced")}
+)
+registry.gauge("result_cache_hit_ratio", "Result cache hits / lookups", function=lambda: result_cache.stats()["hit_rate"])
+registry.gauge("license_cache_entries", "Cached license entitlements", function=lambda: len(license_cache.entries))
+
+# Scraper servers answer 429/503 when their worker pool is saturated; the job never started there
+BUSY_STATUS_CODES = (429, 503)
+
+# Scraper servers report each scraper's CACHE_TTL with every /scrape response
+CACHE_TTL_HEADER = "X-Cache-TTL"
 
 # Pydantic Models
 class ClientRequest(BaseModel):
@@ -33,55 +158,601 @@ class ClientResponse(BaseModel):
     status: str
     data: dict
 
-@app.post("/submit", response_model=ClientResponse)
-async def submit_job(request: ClientRequest):
-    # Validate license key
+class RegisterRequest(BaseModel):
+    name: str
+    ip: str
+    port: int
+    scrapers: List[str]
+    weight: float = 1.0
+    scraper_options: Dict[str, dict] = {}  # Scraper name -> {"cache_ttl": ..., "idempotent": ...}
+    telemetry: Optional[dict] = None
+    worker: Optional[str] = None  # Set by nodes running several worker processes under one name
+
+class HeartbeatRequest(BaseModel):
+    name: str
+    telemetry: dict
+    scrapers: Optional[List[str]] = None
+    worker: Optional[str] = None
+
+class DeregisterRequest(BaseModel):
+    name: str
+    worker: Optional[str] = None
+
+class InvalidateLicenseRequest(BaseModel):
+    key: str
+
+class BatchJob(BaseModel):
+    id: Optional[str] = None
+    scraper_name: str
+    params: dict
+
+class BatchRequest(BaseModel):
+    license_key: str
+    jobs: List[BatchJob]
+
+class JobSubmitRequest(ClientRequest):
+    priority: int = 0
+
+class JobClaimRequest(BaseModel):
+    worker: str
+    scrapers: List[str]
+    max_jobs: int = 1
+
+class JobExtendRequest(BaseModel):
+    worker: str
+    job_ids: List[str]
+
+class JobCompleteRequest(BaseModel):
+    worker: str
+    status: str  # "success", "error" or "retry"
+    data: Any = None  # A dict, or the list of records a generator scraper yielded
+    error: str = None
+
+def rate_limited(license_key: str, error: RateLimited) -> HTTPException:
+    logger.warning(f"Rejected request for license {license_key}: {error}")
+    return HTTPException(status_code=429, detail=str(error), headers={"Retry-After": str(max(1, math.ceil(error.retry_after)))})
+
+def check_rate(license_key: str, cost: int = 1):
+    # Uses the limits of the cached entitlements, so an over-limit request costs no lookup at all
     try:
-        validate_response = requests.post(
-            LICENSE_SERVER_URL,
-            json={"key": request.license_key},
-            timeout=5
-        )
-        if validate_response.status_code != 200:
-            logger.warning(f"License validation failed for key {request.license_key}")
-            raise HTTPException(status_code=400, detail="Invalid license key")
-        license_info = validate_response.json()
-    except requests.RequestException:
+        rate_limiter.check_rate(license_key, license_cache.peek(license_key), cost)
+    except RateLimited as e:
+        raise rate_limited(license_key, e)
+
+def acquire_slot(license_key: str, cost: int = 1):
+    try:
+        rate_limiter.acquire(license_key, license_cache.peek(license_key), cost)
+    except RateLimited as e:
+        raise rate_limited(license_key, e)
+
+async def release_after(chunks: AsyncIterator[bytes], license_key: str) -> AsyncIterator[bytes]:
+    # Keeps the license's in-flight slot until the stream ends or the client goes away
+    try:
+        yield b""
+        async for chunk in chunks:
+            yield chunk
+    finally:
+        rate_limiter.release(license_key)
+
+# Phase durations of the current /submit request, reported back in its Server-Timing header
+request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+def add_timing(name: str, seconds: float):
+    timings = request_timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+def record_usage(license_key: str, scraper_name: str, latency: Optional[float] = None, error: bool = False, count: int = 1):
+    usage_stats.record("license", license_key, latency, error, count)
+    usage_stats.record("scraper", scraper_name, latency, error, count)
+
+async def fetch_license(license_key: str, count: int = 1) -> LicenseEntry:
+    # Served from the in-process cache; usage is written behind to the license server
+    started = time.perf_counter()
+    outcome = "valid"
+    try:
+        return await license_cache.acquire(license_key, count)
+    except LicenseError as e:
+        outcome = "invalid"
+        logger.warning(f"License validation failed for key {license_key}: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except httpx.HTTPError:
+        outcome = "error"
         logger.error("License server is unreachable")
         raise HTTPException(status_code=500, detail="License server error")
+    finally:
+        elapsed = time.perf_counter() - started
+        LICENSE_SECONDS.observe(elapsed, outcome)
+        add_timing("license", elapsed)
 
-    allowed_scrapers = license_info.get("scrapers", [])
-    if "all" not in allowed_scrapers and request.scraper_name not in allowed_scrapers:
-        logger.warning(f"Scraper {request.scraper_name} not allowed for license {request.license_key}")
-        raise HTTPException(status_code=403, detail="Scraper not allowed for this license")
+def scraper_allowed(license: LicenseEntry, scraper_name: str) -> bool:
+    return "all" in license.scrapers or scraper_name in license.scrapers
 
-    # Select an appropriate scraper server
-    server = await load_balancer.select_server(request.scraper_name)
-    if not server:
-        logger.error(f"No available servers for scraper {request.scraper_name}")
-        raise HTTPException(status_code=503, detail="No scraper servers available for this scraper")
+async def validate_license(license_key: str, scraper_name: str) -> LicenseEntry:
+    license = await fetch_license(license_key)
+    if not scraper_allowed(license, scraper_name):
+        logger.warning(f"Scraper {scraper_name} not allowed for license {license_key}")
+        raise HTTPException(status_code=403, detail="Scraper not allowed for this license")
+    return license
 
-    # Assign job to selected server
-    try:
-        scrape_response = requests.post(
-            f"http://{server['ip']}:{server['port']}/scrape",
+async def send_scrape(server: dict, scraper_name: str, params: dict) -> httpx.Response:
+    started = time.perf_counter()
+    with load_balancer.track(server, scraper_name):
+        scrape_response = await http_pool.for_server(server).post(
+            "/scrape",
             json={
-                "scraper_name": request.scraper_name,
-                "params": request.params
+                "scraper_name": scraper_name,
+                "params": params
             },
-            timeout=30
+            timeout=SCRAPE_TIMEOUT
         )
-        if scrape_response.status_code == 200:
-            logger.info(f"Job assigned to {server['name']} successfully")
-            return {"status": "success", "data": scrape_response.json()}
-        else:
-            logger.error(f"Scraper server {server['name']} returned error: {scrape_response.text}")
+        add_timing("upstream", time.perf_counter() - started)
+        if scrape_response.status_code in BUSY_STATUS_CODES:
+            raise ServerBusy()
+        scrape_response.raise_for_status()
+    for name, seconds in parse_server_timing(scrape_response.headers.get("Server-Timing")).items():
+        add_timing(name, seconds)
+    return scrape_response
+
+def select_or_fail(scraper_name: str, tried: set) -> dict:
+    started = time.perf_counter()
+    server = load_balancer.select_server(scraper_name, exclude=tried)
+    add_timing("select", time.perf_counter() - started)
+    if not server:
+        raise NoServerAvailable()
+    tried.add(server['name'])
+    return server
+
+async def hedged_scrape(server: dict, scraper_name: str, params: dict, tried: set) -> httpx.Response:
+    # If the first server is slower than the scraper's recent p95, race a duplicate on a second server
+    delay = load_balancer.latency_percentile(scraper_name, HEDGE_PERCENTILE, HEDGE_MIN_SAMPLES)
+    primary = asyncio.create_task(send_scrape(server, scraper_name, params))
+    if delay is None:
+        return await primary
+    done, _ = await asyncio.wait({primary}, timeout=max(delay, HEDGE_MIN_DELAY))
+    if done:
+        return primary.result()
+    try:
+        second = select_or_fail(scraper_name, tried)
+    except NoServerAvailable:
+        return await primary
+    logger.info(f"Hedging {scraper_name} job on {second['name']} after {delay:.3f}s")
+    tasks = [primary, asyncio.create_task(send_scrape(second, scraper_name, params))]
+    error = None
+    try:
+        for finished in asyncio.as_completed(tasks):
+            try:
+                return await finished
+            except (ServerBusy, httpx.HTTPError) as e:
+                error = e
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def dispatch_scrape(scraper_name: str, params: dict) -> bytes:
+    # Busy servers are skipped; idempotent scrapers are also retried elsewhere after a failure
+    idempotent = scraper_name in load_balancer.idempotent
+    tried = set()
+    retries = 0
+    while True:
+        try:
+            server = select_or_fail(scraper_name, tried)
+            if idempotent and HEDGE_ENABLED:
+                scrape_response = await hedged_scrape(server, scraper_name, params, tried)
+            else:
+                scrape_response = await send_scrape(server, scraper_name, params)
+            logger.debug("Job for %s completed successfully", scraper_name)
+            cache_ttl = scrape_response.headers.get(CACHE_TTL_HEADER)
+            if cache_ttl is not None:
+                result_cache.set_policy(scraper_name, float(cache_ttl))
+            return scrape_response.content
+        except NoServerAvailable:
+            logger.error(f"No available servers for scraper {scraper_name}")
+            raise HTTPException(status_code=503, detail="No scraper servers available for this scraper")
+        except ServerBusy:
+            logger.warning(f"Scraper server {server['name']} is busy, trying another server")
+        except httpx.HTTPStatusError as e:
+            logger.error(f"Scraper server {server['name']} returned error: {e.response.text}")
+            if not (idempotent and e.response.status_code >= 500 and retries < MAX_RETRIES):
+                raise HTTPException(status_code=500, detail="Scraper server error")
+            retries += 1
+        except httpx.HTTPError:
+            logger.error(f"Failed to communicate with scraper server {server['name']}")
+            if not (idempotent and retries < MAX_RETRIES):
+                raise HTTPException(status_code=503, detail="Scraper server unreachable")
+            retries += 1
+
+async def cached_scrape(scraper_name: str, params: dict) -> bytes:
+    ttl = result_cache.policy(scraper_name)
+    if not ttl:
+        # Not known to be cacheable (yet); the response teaches us the scraper's CACHE_TTL
+        body = await dispatch_scrape(scraper_name, params)
+        await result_cache.put(result_cache.key(scraper_name, params), body, result_cache.policy(scraper_name))
+        return body
+
+    key = result_cache.key(scraper_name, params)
+    body = await result_cache.get(key)
+    if body is not None:
+        return body
+
+    async def fetch() -> bytes:
+        body = await dispatch_scrape(scraper_name, params)
+        await result_cache.put(key, body, result_cache.policy(scraper_name))
+        return body
+
+    return await result_cache.coalesce(key, fetch)
+
+@app.post("/submit", response_model=ClientResponse)
+async def submit_job(request: ClientRequest):
+    received = time.perf_counter()
+    timings = {}
+    request_timings.set(timings)
+    acquire_slot(request.license_key)
+    try:
+        await validate_license(request.license_key, request.scraper_name)
+        started = time.perf_counter()
+        try:
+            if RESULT_CACHE_ENABLED:
+                body = await cached_scrape(request.scraper_name, request.params)
+            else:
+                body = await dispatch_scrape(request.scraper_name, request.params)
+        except HTTPException:
+            record_usage(request.license_key, request.scraper_name, time.perf_counter() - started, error=True)
+            raise
+        record_usage(request.license_key, request.scraper_name, time.perf_counter() - started)
+    finally:
+        rate_limiter.release(request.license_key)
+    timings["total"] = time.perf_counter() - received
+    # The scraper server's body is forwarded as-is inside the envelope instead of being decoded and re-encoded
+    return Response(content=envelope(body), media_type="application/json", headers={"Server-Timing": server_timing(timings)})
+
+async def stream_scrape(scraper_name: str, params: dict) -> AsyncIterator[bytes]:
+    # Yields b"" once an upstream stream is open, then relays its NDJSON bytes untouched
+    tried = set()
+    while True:
+        try:
+            server = select_or_fail(scraper_name, tried)
+        except NoServerAvailable:
+            logger.error(f"No available servers for scraper {scraper_name}")
+            raise HTTPException(status_code=503, detail="No scraper servers available for this scraper")
+        started = False
+        try:
+            with load_balancer.track(server):
+                async with http_pool.for_server(server).stream(
+                    "POST",
+                    "/scrape_stream",
+                    json={
+                        "scraper_name": scraper_name,
+                        "params": params
+                    },
+                    timeout=STREAM_TIMEOUT
+                ) as response:
+                    if response.status_code in BUSY_STATUS_CODES:
+                        raise ServerBusy()
+                    if response.is_error:
+                        await response.aread()
+                    response.raise_for_status()
+                    started = True
+                    yield b""
+                    async for chunk in response.aiter_raw():
+                        yield chunk
+            logger.debug("Stream for %s completed successfully", scraper_name)
+            return
+        except ServerBusy:
+            logger.warning(f"Scraper server {server['name']} is busy, trying another server")
+        except httpx.HTTPStatusError as e:
+            logger.error(f"Scraper server {server['name']} returned error: {e.response.text}")
             raise HTTPException(status_code=500, detail="Scraper server error")
-    except requests.RequestException:
-        logger.error(f"Failed to communicate with scraper server {server['name']}")
-        raise HTTPException(status_code=503, detail="Scraper server unreachable")
+        except httpx.HTTPError:
+            logger.error(f"Stream from scraper server {server['name']} failed")
+            if not started:
+                raise HTTPException(status_code=503, detail="Scraper server unreachable")
+            # Headers are already out; end the stream with an error line (after any partial line)
+            yield b"\n" + ndjson_line({"status": "error", "error": "Scraper server stream interrupted"})
+            return
+
+@app.post("/submit_stream")
+async def submit_stream(request: ClientRequest):
+    # Records are relayed as NDJSON as the scraper yields them, never buffered whole
+    acquire_slot(request.license_key)
+    try:
+        await validate_license(request.license_key, request.scraper_name)
+        started = time.perf_counter()
+        chunks = stream_scrape(request.scraper_name, request.params)
+        try:
+            await chunks.__anext__()  # Errors before the first byte still map to a status code
+        except HTTPException:
+            record_usage(request.license_key, request.scraper_name, time.perf_counter() - started, error=True)
+            raise
+        # Stream latency is measured to the first byte
+        record_usage(request.license_key, request.scraper_name, time.perf_counter() - started)
+    except BaseException:
+        rate_limiter.release(request.license_key)
+        raise
+    body = release_after(chunks, request.license_key)
+    await body.__anext__()
+    return StreamingResponse(body, media_type="application/x-ndjson")
+
+async def dispatch_chunk(scraper_name: str, jobs: List[BatchJob], results: asyncio.Queue):
+    # Sends one chunk of same-scraper jobs to a scraper server and forwards its NDJSON lines
+    pending = {job.id: job for job in jobs}
+    tried = set()
+    try:
+        while pending:
+            server = load_balancer.select_server(scraper_name, exclude=tried)
+            if not server:
+                raise ServerBusy("No scraper servers available for this scraper")
+            tried.add(server['name'])
+            try:
+                with load_balancer.track(server):
+                    async with http_pool.for_server(server).stream(
+                        "POST",
+                        "/scrape_batch",
+                        json={
+                            "scraper_name": scraper_name,
+                            "jobs": [{"id": job.id, "params": job.params} for job in pending.values()]
+                        },
+                        timeout=BATCH_TIMEOUT
+                    ) as response:
+                        if response.status_code in BUSY_STATUS_CODES:
+                            raise ServerBusy()
+                        response.raise_for_status()
+                        async for line in response.aiter_lines():
+                            if not line:
+                                continue
+                            result = loads(line)
+                            if pending.pop(result.get("id"), None) is not None:
+                                await results.put(result)
+                logger.debug("Batch chunk of %d jobs completed on %s", len(jobs), server['name'])
+            except ServerBusy:
+                logger.warning(f"Scraper server {server['name']} is busy, trying another server")
+                continue
+            if pending:
+                raise ServerBusy("Scraper server ended the batch early")
+    except Exception as e:
+        # Whatever went wrong, every job in the chunk must still get a result line
+        error = str(e) or "Scraper server error"
+        logger.error(f"Batch chunk for {scraper_name} failed: {error}")
+        for job_id in pending:
+            await results.put({"id": job_id, "status": "error", "error": error})
+
+@app.post("/submit_batch")
+async def submit_batch(request: BatchRequest):
+    if not request.jobs:
+        raise HTTPException(status_code=400, detail="Batch contains no jobs")
+    if len(request.jobs) > MAX_BATCH_JOBS:
+        raise HTTPException(status_code=400, detail=f"Batch exceeds {MAX_BATCH_JOBS} jobs")
+    for index, job in enumerate(request.jobs):
+        if job.id is None:
+            job.id = str(index)
+    if len({job.id for job in request.jobs}) != len(request.jobs):
+        raise HTTPException(status_code=400, detail="Batch job ids must be unique")
+    # A batch holds one in-flight slot and takes one rate token per job
+    acquire_slot(request.license_key, cost=len(request.jobs))
+    try:
+        # Checked without charging first, so jobs for scrapers the license doesn't cover cost nothing
+        license = await fetch_license(request.license_key, count=0)
+        rejected = []
+        groups: Dict[str, List[BatchJob]] = {}
+        for job in request.jobs:
+            if scraper_allowed(license, job.scraper_name):
+                groups.setdefault(job.scraper_name, []).append(job)
+            else:
+                rejected.append({"id": job.id, "status": "error", "error": "Scraper not allowed for this license"})
+        accepted = len(request.jobs) - len(rejected)
+        if accepted:
+            # The accepted jobs are charged once for the whole batch
+            await fetch_license(request.license_key, count=accepted)
+    except BaseException:
+        rate_limiter.release(request.license_key)
+        raise
+
+    results: asyncio.Queue = asyncio.Queue()
+    if accepted:
+        usage_stats.record("license", request.license_key, count=accepted)
+    for scraper_name, jobs in groups.items():
+        usage_stats.record("scraper", scraper_name, count=len(jobs))
+
+    async def stream():
+        for result in rejected:
+            yield ndjson_line(result)
+        tasks = [
+            asyncio.create_task(dispatch_chunk(scraper_name, jobs[i:i + BATCH_CHUNK_SIZE], results))
+            for scraper_name, jobs in groups.items()
+            for i in range(0, len(jobs), BATCH_CHUNK_SIZE)
+        ]
+        remaining = accepted
+        try:
+            while remaining:
+                yield ndjson_line(await results.get())
+                remaining -= 1
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    logger.debug("Accepted batch of %d jobs for license %s", len(request.jobs), request.license_key)
+    body = release_after(stream(), request.license_key)
+    await body.__anext__()
+    return StreamingResponse(body, media_type="application/x-ndjson")
+
+@app.post("/jobs")
+async def enqueue_job(request: JobSubmitRequest):
+    # Queued jobs don't hold a slot; the queue itself bounds how many run at once
+    check_rate(request.license_key)
+    await validate_license(request.license_key, request.scraper_name)
+    job_id = await asyncio.to_thread(
+        job_queue.enqueue, request.license_key, request.scraper_name, request.params, request.priority
+    )
+    record_usage(request.license_key, request.scraper_name)
+    logger.debug("Queued job %s for scraper %s", job_id, request.scraper_name)
+    return {"job_id": job_id, "status": "pending"}
+
+async def wait_for_job(job_id: str, timeout: float) -> dict:
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + min(timeout, MAX_LONG_POLL)
+    event = job_events.setdefault(job_id, asyncio.Event())
+    try:
+        while True:
+            job = await asyncio.to_thread(job_queue.get, job_id)
+            remaining = deadline - loop.time()
+            if job is None or job["status"] in TERMINAL_STATUSES or remaining <= 0:
+                return job
+            try:
+                await asyncio.wait_for(event.wait(), timeout=min(remaining, 1.0))
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        if not event.is_set():
+            job_events.pop(job_id, None)
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = 0):
+    # wait > 0 long-polls until the job finishes or the timeout expires
+    job = await wait_for_job(job_id, wait) if wait > 0 else await asyncio.to_thread(job_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/jobs/{job_id}/events")
+async def job_events_stream(job_id: str):
+    job = await asyncio.to_thread(job_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        current = job
+        last_status = None
+        while True:
+            if current["status"] != last_status:
+                last_status = current["status"]
+                yield f"event: {last_status}\ndata: {json.dumps(current)}\n\n"
+            if last_status in TERMINAL_STATUSES:
+                return
+            current = await wait_for_job(job_id, MAX_LONG_POLL)
+            if current is None:
+                return
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+def check_registry_token(token: Optional[str]):
+    if REGISTRY_TOKEN and token != REGISTRY_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid registry token")
+
+@app.post("/jobs/claim")
+async def claim_jobs(request: JobClaimRequest, x_registry_token: str = Header(None)):
+    # Worker-facing like /register: claims hand out other licenses' params and completions set results
+    check_registry_token(x_registry_token)
+    jobs = await asyncio.to_thread(job_queue.claim, request.worker, request.scrapers, request.max_jobs)
+    return {"jobs": jobs, "lease_seconds": job_queue.lease_seconds}
+
+@app.post("/jobs/extend")
+async def extend_jobs(request: JobExtendRequest, x_registry_token: str = Header(None)):
+    check_registry_token(x_registry_token)
+    await asyncio.to_thread(job_queue.extend, request.worker, request.job_ids)
+    return {"status": "extended"}
+
+@app.post("/jobs/{job_id}/complete")
+async def complete_job(job_id: str, request: JobCompleteRequest, x_registry_token: str = Header(None)):
+    check_registry_token(x_registry_token)
+    if request.status not in ("success", "error", "retry"):
+        raise HTTPException(status_code=400, detail="Invalid job status")
+    updated = await asyncio.to_thread(
+        job_queue.complete, job_id, request.worker, request.status, request.data, request.error
+    )
+    if not updated:
+        raise HTTPException(status_code=409, detail="Job is not leased to this worker")
+    event = job_events.pop(job_id, None)
+    if event is not None and request.status != "retry":
+        event.set()
+    return {"status": "recorded"}
+
+@app.get("/queue/stats")
+async def queue_stats():
+    return {"jobs": await asyncio.to_thread(job_queue.stats)}
+
+@app.post("/register")
+async def register_server(request: RegisterRequest, x_registry_token: str = Header(None)):
+    check_registry_token(x_registry_token)
+    load_balancer.register({
+        "name": request.name,
+        "ip": request.ip,
+        "port": request.port,
+        "scrapers": request.scrapers,
+        "weight": request.weight
+    }, request.telemetry, request.worker)
+    for scraper_name, options in request.scraper_options.items():
+        result_cache.set_policy(scraper_name, options.get("cache_ttl", 0))
+        if options.get("idempotent"):
+            load_balancer.idempotent.add(scraper_name)
+        else:
+            load_balancer.idempotent.discard(scraper_name)
+    return {"status": "registered"}
+
+@app.post("/heartbeat")
+async def server_heartbeat(request: HeartbeatRequest, x_registry_token: str = Header(None)):
+    check_registry_token(x_registry_token)
+    if not load_balancer.heartbeat(request.name, request.telemetry, request.scrapers, request.worker):
+        raise HTTPException(status_code=404, detail="Server not registered")
+    return {"status": "ok"}
+
+@app.post("/deregister")
+async def deregister_server(request: DeregisterRequest, x_registry_token: str = Header(None)):
+    check_registry_token(x_registry_token)
+    load_balancer.deregister(request.name, request.worker)
+    return {"status": "deregistered"}
+
+@app.post("/admin/invalidate_license")
+async def invalidate_license(request: InvalidateLicenseRequest, x_admin_uuid: str = Header(None)):
+    if not ADMIN_UUID or not validate_uuid(x_admin_uuid, ADMIN_UUID):
+        raise HTTPException(status_code=403, detail="Unauthorized")
+    license_cache.invalidate(request.key)
+    logger.info(f"License {request.key} invalidated in cache")
+    return {"status": "License invalidated"}
+
+@app.get("/stats/usage")
+async def usage_history(dimension: str, minutes: int = 60, resolution: int = 60, name: Optional[str] = None, limit: int = 10, x_admin_uuid: str = Header(None)):
+    # Historical series for the god panel; admin-only because it lists license keys
+    if not ADMIN_UUID or not validate_uuid(x_admin_uuid, ADMIN_UUID):
+        raise HTTPException(status_code=403, detail="Unauthorized")
+    if dimension not in DIMENSIONS:
+        raise HTTPException(status_code=400, detail=f"Dimension must be one of {', '.join(DIMENSIONS)}")
+    if resolution < 60 or resolution % 60:
+        raise HTTPException(status_code=400, detail="Resolution must be a whole number of minutes")
+    await asyncio.to_thread(usage_stats.flush)
+    return await asyncio.to_thread(
+        usage_stats.query, dimension, time.time() - minutes * 60, None, resolution, name, limit
+    )
+
+@app.get("/rate_limit/stats")
+async def rate_limit_stats():
+    return rate_limiter.stats()
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return {"enabled": RESULT_CACHE_ENABLED, **result_cache.stats()}
+
+@app.get("/server_loads")
+async def server_loads():
+    return {"servers": load_balancer.snapshot()}
+
+@app.get("/metrics")
+async def metrics():
+    return Response(content=registry.render(), media_type=CONTENT_TYPE)
+
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    # Ready as soon as this process can take requests; scraper servers that aren't ready are skipped per request
+    servers = load_balancer.snapshot()
+    status = {**readiness.status(), "scraper_servers": len(servers), "scraper_servers_ready": sum(1 for s in servers if s["ready"] and s["healthy"])}
+    return JSONResponse(status, status_code=200 if readiness.ready else 503)
 
 if __name__ == "__main__":
     import uvicorn
     public_server_config = config["public_server"]
-    uvicorn.run(app, host=public_server_config["ip"], port=public_server_config["port"])
+    # Per-request access logs are off by default; /metrics covers request volume and latency
+    uvicorn.run(app, host=public_server_config["ip"], port=public_server_config["port"], access_log=public_server_config.get("access_log", False))
@@ -0,0 +1,94 @@
+# public_server/rate_limit.py
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+class RateLimited(Exception):
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def configure(self, rate: float, capacity: float):
+        if (rate, capacity) != (self.rate, self.capacity):
+            self.rate = rate
+            self.capacity = capacity
+            self.tokens = min(self.tokens, capacity)
+
+    def take(self, cost: float) -> float:
+        # Returns 0 if the tokens were taken, otherwise the seconds until they will be available
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+class RateLimiter:
+    """Per-license token buckets and in-flight counters, kept in memory.
+
+    Limits come from the license's cached entitlements (rate_limit in
+    requests per second, burst, max_in_flight); a license without limits, or
+    one that has not been looked up yet, is only counted. Counters are per
+    process, so with W public_server workers a license gets up to W times its
+    limits.
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self.buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.in_flight: Dict[str, int] = {}
+        self.rejected = 0
+
+    def _bucket(self, key: str, rate: float, burst: Optional[int]) -> TokenBucket:
+        capacity = float(burst or max(1.0, rate))
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(rate, capacity)
+            self.buckets[key] = bucket
+            while len(self.buckets) > self.max_entries:
+                self.buckets.popitem(last=False)
+        else:
+            bucket.configure(rate, capacity)
+            self.buckets.move_to_end(key)
+        return bucket
+
+    def check_rate(self, key: str, limits, cost: int = 1):
+        if limits is None or not limits.rate_limit:
+            return
+        bucket = self._bucket(key, limits.rate_limit, limits.burst)
+        # A batch larger than the bucket could never pass; it costs a full bucket instead
+        wait = bucket.take(min(cost, bucket.capacity))
+        if wait:
+            self.rejected += 1
+            raise RateLimited("License rate limit exceeded", wait)
+
+    def acquire(self, key: str, limits, cost: int = 1):
+        # Takes an in-flight slot for the license; every acquire must be paired with release()
+        in_flight = self.in_flight.get(key, 0)
+        if limits is not None and limits.max_in_flight and in_flight >= limits.max_in_flight:
+            self.rejected += 1
+            raise RateLimited("License has too many requests in flight", 1.0)
+        self.check_rate(key, limits, cost)
+        self.in_flight[key] = in_flight + 1
+
+    def release(self, key: str):
+        remaining = self.in_flight.get(key, 0) - 1
+        if remaining > 0:
+            self.in_flight[key] = remaining
+        else:
+            self.in_flight.pop(key, None)
+
+    def stats(self) -> Dict:
+        return {
+            "tracked_licenses": len(self.buckets),
+            "in_flight": sum(self.in_flight.values()),
+            "rejected": self.rejected
+        }
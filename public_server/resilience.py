@@ -0,0 +1,77 @@
+# public_server/resilience.py
+import time
+from collections import deque
+from typing import Optional
+
+class ServerBusy(Exception):
+    """A scraper server rejected the job before starting it (429/503)."""
+
+class NoServerAvailable(Exception):
+    pass
+
+class CircuitBreaker:
+    """Per-server breaker: opens after consecutive failures, then lets a few probes through.
+
+    closed -> open after failure_threshold consecutive failures
+    open -> half_open once reset_timeout has passed
+    half_open -> closed on a successful probe, back to open on a failed one
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 10.0, half_open_probes: int = 1):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_probes = half_open_probes
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probes = 0
+
+    def available(self, now: Optional[float] = None) -> bool:
+        now = time.monotonic() if now is None else now
+        if self.state == self.OPEN and now - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            self.probes = 0
+        if self.state == self.HALF_OPEN:
+            return self.probes < self.half_open_probes
+        return self.state == self.CLOSED
+
+    def on_dispatch(self):
+        if self.state == self.HALF_OPEN:
+            self.probes += 1
+
+    def on_abandon(self):
+        # The request ended without telling us anything about the server (busy or cancelled)
+        if self.state == self.HALF_OPEN and self.probes > 0:
+            self.probes -= 1
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self.probes = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self.probes = 0
+
+class LatencyTracker:
+    """Sliding window of recent successful latencies, used to pick the hedging delay."""
+
+    def __init__(self, window: int = 200):
+        self.samples = deque(maxlen=window)
+
+    def record(self, latency: float):
+        self.samples.append(latency)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(len(ordered) * pct / 100))
+        return ordered[index]
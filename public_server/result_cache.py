@@ -0,0 +1,160 @@
+# public_server/result_cache.py
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from common.logging import setup_logging
+
+logger = setup_logging("result_cache")
+
+class ResultCache:
+    """Two-tier cache of scrape results keyed on scraper name + canonical params.
+
+    Scrapers opt in by setting CACHE_TTL (seconds) in their module; scraper
+    servers report it with every response and the TTL is remembered per
+    scraper. Identical concurrent misses are coalesced into one upstream call.
+    """
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024, disk_path: Optional[str] = None, disk_max_bytes: int = 1024 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_path = disk_path
+        self.disk_max_bytes = disk_max_bytes
+        self.memory: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self.memory_bytes = 0
+        self.policies: Dict[str, float] = {}  # Scraper name -> TTL in seconds, 0 means not cacheable
+        self.inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        if disk_path:
+            os.makedirs(disk_path, exist_ok=True)
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict]) -> "ResultCache":
+        config = config or {}
+        return cls(
+            max_entries=config.get("max_entries", 10000),
+            max_bytes=config.get("max_bytes", 64 * 1024 * 1024),
+            disk_path=config.get("disk_path"),
+            disk_max_bytes=config.get("disk_max_bytes", 1024 * 1024 * 1024),
+        )
+
+    @staticmethod
+    def key(scraper_name: str, params: dict) -> str:
+        canonical = json.dumps([scraper_name, params], sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def policy(self, scraper_name: str) -> float:
+        return self.policies.get(scraper_name, 0)
+
+    def set_policy(self, scraper_name: str, ttl: float):
+        self.policies[scraper_name] = max(ttl, 0)
+
+    def _disk_file(self, key: str) -> str:
+        return os.path.join(self.disk_path, key[:2], key)
+
+    def _read_disk(self, key: str) -> Optional[Tuple[float, bytes]]:
+        try:
+            with open(self._disk_file(key), "rb") as f:
+                expires_at = float(f.readline())
+                value = f.read()
+        except (FileNotFoundError, ValueError):
+            return None
+        if expires_at <= time.time():
+            try:
+                os.remove(self._disk_file(key))
+            except FileNotFoundError:
+                pass
+            return None
+        return expires_at, value
+
+    def _write_disk(self, key: str, expires_at: float, value: bytes):
+        path = self._disk_file(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(f"{expires_at}\n".encode())
+            f.write(value)
+        os.replace(tmp_path, path)  # Readers never see a half-written entry
+
+    def _store_memory(self, key: str, expires_at: float, value: bytes):
+        previous = self.memory.pop(key, None)
+        if previous is not None:
+            self.memory_bytes -= len(previous[1])
+        if len(value) > self.max_bytes:
+            return
+        self.memory[key] = (expires_at, value)
+        self.memory_bytes += len(value)
+        while len(self.memory) > self.max_entries or self.memory_bytes > self.max_bytes:
+            _, (_, evicted) = self.memory.popitem(last=False)
+            self.memory_bytes -= len(evicted)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self.memory.get(key)
+        if entry is not None:
+            if entry[0] > time.time():
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            del self.memory[key]
+            self.memory_bytes -= len(entry[1])
+        if self.disk_path:
+            entry = await asyncio.to_thread(self._read_disk, key)
+            if entry is not None:
+                self._store_memory(key, *entry)
+                self.hits += 1
+                self.disk_hits += 1
+                return entry[1]
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, value: bytes, ttl: float):
+        if ttl <= 0:
+            return
+        expires_at = time.time() + ttl
+        self._store_memory(key, expires_at, value)
+        if self.disk_path and len(value) <= self.disk_max_bytes:
+            try:
+                await asyncio.to_thread(self._write_disk, key, expires_at, value)
+            except OSError as e:
+                logger.error(f"Failed to write cache entry to disk: {e}")
+
+    async def coalesce(self, key: str, factory: Callable[[], Awaitable[bytes]]) -> bytes:
+        # Only the first caller for a key runs the factory; the rest wait for its result
+        future = self.inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[key] = future
+        try:
+            value = await factory()
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Mark retrieved; waiters re-raise it themselves
+            raise
+        finally:
+            del self.inflight[key]
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "memory_bytes": self.memory_bytes,
+            "policies": dict(self.policies),
+        }
@@ -0,0 +1,68 @@
+# public_server/strategies.py
+import random
+from typing import Dict, List, Type
+
+class Strategy:
+    """Picks one server out of a non-empty list of eligible ServerStates."""
+
+    name = "base"
+
+    def select(self, candidates: List):
+        raise NotImplementedError
+
+def _outstanding(state):
+    # Ties are broken randomly so idle servers share work instead of the first one taking it all
+    return (state.in_flight / state.weight, state.load, random.random())
+
+class LeastOutstandingStrategy(Strategy):
+    # In-flight counts are tracked locally, so they never lag behind like /load does
+    name = "least_outstanding"
+
+    def select(self, candidates: List):
+        return min(candidates, key=_outstanding)
+
+class PowerOfTwoChoicesStrategy(Strategy):
+    name = "power_of_two"
+
+    def select(self, candidates: List):
+        if len(candidates) == 1:
+            return candidates[0]
+        a, b = random.sample(candidates, 2)
+        return min((a, b), key=_outstanding)
+
+class WeightedRoundRobinStrategy(Strategy):
+    # Smooth weighted round-robin (as in nginx): spreads picks evenly within a cycle
+    name = "weighted_round_robin"
+
+    def __init__(self):
+        self.current: Dict[str, float] = {}
+
+    def select(self, candidates: List):
+        total = 0.0
+        best = None
+        for state in candidates:
+            current = self.current.get(state.name, 0.0) + state.weight
+            self.current[state.name] = current
+            total += state.weight
+            if best is None or current > self.current[best.name]:
+                best = state
+        self.current[best.name] -= total
+        return best
+
+class EWMALatencyStrategy(Strategy):
+    # Expected wait ~ smoothed latency scaled by queued work; unmeasured servers score 0 so they get probed
+    name = "ewma_latency"
+
+    def select(self, candidates: List):
+        return min(candidates, key=lambda s: ((s.ewma_latency or 0.0) * (s.in_flight + 1) / s.weight, s.in_flight, random.random()))
+
+STRATEGIES: Dict[str, Type[Strategy]] = {
+    cls.name: cls
+    for cls in (LeastOutstandingStrategy, PowerOfTwoChoicesStrategy, WeightedRoundRobinStrategy, EWMALatencyStrategy)
+}
+
+def create_strategy(name: str) -> Strategy:
+    try:
+        return STRATEGIES[name]()
+    except KeyError:
+        raise ValueError(f"Unknown load balancing strategy: {name}")
@@ -0,0 +1,192 @@
+# public_server/usage_stats.py
+import asyncio
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from common.logging import setup_logging
+
+logger = setup_logging("usage_stats")
+
+DIMENSIONS = ("license", "scraper", "server")
+MINUTE = 60
+HOUR = 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage_series (
+    resolution INTEGER NOT NULL,
+    dimension TEXT NOT NULL,
+    name TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    requests INTEGER NOT NULL,
+    errors INTEGER NOT NULL,
+    latency_count INTEGER NOT NULL,
+    latency_sum REAL NOT NULL,
+    latency_max REAL NOT NULL,
+    PRIMARY KEY (resolution, dimension, name, bucket)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS ix_usage_series_time ON usage_series (dimension, bucket);
+"""
+
+UPSERT = (
+    "INSERT INTO usage_series (resolution, dimension, name, bucket, requests, errors, latency_count, latency_sum, latency_max) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT (resolution, dimension, name, bucket) DO UPDATE SET "
+    "requests = requests + excluded.requests, errors = errors + excluded.errors, "
+    "latency_count = latency_count + excluded.latency_count, latency_sum = latency_sum + excluded.latency_sum, "
+    "latency_max = MAX(latency_max, excluded.latency_max)"
+)
+
+class UsageStats:
+    """Per-license, per-scraper and per-server request counts and latencies over time.
+
+    Requests are summed in memory per minute and written to SQLite every
+    flush_interval seconds. Minute rows older than minute_retention are
+    rolled up into hourly rows, which are kept for hour_retention, so the
+    table stays small no matter how long the service runs.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 10.0, minute_retention: float = 172800.0, hour_retention: float = 7776000.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.minute_retention = minute_retention
+        self.hour_retention = hour_retention
+        # (dimension, name, minute) -> [requests, errors, latency_count, latency_sum, latency_max]
+        self.pending: Dict[Tuple[str, str, int], list] = {}
+        self._pending_lock = threading.Lock()  # Never held across database work, so record() can't stall
+        self._lock = threading.Lock()
+        self._flusher: Optional[asyncio.Task] = None
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict]) -> "UsageStats":
+        config = config or {}
+        return cls(
+            path=config.get("path", "./usage_stats.db"),
+            flush_interval=config.get("flush_interval", 10.0),
+            minute_retention=config.get("minute_retention", 172800.0),
+            hour_retention=config.get("hour_retention", 7776000.0),
+        )
+
+    def record(self, dimension: str, name: str, latency: Optional[float] = None, error: bool = False, count: int = 1):
+        key = (dimension, name, int(time.time()) // MINUTE * MINUTE)
+        with self._pending_lock:
+            totals = self.pending.get(key)
+            if totals is None:
+                totals = [0, 0, 0, 0.0, 0.0]
+                self.pending[key] = totals
+            totals[0] += count
+            if error:
+                totals[1] += count
+            if latency is not None:
+                totals[2] += 1
+                totals[3] += latency
+                totals[4] = max(totals[4], latency)
+
+    def flush(self):
+        with self._pending_lock:
+            pending, self.pending = self.pending, {}
+        if not pending:
+            return
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.executemany(UPSERT, [(MINUTE, *key, *totals) for key, totals in pending.items()])
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                # Keep the interval's counts for the next flush rather than losing them
+                with self._pending_lock:
+                    for key, totals in pending.items():
+                        current = self.pending.get(key)
+                        if current is None:
+                            self.pending[key] = totals
+                        else:
+                            current[0] += totals[0]
+                            current[1] += totals[1]
+                            current[2] += totals[2]
+                            current[3] += totals[3]
+                            current[4] = max(current[4], totals[4])
+                raise
+
+    def downsample(self):
+        now = int(time.time())
+        cutoff = (now - int(self.minute_retention)) // HOUR * HOUR  # Only whole hours are rolled up
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.execute(
+                    "INSERT INTO usage_series (resolution, dimension, name, bucket, requests, errors, latency_count, latency_sum, latency_max) "
+                    "SELECT ?, dimension, name, bucket / ? * ?, SUM(requests), SUM(errors), SUM(latency_count), SUM(latency_sum), MAX(latency_max) "
+                    "FROM usage_series WHERE resolution = ? AND bucket < ? GROUP BY dimension, name, bucket / ? "
+                    + UPSERT[UPSERT.index("ON CONFLICT"):],
+                    (HOUR, HOUR, HOUR, MINUTE, cutoff, HOUR),
+                )
+                self.conn.execute("DELETE FROM usage_series WHERE resolution = ? AND bucket < ?", (MINUTE, cutoff))
+                self.conn.execute("DELETE FROM usage_series WHERE bucket < ?", (now - int(self.hour_retention),))
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def query(self, dimension: str, since: float, until: Optional[float] = None, resolution: int = MINUTE, name: Optional[str] = None, limit: int = 10) -> Dict:
+        # Rows no coarser than the requested resolution are summed into its buckets
+        until = until or time.time()
+        args = [resolution, resolution, dimension, int(since), int(until), resolution]
+        name_filter = ""
+        if name is not None:
+            name_filter = "AND name = ? "
+            args.append(name)
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT name, bucket / ? * ? AS slot, SUM(requests), SUM(errors), SUM(latency_count), SUM(latency_sum), MAX(latency_max) "
+                "FROM usage_series WHERE dimension = ? AND bucket >= ? AND bucket < ? AND resolution <= ? "
+                f"{name_filter}GROUP BY name, slot ORDER BY slot",
+                args,
+            ).fetchall()
+        series: Dict[str, List] = {}
+        totals: Dict[str, int] = {}
+        for row_name, slot, requests, errors, latency_count, latency_sum, latency_max in rows:
+            average = latency_sum / latency_count if latency_count else None
+            series.setdefault(row_name, []).append([slot, requests, errors, average, latency_max if latency_count else None])
+            totals[row_name] = totals.get(row_name, 0) + requests
+        top = sorted(totals, key=totals.get, reverse=True)[:limit]
+        return {
+            "dimension": dimension,
+            "resolution": resolution,
+            "since": int(since),
+            "until": int(until),
+            "columns": ["bucket", "requests", "errors", "avg_latency", "max_latency"],
+            "series": {row_name: series[row_name] for row_name in top},
+            "totals": {row_name: totals[row_name] for row_name in top},
+        }
+
+    async def _flush_loop(self):
+        last_downsample = 0.0
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await asyncio.to_thread(self.flush)
+                if time.monotonic() - last_downsample >= HOUR / 4:
+                    await asyncio.to_thread(self.downsample)
+                    last_downsample = time.monotonic()
+            except Exception as e:
+                logger.error(f"Usage stats flush failed: {e}")
+
+    def start(self):
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Final usage stats flush failed: {e}")
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,274 @@
+# scraper_server/executor.py
+import asyncio
+import importlib.util
+import inspect
+import os
+import time
+from contextlib import asynccontextmanager, contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+from types import ModuleType
+from typing import AsyncIterator, Dict, Optional, Tuple
+from weakref import WeakKeyDictionary
+from common.logging import setup_logging
+from common.metrics import registry
+from fetcher import Fetcher, ScraperContext
+
+logger = setup_logging("executor")
+
+SCRAPE_SECONDS = registry.histogram("scrape_seconds", "Scraper run time by outcome", ["scraper", "outcome"])
+
+MODES = ("async", "thread", "process")
+
+class ScraperBusy(Exception):
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.status_code = status_code
+
+# Returned by next() once a generator scraper is exhausted
+_DONE = object()
+
+_takes_context: "WeakKeyDictionary" = WeakKeyDictionary()
+
+def _arguments(run, params, context) -> tuple:
+    # run(params, context) gets the context; plain run(params) scrapers keep working
+    takes_context = _takes_context.get(run)
+    if takes_context is None:
+        positional = [
+            parameter for parameter in inspect.signature(run).parameters.values()
+            if parameter.kind in (parameter.POSITIONAL_ONLY, parameter.POSITIONAL_OR_KEYWORD, parameter.VAR_POSITIONAL)
+        ]
+        takes_context = len(positional) >= 2 or any(parameter.kind == parameter.VAR_POSITIONAL for parameter in positional)
+        _takes_context[run] = takes_context
+    return (params, context) if takes_context else (params,)
+
+def _call(run, *args):
+    # Generator scrapers are collected into a list when the caller wants the whole result
+    result = run(*args)
+    return list(result) if inspect.isgenerator(result) else result
+
+def _start(run, *args):
+    result = run(*args)
+    return result if inspect.isgenerator(result) else iter([result])
+
+# Process workers keep their own copy of each scraper module, keyed by path and mtime
+_process_modules: Dict[str, Tuple[float, ModuleType]] = {}
+
+def _run_in_process(path: str, module_name: str, params: dict):
+    mtime = os.stat(path).st_mtime
+    cached = _process_modules.get(path)
+    if cached is None or cached[0] != mtime:
+        spec = importlib.util.spec_from_file_location(module_name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        cached = (mtime, module)
+        _process_modules[path] = cached
+    # The server's HTTP session lives on its event loop; process scrapers get no context
+    return _call(cached[1].run, *_arguments(cached[1].run, params, None))
+
+class ScraperExecutor:
+    """Runs scrapers off the event loop according to their declared MODE.
+
+    Scrapers may set `MODE` ("async", "thread" or "process") and `CONCURRENCY`
+    at module level. Coroutine and async generator `run` functions default to
+    "async", everything else to "thread". When a scraper's limit or the
+    server-wide limit is reached the job is rejected with ScraperBusy instead
+    of queueing.
+
+    `run` may also be a (async) generator yielding records: run() collects
+    them into a list, stream() hands them out one at a time. Generators can't
+    cross a process boundary, so "process" scrapers are collected in the
+    worker either way.
+
+    A `run(params, context)` scraper also receives its ScraperContext, which
+    shares the server's Fetcher ("async" scrapers await context.fetch(),
+    "thread" ones call context.fetch_sync()) and carries the state its
+    setup() built. "process" scrapers get None.
+    """
+
+    def __init__(self, thread_workers: int = 32, process_workers: Optional[int] = None, default_concurrency: int = 16, max_in_flight: int = 256, fetcher: Optional[Fetcher] = None, scraper_manager=None):
+        self.thread_pool = ThreadPoolExecutor(max_workers=thread_workers, thread_name_prefix="scraper")
+        self.process_workers = process_workers or os.cpu_count() or 1
+        self.process_pool: Optional[ProcessPoolExecutor] = None  # Created on first use
+        self.default_concurrency = default_concurrency
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.limits: Dict[str, Tuple[int, asyncio.Semaphore]] = {}
+        self.fetcher = fetcher
+        self.scraper_manager = scraper_manager  # Owns per-scraper state; None runs scrapers without it
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict], fetcher: Optional[Fetcher] = None, scraper_manager=None) -> "ScraperExecutor":
+        config = config or {}
+        return cls(
+            thread_workers=config.get("thread_workers", 32),
+            process_workers=config.get("process_workers"),
+            default_concurrency=config.get("default_concurrency", 16),
+            max_in_flight=config.get("max_in_flight", 256),
+            fetcher=fetcher,
+            scraper_manager=scraper_manager,
+        )
+
+    def mode_for(self, module: ModuleType) -> str:
+        mode = getattr(module, "MODE", None)
+        if mode is None:
+            is_async = inspect.iscoroutinefunction(module.run) or inspect.isasyncgenfunction(module.run)
+            return "async" if is_async else "thread"
+        if mode not in MODES:
+            raise ValueError(f"Unknown scraper mode: {mode}")
+        return mode
+
+    @asynccontextmanager
+    async def _using(self, module: ModuleType):
+        # Keeps this version's state alive for the job, even if a reload replaces the module meanwhile
+        if self.scraper_manager is None:
+            yield None
+            return
+        with self.scraper_manager.using(module) as state:
+            yield state
+
+    def _semaphore(self, name: str, module: ModuleType) -> asyncio.Semaphore:
+        limit = getattr(module, "CONCURRENCY", self.default_concurrency)
+        current = self.limits.get(name)
+        if current is None or current[0] != limit:
+            # A reloaded module may change its limit; jobs on the old semaphore still release it
+            current = (limit, asyncio.Semaphore(limit))
+            self.limits[name] = current
+        return current[1]
+
+    def _admit(self, name: str, module: ModuleType, wait: bool) -> asyncio.Semaphore:
+        semaphore = self._semaphore(name, module)
+        if not wait:
+            if self.in_flight >= self.max_in_flight:
+                raise ScraperBusy("Scraper server is saturated", 503)
+            if semaphore.locked():
+                raise ScraperBusy(f"Scraper {name} is at its concurrency limit", 429)
+        return semaphore
+
+    def free_slots(self) -> int:
+        return max(0, self.max_in_flight - self.in_flight)
+
+    def saturated(self, name: str) -> bool:
+        # Whether a job for this scraper would be turned away with ScraperBusy right now
+        current = self.limits.get(name)
+        return self.in_flight >= self.max_in_flight or (current is not None and current[1].locked())
+
+    def _process_pool(self) -> ProcessPoolExecutor:
+        if self.process_pool is None:
+            self.process_pool = ProcessPoolExecutor(max_workers=self.process_workers)
+        return self.process_pool
+
+    @contextmanager
+    def _timed(self, name: str):
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            yield
+            outcome = "success"
+        except ScraperBusy:
+            outcome = "busy"
+            raise
+        except (asyncio.CancelledError, GeneratorExit):
+            outcome = "cancelled"
+            raise
+        finally:
+            SCRAPE_SECONDS.observe(time.perf_counter() - started, name, outcome)
+
+    async def run(self, name: str, module: ModuleType, params: dict, wait: bool = False):
+        # wait=True queues behind the scraper's limit instead of failing fast (used for batches)
+        with self._timed(name):
+            return await self._run(name, module, params, wait)
+
+    async def _run(self, name: str, module: ModuleType, params: dict, wait: bool):
+        semaphore = self._admit(name, module, wait)
+        mode = self.mode_for(module)
+        async with semaphore, self._using(module) as state:
+            self.in_flight += 1
+            try:
+                if mode == "async":
+                    args = _arguments(module.run, params, ScraperContext(name, self.fetcher, state))
+                    if inspect.isasyncgenfunction(module.run):
+                        return [record async for record in module.run(*args)]
+                    return await module.run(*args)
+                loop = asyncio.get_running_loop()
+                if mode == "thread":
+                    args = _arguments(module.run, params, ScraperContext(name, self.fetcher, state))
+                    return await loop.run_in_executor(self.thread_pool, _call, module.run, *args)
+                return await loop.run_in_executor(self._process_pool(), _run_in_process, module.__file__, name, params)
+            finally:
+                self.in_flight -= 1
+
+    async def stream(self, name: str, module: ModuleType, params: dict) -> AsyncIterator:
+        # Yields one record at a time; a scraper that returns a plain result yields it once
+        with self._timed(name):
+            records = self._stream(name, module, params)
+            try:
+                async for record in records:
+                    yield record
+            finally:
+                await records.aclose()
+
+    async def _stream(self, name: str, module: ModuleType, params: dict) -> AsyncIterator:
+        semaphore = self._admit(name, module, wait=False)
+        mode = self.mode_for(module)
+        async with semaphore, self._using(module) as state:
+            self.in_flight += 1
+            try:
+                if mode == "async":
+                    args = _arguments(module.run, params, ScraperContext(name, self.fetcher, state))
+                    if inspect.isasyncgenfunction(module.run):
+                        records = module.run(*args)
+                        try:
+                            async for record in records:
+                                yield record
+                        finally:
+                            await records.aclose()
+                    else:
+                        yield await module.run(*args)
+                elif mode == "thread":
+                    records = self._iterate_in_thread(module.run, _arguments(module.run, params, ScraperContext(name, self.fetcher, state)))
+                    try:
+                        async for record in records:
+                            yield record
+                    finally:
+                        await records.aclose()
+                else:
+                    loop = asyncio.get_running_loop()
+                    result = await loop.run_in_executor(self._process_pool(), _run_in_process, module.__file__, name, params)
+                    if inspect.isgeneratorfunction(module.run):
+                        for record in result:
+                            yield record
+                    else:
+                        yield result
+            finally:
+                self.in_flight -= 1
+
+    async def _iterate_in_thread(self, run, args: tuple) -> AsyncIterator:
+        # Each next() runs in the thread pool, so only one record is in memory at a time
+        iterator = await asyncio.wrap_future(self.thread_pool.submit(_start, run, *args))
+        pending: Optional[Future] = None
+        try:
+            while True:
+                pending = self.thread_pool.submit(next, iterator, _DONE)
+                record = await asyncio.wrap_future(pending)
+                if record is _DONE:
+                    return
+                yield record
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                if pending is None:
+                    self._submit_quietly(close)  # Closed before the first next() was submitted
+                else:
+                    # A cancelled stream may still have next() running; close the generator once it returns
+                    pending.add_done_callback(lambda _: self._submit_quietly(close))
+
+    def _submit_quietly(self, fn):
+        try:
+            self.thread_pool.submit(fn)
+        except RuntimeError:
+            pass  # Pool already shut down
+
+    def shutdown(self):
+        self.thread_pool.shutdown(wait=False, cancel_futures=True)
+        if self.process_pool is not None:
+            self.process_pool.shutdown(wait=False, cancel_futures=True)
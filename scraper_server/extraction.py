@@ -0,0 +1,255 @@
+# scraper_server/extraction.py
+"""Declarative field extraction on an incremental HTML parser.
+
+    FIELDS = {
+        "title": "h1.product-title",
+        "price": Field("div.buy-box span.price", transform=float),
+        "image": Field("img#main", attr="src"),
+        "tags": Field("ul.tags li", many=True),
+    }
+
+Selectors are simple CSS: tag, #id, .class, [attr] and [attr=value], joined
+by spaces for descendants. A field's value is the element's text with
+whitespace collapsed, or one of its attributes with `attr`. Extractor is fed
+the document a chunk at a time and never builds a tree: it keeps the stack
+of open elements, so memory stays flat however large the page is, and it
+reports done once every field is found, so the rest of the page needn't be
+downloaded. A `many` field keeps the document going until its `limit` is
+reached, or to the end without one.
+
+This is a scanner for extracting data, not an HTML5 tree builder. Implied
+end tags are only handled for a tag closing an open sibling of the same
+kind (<p>, <li>, <td>, ...).
+"""
+import functools
+import re
+from html.parser import HTMLParser
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+VOID_ELEMENTS = frozenset(("area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track", "wbr"))
+# A new one of these closes the open one at the top of the stack
+_IMPLIED_END = frozenset(("p", "li", "option", "tr", "td", "th", "dt", "dd"))
+
+_TOKEN = re.compile(r"""
+    (?P<tag>[a-zA-Z][\w-]*|\*)
+  | \#(?P<id>[\w-]+)
+  | \.(?P<cls>[\w-]+)
+  | \[\s*(?P<attr>[\w-]+)\s*(?:=\s*(?P<quote>["']?)(?P<value>[^"'\]]*)(?P=quote)\s*)?\]
+""", re.VERBOSE)
+
+class _Compound:
+    __slots__ = ("tag", "id", "classes", "attrs")
+
+    def __init__(self, text: str):
+        self.tag: Optional[str] = None
+        self.id: Optional[str] = None
+        self.classes: List[str] = []
+        self.attrs: List[Tuple[str, Optional[str]]] = []
+        position = 0
+        while position < len(text):
+            match = _TOKEN.match(text, position)
+            if match is None or (match.group("tag") and position):
+                raise ValueError(f"Unsupported selector: {text!r}")
+            if match.group("tag") and match.group("tag") != "*":
+                self.tag = match.group("tag").lower()
+            elif match.group("id"):
+                self.id = match.group("id")
+            elif match.group("cls"):
+                self.classes.append(match.group("cls"))
+            elif match.group("attr"):
+                self.attrs.append((match.group("attr").lower(), match.group("value")))
+            position = match.end()
+
+    def matches(self, tag: str, attrs: Dict[str, str]) -> bool:
+        if self.tag is not None and self.tag != tag:
+            return False
+        if self.id is not None and attrs.get("id") != self.id:
+            return False
+        if self.classes:
+            classes = attrs.get("class", "").split()
+            if any(name not in classes for name in self.classes):
+                return False
+        for name, value in self.attrs:
+            if name not in attrs or (value is not None and attrs[name] != value):
+                return False
+        return True
+
+class Selector:
+    def __init__(self, text: str):
+        self.text = text
+        self.compounds = [_Compound(part) for part in text.split()]
+        if not self.compounds:
+            raise ValueError("Empty selector")
+        self.tag = self.compounds[-1].tag  # None matches any tag
+
+    def matches(self, stack: List[Tuple[str, Dict[str, str]]]) -> bool:
+        # stack runs from the root to the candidate element; ancestors are matched right to left, nearest first
+        if not self.compounds[-1].matches(*stack[-1]):
+            return False
+        remaining = len(self.compounds) - 2
+        for tag, attrs in reversed(stack[:-1]):
+            if remaining < 0:
+                break
+            if self.compounds[remaining].matches(tag, attrs):
+                remaining -= 1
+        return remaining < 0
+
+@functools.lru_cache(maxsize=1024)
+def parse_selector(text: str) -> Selector:
+    return Selector(text)
+
+class Field:
+    def __init__(self, selector: str, attr: Optional[str] = None, many: bool = False, limit: Optional[int] = None, default=None, transform: Optional[Callable] = None):
+        self.selector = parse_selector(selector)
+        self.attr = attr
+        self.many = many
+        self.limit = limit
+        self.default = default
+        self.transform = transform
+
+    def value(self, raw: str):
+        return self.transform(raw) if self.transform is not None else raw
+
+def compile_fields(fields: Dict[str, Union[str, Field]]) -> Dict[str, Field]:
+    return {name: field if isinstance(field, Field) else Field(field) for name, field in fields.items()}
+
+class _Stop(Exception):
+    """Raised from a handler to abandon the rest of the chunk being fed."""
+
+class Extractor(HTMLParser):
+    """Feed it text with feed(); result() returns the field values.
+
+    feed() returns True once every field is found, after which further
+    input is ignored.
+    """
+
+    def __init__(self, fields: Dict[str, Union[str, Field]]):
+        super().__init__(convert_charrefs=True)
+        self.fields = compile_fields(fields)
+        self.values: Dict[str, object] = {name: [] for name, field in self.fields.items() if field.many}
+        self.stack: List[Tuple[str, Dict[str, str]]] = []
+        self.captures: List[Tuple[str, int, List[str]]] = []  # (field, stack depth, text parts)
+        # Fields still looking for elements, by the tag their selector ends in (None for any tag)
+        self.wanted: Dict[Optional[str], List[str]] = {}
+        for name, field in self.fields.items():
+            self.wanted.setdefault(field.selector.tag, []).append(name)
+        self.remaining = len(self.fields)
+        self.done = not self.fields
+
+    def feed(self, data: str) -> bool:
+        if not self.done:
+            try:
+                super().feed(data)
+            except _Stop:
+                pass  # The parser's buffer is left as is; nothing is fed after this
+        return self.done
+
+    def result(self) -> Dict[str, object]:
+        if not self.done:
+            try:
+                self.close()
+            except _Stop:
+                pass  # The last field was completed by what close() flushed
+        while self.captures:
+            self._finish_capture()  # Elements the document never closed
+        values = {}
+        for name, field in self.fields.items():
+            if field.many:
+                values[name] = self.values[name]
+            else:
+                values[name] = self.values.get(name, field.default)
+        return values
+
+    def _found(self, name: str, raw: str):
+        field = self.fields[name]
+        value = field.value(raw)
+        if field.many:
+            found = self.values[name]
+            found.append(value)
+            if field.limit is None or len(found) < field.limit:
+                return
+        else:
+            self.values[name] = value
+        self.remaining -= 1
+        if self.remaining == 0 and not self.captures:
+            self.done = True
+
+    def _release(self, name: str):
+        # A single field takes the first match; a many field keeps matching until this match reaches its limit
+        field = self.fields[name]
+        if field.many and (field.limit is None or len(self.values[name]) + self._capturing(name) + 1 < field.limit):
+            return
+        self.wanted[field.selector.tag].remove(name)
+
+    def _capturing(self, name: str) -> int:
+        return sum(1 for capture in self.captures if capture[0] == name)
+
+    def _finish_capture(self):
+        name, _, parts = self.captures.pop()
+        self._found(name, " ".join("".join(parts).split()))
+
+    def handle_starttag(self, tag: str, attrs):
+        if self.done:
+            return
+        if tag in _IMPLIED_END and self.stack and self.stack[-1][0] == tag:
+            self._pop(len(self.stack) - 1)
+        element = (tag, {name: value or "" for name, value in attrs})
+        self.stack.append(element)
+        candidates = self.wanted.get(tag, [])
+        if self.wanted.get(None):
+            candidates = candidates + self.wanted[None]
+        for name in list(candidates):
+            field = self.fields[name]
+            if field.attr is not None and field.attr not in element[1]:
+                continue  # An element without the attribute doesn't count as found
+            if not field.selector.matches(self.stack):
+                continue
+            self._release(name)
+            if field.attr is not None:
+                self._found(name, element[1][field.attr])
+            elif tag in VOID_ELEMENTS:
+                self._found(name, "")
+            else:
+                self.captures.append((name, len(self.stack), []))
+        if tag in VOID_ELEMENTS:
+            self.stack.pop()
+        if self.done:
+            raise _Stop
+
+    def handle_endtag(self, tag: str):
+        if self.done or tag in VOID_ELEMENTS:
+            return
+        for index in range(len(self.stack) - 1, -1, -1):
+            if self.stack[index][0] == tag:
+                self._pop(index)
+                if self.done:
+                    raise _Stop
+                return
+        # Stray end tag with nothing to close; ignored
+
+    def _pop(self, index: int):
+        # Closes stack[index] and everything opened inside it
+        del self.stack[index:]
+        while self.captures and self.captures[-1][1] > index:
+            self._finish_capture()
+        if self.remaining == 0 and not self.captures:
+            self.done = True
+
+    def handle_data(self, data: str):
+        for capture in self.captures:
+            capture[2].append(data)
+
+def extract(html: str, fields: Dict[str, Union[str, Field]]) -> Dict[str, object]:
+    extractor = Extractor(fields)
+    extractor.feed(html)
+    return extractor.result()
+
+def declarative_run(module):
+    """run() for a scraper module that only declares URL and FIELDS.
+
+    URL is formatted with the job params, e.g. "https://example.com/item/{id}".
+    """
+    async def run(params, context):
+        url = module.URL.format(**params)
+        return {"status": "success", "data": await context.extract(url, module.FIELDS)}
+    return run
@@ -0,0 +1,398 @@
+# scraper_server/fetcher.py
+import asyncio
+import ipaddress
+import socket
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple, Union
+from urllib.parse import urlsplit
+import httpcore
+import httpx
+from extraction import Extractor, Field
+from common.logging import setup_logging
+from common.metrics import registry
+
+logger = setup_logging("fetcher")
+
+FETCHES = registry.counter("scraper_fetches", "Scraper HTTP fetches by conditional cache result", ["result"])
+DNS_LOOKUPS = registry.counter("scraper_dns_lookups", "Scraper DNS resolutions by cache result", ["result"])
+
+# Not replayed from the cache: the stored body is already decoded and sized by httpx
+_UNCACHED_HEADERS = ("content-encoding", "content-length", "transfer-encoding")
+
+def _is_ip(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host)
+        return True
+    except ValueError:
+        return False
+
+class CachingResolver(httpcore.AsyncNetworkBackend):
+    """Network backend that resolves each host once per ttl.
+
+    Concurrent lookups of the same host share one getaddrinfo call, and
+    connections try the cached addresses in order. TLS still uses the
+    original host name for SNI and certificate checks.
+    """
+
+    def __init__(self, ttl: float = 60.0, backend: Optional[httpcore.AsyncNetworkBackend] = None):
+        self.ttl = ttl
+        self.backend = backend or httpcore.AnyIOBackend()
+        self.addresses: Dict[Tuple[str, int], Tuple[float, List[str]]] = {}
+        self.lookups: Dict[Tuple[str, int], asyncio.Future] = {}
+
+    async def resolve(self, host: str, port: int) -> List[str]:
+        key = (host, port)
+        cached = self.addresses.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            DNS_LOOKUPS.inc("hit")
+            return cached[1]
+        lookup = self.lookups.get(key)
+        if lookup is None:
+            DNS_LOOKUPS.inc("miss")
+            lookup = asyncio.ensure_future(self._lookup(host, port))
+            self.lookups[key] = lookup
+            lookup.add_done_callback(lambda _: self.lookups.pop(key, None))
+        # Shielded so one cancelled caller doesn't fail the lookup for the others
+        return await asyncio.shield(lookup)
+
+    async def _lookup(self, host: str, port: int) -> List[str]:
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        self.addresses[(host, port)] = (time.monotonic() + self.ttl, addresses)
+        return addresses
+
+    async def connect_tcp(self, host: str, port: int, timeout: Optional[float] = None, local_address: Optional[str] = None, socket_options=None) -> httpcore.AsyncNetworkStream:
+        if _is_ip(host):
+            return await self.backend.connect_tcp(host, port, timeout, local_address, socket_options)
+        try:
+            addresses = await self.resolve(host, port)
+        except OSError as exc:
+            raise httpcore.ConnectError(str(exc)) from exc
+        error: Optional[Exception] = None
+        for address in addresses:
+            try:
+                return await self.backend.connect_tcp(address, port, timeout, local_address, socket_options)
+            except httpcore.ConnectError as exc:
+                error = exc
+        # Every cached address failed; look the host up again next time
+        self.addresses.pop((host, port), None)
+        raise error
+
+    async def connect_unix_socket(self, path: str, timeout: Optional[float] = None, socket_options=None) -> httpcore.AsyncNetworkStream:
+        return await self.backend.connect_unix_socket(path, timeout, socket_options)
+
+    async def sleep(self, seconds: float) -> None:
+        await self.backend.sleep(seconds)
+
+@contextmanager
+def _httpx_errors(request: Optional[httpx.Request] = None):
+    # httpcore raises its own exceptions; scrapers catch httpx's, which share their names
+    try:
+        yield
+    except httpcore.TimeoutException as exc:
+        raise getattr(httpx, type(exc).__name__, httpx.TimeoutException)(str(exc), request=request) from exc
+    except (httpcore.NetworkError, httpcore.ProtocolError, httpcore.ProxyError, httpcore.UnsupportedProtocol) as exc:
+        raise getattr(httpx, type(exc).__name__, httpx.TransportError)(str(exc), request=request) from exc
+
+class _PoolStream(httpx.AsyncByteStream):
+    def __init__(self, stream, request: httpx.Request):
+        self.stream = stream
+        self.request = request
+
+    async def __aiter__(self):
+        with _httpx_errors(self.request):
+            async for part in self.stream:
+                yield part
+
+    async def aclose(self):
+        if hasattr(self.stream, "aclose"):
+            await self.stream.aclose()
+
+class ResolvingTransport(httpx.AsyncBaseTransport):
+    """httpx transport over an httpcore connection pool that connects through a CachingResolver."""
+
+    def __init__(self, limits: httpx.Limits, resolver: CachingResolver):
+        self.pool = httpcore.AsyncConnectionPool(
+            ssl_context=httpx.create_ssl_context(),
+            max_connections=limits.max_connections,
+            max_keepalive_connections=limits.max_keepalive_connections,
+            keepalive_expiry=limits.keepalive_expiry,
+            network_backend=resolver,
+        )
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        core_request = httpcore.Request(
+            method=request.method,
+            url=httpcore.URL(scheme=request.url.raw_scheme, host=request.url.raw_host, port=request.url.port, target=request.url.raw_path),
+            headers=request.headers.raw,
+            content=request.stream,
+            extensions=request.extensions,
+        )
+        with _httpx_errors(request):
+            response = await self.pool.handle_async_request(core_request)
+        return httpx.Response(response.status, headers=response.headers, stream=_PoolStream(response.stream, request), extensions=response.extensions)
+
+    async def aclose(self):
+        await self.pool.aclose()
+
+class ConditionalCache:
+    """Bodies of GET responses that carried an ETag or Last-Modified.
+
+    Entries are keyed by the final request URL, query string included, and
+    remember the request's values of the headers the response named in Vary;
+    a request that differs in any of them doesn't match. Least recently used
+    entries are dropped once max_entries or max_bytes is exceeded. Responses
+    with Vary: * or that forbid storing are not kept.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        # URL -> (Vary'd request header values, response headers, body)
+        self.entries: "OrderedDict[str, Tuple[Tuple[Tuple[str, Optional[str]], ...], Dict[str, str], bytes]]" = OrderedDict()
+
+    def _entry(self, request: httpx.Request):
+        entry = self.entries.get(str(request.url))
+        if entry is None or any(request.headers.get(name) != value for name, value in entry[0]):
+            return None
+        return entry
+
+    def validators(self, request: httpx.Request) -> Dict[str, str]:
+        entry = self._entry(request)
+        if entry is None:
+            return {}
+        headers = entry[1]
+        conditions = {}
+        if "etag" in headers:
+            conditions["If-None-Match"] = headers["etag"]
+        if "last-modified" in headers:
+            conditions["If-Modified-Since"] = headers["last-modified"]
+        return conditions
+
+    def store(self, response: httpx.Response):
+        headers = response.headers
+        if "etag" not in headers and "last-modified" not in headers:
+            return
+        if "no-store" in headers.get("cache-control", "").lower():
+            return
+        vary = sorted({field.strip().lower() for field in headers.get("vary", "").split(",") if field.strip()})
+        if "*" in vary:
+            return
+        content = response.content
+        if len(content) > self.max_bytes:
+            return
+        request = response.request
+        key = str(request.url)
+        self.discard(key)
+        kept = {name: value for name, value in headers.items() if name not in _UNCACHED_HEADERS}
+        self.entries[key] = (tuple((name, request.headers.get(name)) for name in vary), kept, content)
+        self.size += len(content)
+        while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+            _, (_, _, evicted) = self.entries.popitem(last=False)
+            self.size -= len(evicted)
+
+    def replay(self, not_modified: httpx.Response) -> Optional[httpx.Response]:
+        # None if nothing matching is stored for the request that got the 304
+        request = not_modified.request
+        entry = self._entry(request)
+        if entry is None:
+            return None
+        # A 304 may update headers such as Date or a new ETag; the body stays the cached one
+        varied, headers, content = entry
+        headers = {**headers, **{name: value for name, value in not_modified.headers.items() if name not in _UNCACHED_HEADERS}}
+        key = str(request.url)
+        self.entries[key] = (varied, headers, content)
+        self.entries.move_to_end(key)
+        return httpx.Response(200, headers=headers, content=content, request=request, extensions={"revalidated": True})
+
+    def discard(self, url: str):
+        entry = self.entries.pop(url, None)
+        if entry is not None:
+            self.size -= len(entry[2])
+
+class Fetcher:
+    """HTTP session shared by every scraper on this server.
+
+    One keep-alive httpx.AsyncClient with cached DNS, at most
+    `per_host_limit` requests in flight per target host (overridable in
+    `host_limits`), and GETs revalidated with If-None-Match/If-Modified-Since
+    so unchanged pages come back from memory after a 304.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 200,
+        max_keepalive_connections: int = 50,
+        keepalive_expiry: float = 60.0,
+        connect_timeout: float = 5.0,
+        timeout: float = 30.0,
+        dns_ttl: float = 60.0,
+        per_host_limit: int = 8,
+        host_limits: Optional[Dict[str, int]] = None,
+        cache_entries: int = 1024,
+        cache_bytes: int = 64 * 1024 * 1024,
+        headers: Optional[Dict[str, str]] = None,
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.resolver = CachingResolver(ttl=dns_ttl)
+        self.per_host_limit = per_host_limit
+        self.host_limits = host_limits or {}
+        self.host_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self.cache = ConditionalCache(max_entries=cache_entries, max_bytes=cache_bytes)
+        self.headers = headers or {}
+        self.client: Optional[httpx.AsyncClient] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict]) -> "Fetcher":
+        config = config or {}
+        return cls(
+            max_connections=config.get("max_connections", 200),
+            max_keepalive_connections=config.get("max_keepalive_connections", 50),
+            keepalive_expiry=config.get("keepalive_expiry", 60.0),
+            connect_timeout=config.get("connect_timeout", 5.0),
+            timeout=config.get("timeout", 30.0),
+            dns_ttl=config.get("dns_ttl", 60.0),
+            per_host_limit=config.get("per_host_limit", 8),
+            host_limits=config.get("host_limits"),
+            cache_entries=config.get("cache_entries", 1024),
+            cache_bytes=config.get("cache_bytes", 64 * 1024 * 1024),
+            headers=config.get("headers"),
+        )
+
+    def start(self):
+        # Called from the event loop; fetch_sync() hands requests from scraper threads to this loop
+        self.loop = asyncio.get_running_loop()
+        self.session()
+
+    def session(self) -> httpx.AsyncClient:
+        if self.client is None or self.client.is_closed:
+            self.client = httpx.AsyncClient(
+                transport=ResolvingTransport(self.limits, self.resolver),
+                timeout=self.timeout,
+                headers=self.headers,
+                follow_redirects=True,
+            )
+        return self.client
+
+    def _host_semaphore(self, host: str) -> asyncio.Semaphore:
+        semaphore = self.host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.host_limits.get(host, self.per_host_limit))
+            self.host_semaphores[host] = semaphore
+        return semaphore
+
+    async def fetch(self, url: str, method: str = "GET", **kwargs) -> httpx.Response:
+        """Send a request and read the whole response.
+
+        A GET matching one seen before (same URL and query, same values of
+        the headers it varied on) is sent as a conditional request; on 304
+        the cached body is returned as a 200 with
+        `response.extensions["revalidated"]` set. Passing your own
+        If-None-Match/If-Modified-Since headers bypasses the cache.
+        """
+        client = self.session()
+        send_options = {name: kwargs.pop(name) for name in ("auth", "follow_redirects") if name in kwargs}
+        request = client.build_request(method, url, **kwargs)
+        conditional = request.method == "GET" and "if-none-match" not in request.headers and "if-modified-since" not in request.headers
+        if conditional:
+            request.headers.update(self.cache.validators(request))
+        replayed = None
+        async with self._host_semaphore(request.url.host):
+            response = await client.send(request, **send_options)
+            if conditional and response.status_code == 304:
+                replayed = self.cache.replay(response)
+                if replayed is None:
+                    # Evicted while in flight, or redirected somewhere nothing is stored; the caller didn't ask for a 304
+                    response = await client.send(client.build_request(method, url, **kwargs), **send_options)
+        if not conditional:
+            FETCHES.inc("bypass")
+            return response
+        if replayed is not None:
+            FETCHES.inc("revalidated")
+            return replayed
+        FETCHES.inc("miss")
+        if response.status_code == 200:
+            self.cache.store(response)
+        else:
+            self.cache.discard(str(response.request.url))
+        return response
+
+    async def extract(self, url: str, fields: Dict[str, Union[str, Field]], method: str = "GET", **kwargs) -> Dict[str, object]:
+        """Stream the page through an Extractor and stop reading once every field is found.
+
+        Raises httpx.HTTPStatusError for error statuses. Bypasses the
+        conditional cache, which needs whole bodies; a page abandoned
+        part-way also costs its connection, which can't be reused.
+        """
+        extractor = Extractor(fields)
+        async with self._host_semaphore(urlsplit(url).hostname or ""):
+            async with self.session().stream(method, url, **kwargs) as response:
+                response.raise_for_status()
+                async for text in response.aiter_text():
+                    if extractor.feed(text):
+                        break
+        FETCHES.inc("extract")
+        return extractor.result()
+
+    def _run_sync(self, coroutine):
+        # For "thread" scrapers: runs on the server's event loop so they share its connections
+        if self.loop is None:
+            coroutine.close()
+            raise RuntimeError("Fetcher is not started")
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            coroutine.close()
+            raise RuntimeError("Blocking fetch on the event loop; await fetch() or extract() instead")
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def fetch_sync(self, url: str, method: str = "GET", **kwargs) -> httpx.Response:
+        return self._run_sync(self.fetch(url, method, **kwargs))
+
+    def extract_sync(self, url: str, fields: Dict[str, Union[str, Field]], method: str = "GET", **kwargs) -> Dict[str, object]:
+        return self._run_sync(self.extract(url, fields, method, **kwargs))
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+class ScraperContext:
+    """Handed to scrapers whose run() takes a second argument: run(params, context).
+
+    `state` is what the scraper's setup() built (None if it has no setup),
+    shared by every run of that version of the module.
+    """
+
+    def __init__(self, name: str, fetcher: Optional[Fetcher], state=None):
+        self.name = name
+        self.fetcher = fetcher
+        self.state = state
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        # The raw shared client, for streaming or anything fetch() doesn't cover; no host limits or caching
+        return self.fetcher.session()
+
+    async def fetch(self, url: str, method: str = "GET", **kwargs) -> httpx.Response:
+        return await self.fetcher.fetch(url, method, **kwargs)
+
+    def fetch_sync(self, url: str, method: str = "GET", **kwargs) -> httpx.Response:
+        return self.fetcher.fetch_sync(url, method, **kwargs)
+
+    async def extract(self, url: str, fields: Dict[str, Union[str, Field]], method: str = "GET", **kwargs) -> Dict[str, object]:
+        return await self.fetcher.extract(url, fields, method, **kwargs)
+
+    def extract_sync(self, url: str, fields: Dict[str, Union[str, Field]], method: str = "GET", **kwargs) -> Dict[str, object]:
+        return self.fetcher.extract_sync(url, fields, method, **kwargs)
@@ -0,0 +1,138 @@
+# scraper_server/job_puller.py
+import asyncio
+import httpx
+from typing import Callable, Dict, List, Optional
+from executor import ScraperExecutor, ScraperBusy
+from scraper_manager import ScraperManager
+from common.logging import setup_logging
+
+logger = setup_logging("job_puller")
+
+REPORT_ATTEMPTS = 3
+
+class JobPuller:
+    """Pulls queued jobs from the public server whenever this node has spare capacity."""
+
+    def __init__(self, worker: str, public_server_url: str, scraper_manager: ScraperManager, executor: ScraperExecutor, scraper_filter: Callable[[str], bool], token: Optional[str] = None, batch_size: int = 8, max_running: int = 32, poll_interval: float = 1.0, timeout: float = 10.0):
+        self.worker = worker
+        self.scraper_manager = scraper_manager
+        self.executor = executor
+        self.scraper_filter = scraper_filter
+        self.batch_size = batch_size
+        self.max_running = max_running
+        self.poll_interval = poll_interval
+        # The queue endpoints take the same registry token as /register
+        headers = {"X-Registry-Token": token} if token else {}
+        self.client = httpx.AsyncClient(base_url=public_server_url, headers=headers, timeout=timeout)
+        self.running: Dict[str, asyncio.Task] = {}
+        self.returned = 0  # Claimed jobs given back to the queue without being started
+        self.lease_seconds = 300.0
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._pull_loop()), asyncio.create_task(self._lease_loop())]
+
+    async def stop(self):
+        for task in self._tasks + list(self.running.values()):
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self.running.values(), return_exceptions=True)
+        self._tasks = []
+        await self.client.aclose()
+
+    def scrapers(self) -> List[str]:
+        # Scrapers at their concurrency limit are left out, so their jobs stay queued for other nodes
+        return [
+            name for name in self.scraper_manager.scrapers
+            if self.scraper_filter(name) and not self.executor.saturated(name)
+        ]
+
+    def capacity(self) -> int:
+        return min(self.batch_size, self.max_running - len(self.running), self.executor.free_slots())
+
+    async def _pull_loop(self):
+        while True:
+            capacity = self.capacity()
+            claimed = 0
+            returned = self.returned
+            if capacity > 0:
+                try:
+                    claimed = await self._claim(capacity)
+                except httpx.HTTPError as e:
+                    logger.warning(f"Failed to claim jobs: {e}")
+                # One pass of the event loop lets the claimed jobs reach the executor, which turns away busy ones at once
+                await asyncio.sleep(0)
+            # Claim again straight away only after a full round that all started; otherwise wait
+            # instead of spinning on /jobs/claim while the queue is empty or this node is saturated
+            if claimed < capacity or capacity <= 0 or self.returned != returned:
+                await asyncio.sleep(self.poll_interval)
+
+    async def _claim(self, capacity: int) -> int:
+        scrapers = self.scrapers()
+        if not scrapers:
+            return 0
+        response = await self.client.post("/jobs/claim", json={
+            "worker": self.worker,
+            "scrapers": scrapers,
+            "max_jobs": capacity,
+        })
+        response.raise_for_status()
+        body = response.json()
+        self.lease_seconds = body.get("lease_seconds", self.lease_seconds)
+        for job in body["jobs"]:
+            task = asyncio.create_task(self._run_job(job))
+            self.running[job["id"]] = task
+            task.add_done_callback(lambda _, job_id=job["id"]: self.running.pop(job_id, None))
+        return len(body["jobs"])
+
+    async def _run_job(self, job: Dict):
+        result: Dict = {"worker": self.worker}
+        scraper = self.scraper_manager.get_scraper(job["scraper_name"])
+        if scraper is None:
+            self.returned += 1
+            result.update(status="retry")
+        else:
+            try:
+                data = await self.executor.run(job["scraper_name"], scraper, job["params"])
+                result.update(status="success", data=data)
+            except ScraperBusy:
+                self.returned += 1
+                result.update(status="retry")
+            except Exception as e:
+                logger.error(f"Queued job {job['id']} failed in {job['scraper_name']}: {e}")
+                result.update(status="error", error=str(e))
+        await self._report(job["id"], result)
+
+    async def _report(self, job_id: str, result: Dict):
+        # Retried while the lease loop keeps the job ours; left to lease expiry if it never gets through
+        for attempt in range(REPORT_ATTEMPTS):
+            try:
+                response = await self.client.post(f"/jobs/{job_id}/complete", json=result)
+            except httpx.HTTPError as e:
+                logger.error(f"Failed to report job {job_id}: {e}")
+            else:
+                if response.is_success:
+                    return
+                if response.status_code == 409:
+                    logger.warning(f"Lease for job {job_id} was lost before completion")
+                    return
+                logger.error(f"Public server refused the result of job {job_id}: {response.status_code} {response.text[:200]}")
+                if response.status_code < 500:
+                    if result["status"] == "error":
+                        return
+                    # Sending the same result again won't help; fail the job instead of leaving it running
+                    result = {"worker": self.worker, "status": "error", "error": f"Result rejected by the public server ({response.status_code})"}
+                    continue
+            await asyncio.sleep(min(2 ** attempt, 30))
+        logger.error(f"Gave up reporting job {job_id}; it is requeued when its lease expires")
+
+    async def _lease_loop(self):
+        # Renew leases well before they expire so long scrapes are not handed to another worker
+        while True:
+            await asyncio.sleep(max(self.lease_seconds / 3, 1.0))
+            if not self.running:
+                continue
+            try:
+                await self.client.post("/jobs/extend", json={"worker": self.worker, "job_ids": list(self.running)})
+            except httpx.HTTPError as e:
+                logger.warning(f"Failed to extend job leases: {e}")
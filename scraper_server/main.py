@@ -0,0 +1,269 @@
+# scraper_server/main.py
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from contextlib import asynccontextmanager
+from typing import Any, List
+import asyncio
+from scraper_manager import ScraperManager
+from executor import ScraperExecutor, ScraperBusy
+from fetcher import Fetcher
+from job_puller import JobPuller
+from registration import Registrar
+from common.readiness import Readiness
+from common.telemetry import LoadSampler
+from common.serialization import JSONResponse, ndjson_line
+from common.metrics import CONTENT_TYPE, registry, server_timing
+import json
+import os
+import time
+import uvicorn
+from common.logging import setup_logging
+
+# Setup logging
+logger = setup_logging("scraper_server")
+
+# Load configuration; every node runs this same code, run.py (or the environment) says which node it is
+CONFIG_PATH = os.environ.get("SCRAPER_SERVER_CONFIG", os.path.join(os.path.dirname(__file__), 'config.json'))
+with open(CONFIG_PATH) as f:
+    config = json.load(f)
+
+# os.pathsep-separated, searched in order; the scrapers themselves are loaded in the lifespan
+SCRAPER_DIRS = os.environ.get("SCRAPER_DIRS", os.path.join(os.path.dirname(__file__), '..', 'scrapers')).split(os.pathsep)
+scraper_manager = ScraperManager(
+    scraper_directories=SCRAPER_DIRS,
+    reload_interval=config["scraper_server"].get("reload_interval", 2.0)
+)
+
+# Keep-alive HTTP session, DNS cache and conditional-request cache shared by the scrapers
+fetcher = Fetcher.from_config(config["scraper_server"].get("http"))
+executor = ScraperExecutor.from_config(config["scraper_server"].get("executor"), fetcher=fetcher, scraper_manager=scraper_manager)
+
+SERVER_CONFIG = config["scraper_server"]
+readiness = Readiness(SERVER_CONFIG["name"], target=SERVER_CONFIG.get("startup_target"))
+ALLOWED_SCRAPERS = SERVER_CONFIG.get("allowed_scrapers", ["all"])
+PUBLIC_SERVER_URL = f"http://{SERVER_CONFIG['public_server']['ip']}:{SERVER_CONFIG['public_server']['port']}"
+
+def is_allowed(scraper_name: str) -> bool:
+    return "all" in ALLOWED_SCRAPERS or scraper_name in ALLOWED_SCRAPERS
+
+def allowed_scraper(scraper_name: str):
+    # Nodes share the scraper directories; each one serves only its allowed_scrapers
+    return scraper_manager.get_scraper(scraper_name) if is_allowed(scraper_name) else None
+
+# Pulls asynchronous jobs from the public server's queue
+JOB_QUEUE_CONFIG = SERVER_CONFIG.get("job_queue", {})
+REGISTRATION_CONFIG = SERVER_CONFIG.get("registration", {})
+job_puller = JobPuller(
+    worker=SERVER_CONFIG["name"],
+    public_server_url=PUBLIC_SERVER_URL,
+    scraper_manager=scraper_manager,
+    executor=executor,
+    scraper_filter=is_allowed,
+    token=REGISTRATION_CONFIG.get("token"),
+    batch_size=JOB_QUEUE_CONFIG.get("batch_size", 8),
+    max_running=JOB_QUEUE_CONFIG.get("max_running", 32),
+    poll_interval=JOB_QUEUE_CONFIG.get("poll_interval", 1.0)
+)
+
+# CPU/memory are sampled in the background so /load never blocks
+load_sampler = LoadSampler(interval=config["scraper_server"].get("telemetry_interval", 1.0))
+
+def loaded_scrapers() -> List[str]:
+    return sorted(name for name in scraper_manager.scrapers if is_allowed(name))
+
+def scraper_options(scraper) -> dict:
+    # Per-scraper settings the public server needs for caching, retries and hedging
+    return {
+        "cache_ttl": getattr(scraper, "CACHE_TTL", 0),
+        "idempotent": bool(getattr(scraper, "IDEMPOTENT", False))
+    }
+
+def telemetry() -> dict:
+    # Sent with heartbeats and served on /load; the public server only routes to ready servers
+    return {**load_sampler.snapshot(), "ready": readiness.ready}
+
+def server_info() -> dict:
+    scrapers = loaded_scrapers()
+    return {
+        "name": SERVER_CONFIG["name"],
+        "ip": SERVER_CONFIG["ip"],
+        "port": SERVER_CONFIG["port"],
+        "scrapers": scrapers,
+        "weight": SERVER_CONFIG.get("weight", 1.0),
+        "scraper_options": {name: scraper_options(scraper_manager.get_scraper(name)) for name in scrapers}
+    }
+
+# Metrics exposed on /metrics; scrape latency is recorded by the executor
+registry.gauge("executor_in_flight_jobs", "Scraper jobs running on this server", function=lambda: executor.in_flight)
+registry.gauge("scrapers_loaded", "Scrapers loaded and allowed on this server", function=lambda: len(loaded_scrapers()))
+registry.gauge("server_cpu_percent", "Sampled CPU usage", function=lambda: load_sampler.snapshot()["cpu"])
+registry.gauge("server_memory_percent", "Sampled memory usage", function=lambda: load_sampler.snapshot()["memory"])
+
+# Advertises the scrapers this server actually loaded to the public server's registry
+registrar = Registrar(
+    public_server_url=PUBLIC_SERVER_URL,
+    server_info=server_info,
+    telemetry=telemetry,
+    scrapers=loaded_scrapers,
+    token=REGISTRATION_CONFIG.get("token"),
+    worker=str(os.getpid()),
+    heartbeat_interval=REGISTRATION_CONFIG.get("heartbeat_interval", 2.0)
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    load_sampler.start()
+    fetcher.start()
+    with readiness.phase("load_scrapers"):
+        await asyncio.to_thread(scraper_manager.load_scrapers)
+    # Scrapers' setup() hooks run before this node registers or pulls jobs
+    with readiness.phase("warm_up"):
+        await scraper_manager.warm_up()
+    scraper_manager.start_watcher()
+    readiness.mark_ready()
+    if REGISTRATION_CONFIG.get("enabled", True):
+        registrar.start()
+    if JOB_QUEUE_CONFIG.get("enabled", True):
+        job_puller.start()
+    yield
+    readiness.mark_not_ready()
+    await job_puller.stop()
+    await registrar.stop()
+    scraper_manager.stop_watcher()
+    load_sampler.stop()
+    executor.shutdown()
+    await scraper_manager.shut_down()
+    await fetcher.close()
+
+app = FastAPI(lifespan=lifespan)
+
+# Pydantic Models
+class ScrapeRequest(BaseModel):
+    scraper_name: str
+    params: dict
+
+class ScrapeResponse(BaseModel):
+    status: str
+    data: Any  # A dict, or the list of records a generator scraper yielded
+
+class BatchJob(BaseModel):
+    id: str
+    params: dict
+
+class ScrapeBatchRequest(BaseModel):
+    scraper_name: str
+    jobs: List[BatchJob]
+
+@app.post("/scrape", response_model=ScrapeResponse)
+async def scrape(request: ScrapeRequest, response: Response):
+    scraper = allowed_scraper(request.scraper_name)
+    if not scraper:
+        logger.warning(f"Scraper {request.scraper_name} not found")
+        raise HTTPException(status_code=404, detail="Scraper not found")
+    # Lets the public server cache results of scrapers that opt in with CACHE_TTL
+    response.headers["X-Cache-TTL"] = str(getattr(scraper, "CACHE_TTL", 0))
+    try:
+        started = time.perf_counter()
+        with load_sampler.track():
+            result = await executor.run(request.scraper_name, scraper, request.params)
+        # Lets the public server (and benchmarks) split upstream time into network and scraping
+        response.headers["Server-Timing"] = server_timing({"scrape": time.perf_counter() - started})
+        logger.debug("Scraped data using %s", request.scraper_name)
+        return {"status": "success", "data": result}
+    except ScraperBusy as e:
+        # Fail fast so the public server can route the job to another node
+        logger.warning(f"Rejected job for {request.scraper_name}: {e}")
+        return JSONResponse(status_code=e.status_code, content={"detail": str(e)}, headers={"Retry-After": "1"})
+    except Exception as e:
+        logger.error(f"Error executing scraper {request.scraper_name}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/scrape_batch")
+async def scrape_batch(request: ScrapeBatchRequest):
+    scraper = allowed_scraper(request.scraper_name)
+    if not scraper:
+        logger.warning(f"Scraper {request.scraper_name} not found")
+        raise HTTPException(status_code=404, detail="Scraper not found")
+
+    async def run_job(job: BatchJob) -> dict:
+        try:
+            with load_sampler.track():
+                data = await executor.run(request.scraper_name, scraper, job.params, wait=True)
+            return {"id": job.id, "status": "success", "data": data}
+        except Exception as e:
+            logger.error(f"Error executing scraper {request.scraper_name} for batch job {job.id}: {e}")
+            return {"id": job.id, "status": "error", "error": str(e)}
+
+    async def results():
+        # One NDJSON line per job, in completion order
+        tasks = [asyncio.create_task(run_job(job)) for job in request.jobs]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield ndjson_line(await finished)
+        finally:
+            for task in tasks:
+                task.cancel()
+        logger.debug("Scraped batch of %d jobs using %s", len(tasks), request.scraper_name)
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+@app.post("/scrape_stream")
+async def scrape_stream(request: ScrapeRequest):
+    scraper = allowed_scraper(request.scraper_name)
+    if not scraper:
+        logger.warning(f"Scraper {request.scraper_name} not found")
+        raise HTTPException(status_code=404, detail="Scraper not found")
+    records = executor.stream(request.scraper_name, scraper, request.params)
+    # Wait for the first record so saturation and startup errors still get a proper status code
+    try:
+        with load_sampler.track():
+            first = [await records.__anext__()]
+    except StopAsyncIteration:
+        first = []
+    except ScraperBusy as e:
+        logger.warning(f"Rejected job for {request.scraper_name}: {e}")
+        return JSONResponse(status_code=e.status_code, content={"detail": str(e)}, headers={"Retry-After": "1"})
+    except Exception as e:
+        logger.error(f"Error executing scraper {request.scraper_name}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def lines():
+        # One NDJSON line per record; a failure after the first record ends the stream with an error line
+        count = len(first)
+        try:
+            with load_sampler.track():
+                for record in first:
+                    yield ndjson_line(record)
+                async for record in records:
+                    count += 1
+                    yield ndjson_line(record)
+            logger.debug("Streamed %d records using %s", count, request.scraper_name)
+        except Exception as e:
+            logger.error(f"Error streaming scraper {request.scraper_name}: {e}")
+            yield ndjson_line({"status": "error", "error": str(e)})
+        finally:
+            await records.aclose()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@app.get("/load")
+async def get_load():
+    return telemetry()
+
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    return JSONResponse(readiness.status(), status_code=200 if readiness.ready else 503)
+
+@app.get("/metrics")
+async def metrics():
+    return Response(content=registry.render(), media_type=CONTENT_TYPE)
+
+if __name__ == "__main__":
+    # Single process; run.py adds CLI options and multi-worker mode.
+    # Per-request access logs (including every /load poll) are off by default
+    uvicorn.run(app, host=SERVER_CONFIG["ip"], port=SERVER_CONFIG["port"], access_log=SERVER_CONFIG.get("access_log", False))
@@ -0,0 +1,85 @@
+# scraper_server/registration.py
+import asyncio
+import httpx
+from typing import Callable, Dict, List, Optional
+from common.logging import setup_logging
+
+logger = setup_logging("registration")
+
+class Registrar:
+    """Registers this scraper server with the public server and keeps it alive with heartbeats.
+
+    Heartbeats carry the current telemetry and scraper list, so the balancer
+    learns about hot-reloaded scrapers without a restart. `worker` tells the
+    worker processes of one node apart: the balancer combines their
+    telemetry and keeps the node until the last of them deregisters.
+    """
+
+    def __init__(self, public_server_url: str, server_info: Callable[[], Dict], telemetry: Callable[[], Dict], scrapers: Callable[[], List[str]], token: Optional[str] = None, worker: Optional[str] = None, heartbeat_interval: float = 2.0, timeout: float = 5.0):
+        self.server_info = server_info
+        self.telemetry = telemetry
+        self.scrapers = scrapers
+        self.worker = worker
+        self.heartbeat_interval = heartbeat_interval
+        headers = {"X-Registry-Token": token} if token else {}
+        self.client = httpx.AsyncClient(base_url=public_server_url, headers=headers, timeout=timeout)
+        self.registered = False
+        self._task: Optional[asyncio.Task] = None
+
+    async def register(self) -> bool:
+        try:
+            response = await self.client.post("/register", json={**self.server_info(), "telemetry": self.telemetry(), "worker": self.worker})
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            logger.warning(f"Registration with public server failed: {e}")
+            return False
+        logger.info("Registered with public server")
+        return True
+
+    async def heartbeat(self) -> bool:
+        response = await self.client.post("/heartbeat", json={
+            "name": self.server_info()["name"],
+            "telemetry": self.telemetry(),
+            "scrapers": self.scrapers(),
+            "worker": self.worker,
+        })
+        if response.status_code == 404:
+            return False
+        response.raise_for_status()
+        return True
+
+    async def _run(self):
+        delay = self.heartbeat_interval
+        while True:
+            try:
+                if self.registered and not await self.heartbeat():
+                    logger.warning("Public server no longer knows this server, registering again")
+                    self.registered = False
+                if not self.registered:
+                    self.registered = await self.register()
+            except httpx.HTTPError as e:
+                logger.warning(f"Heartbeat failed: {e}")
+            except Exception as e:
+                # Keep the loop alive; a dead task would silently drop the server from the balancer
+                logger.error(f"Registration loop error: {e}")
+            # Back off while the public server is unreachable, up to 30 s
+            delay = self.heartbeat_interval if self.registered else min(delay * 2, 30.0)
+            await asyncio.sleep(delay)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.registered:
+            try:
+                await self.client.post("/deregister", json={"name": self.server_info()["name"], "worker": self.worker})
+                logger.info("Deregistered from public server")
+            except httpx.HTTPError as e:
+                logger.warning(f"Deregistration failed: {e}")
+            self.registered = False
+        await self.client.aclose()
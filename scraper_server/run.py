@@ -0,0 +1,48 @@
+# scraper_server/run.py
+"""Starts one scraper server node.
+
+    PYTHONPATH=.. python run.py --config ../config/scraper_server_1_config.json [--workers 4] [--scraper-dir ../scrapers]
+
+Options fall back to the environment (SCRAPER_SERVER_CONFIG, SCRAPER_DIRS,
+SCRAPER_SERVER_WORKERS) and then to the node config ("workers"). They are
+handed to main.py through the environment, so with --workers N each of
+uvicorn's worker processes (all accepting on one shared socket) loads the
+same config and builds its own ScraperManager, executor and job puller.
+Every worker registers and heartbeats under the node's name with its pid
+as worker id; the public server combines their telemetry into one server
+and keeps it until the last worker deregisters.
+"""
+import argparse
+import json
+import os
+import uvicorn
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--config", default=os.environ.get("SCRAPER_SERVER_CONFIG"), help="Node config file")
+    parser.add_argument("--scraper-dir", action="append", dest="scraper_dirs", help="Scraper directory; may be repeated, earlier ones win")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: config \"workers\", or 1)")
+    parser.add_argument("--host", default=None, help="Address to bind (default: the node's configured ip)")
+    args = parser.parse_args()
+    if not args.config:
+        parser.error("--config or SCRAPER_SERVER_CONFIG is required")
+
+    config_path = os.path.abspath(args.config)
+    with open(config_path) as f:
+        server_config = json.load(f)["scraper_server"]
+    os.environ["SCRAPER_SERVER_CONFIG"] = config_path
+    if args.scraper_dirs:
+        os.environ["SCRAPER_DIRS"] = os.pathsep.join(os.path.abspath(path) for path in args.scraper_dirs)
+    workers = args.workers or int(os.environ.get("SCRAPER_SERVER_WORKERS", 0)) or server_config.get("workers", 1)
+
+    uvicorn.run(
+        "main:app",
+        app_dir=os.path.dirname(os.path.abspath(__file__)),
+        host=args.host or server_config["ip"],
+        port=server_config["port"],
+        workers=workers,
+        access_log=server_config.get("access_log", False)
+    )
+
+if __name__ == "__main__":
+    main()
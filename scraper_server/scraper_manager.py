@@ -0,0 +1,283 @@
+# scraper_server/scraper_manager.py
+import asyncio
+import hashlib
+import importlib.util
+import inspect
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from types import ModuleType
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from extraction import declarative_run
+from common.logging import setup_logging
+
+logger = setup_logging("scraper_manager")
+
+class ScraperState:
+    """Whatever a scraper's setup(state) builds for its runs: compiled patterns, lookup tables, sessions.
+
+    One per loaded version of a module; run(params, context) sees it as context.state.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+class ScraperManager:
+    """Registry of scraper modules, loaded once and refreshed only when files change.
+
+    Every version of a scraper is executed into a fresh module object and swapped
+    into `self.scrapers` by rebinding the dict, so lookups never touch the
+    filesystem and jobs that already hold the old module keep running on it.
+    Scrapers are read from one or more directories; if two directories have a
+    scraper with the same name, the earlier directory wins. Nothing is loaded
+    until load_scrapers(), which the server calls from its lifespan.
+
+    Modules may define `setup(state)` and `teardown(state)`, plain or async.
+    warm_up() runs every setup before the server takes traffic; after that a
+    new version is set up before it is swapped in, and is dropped, leaving the
+    old one serving, if setup fails. A replaced or removed version is torn
+    down once the last job using it (see using()) finishes.
+    """
+
+    def __init__(self, scraper_directories: List[str], reload_interval: float = 2.0, debounce: float = 1.0):
+        self.scraper_directories = scraper_directories
+        self.reload_interval = reload_interval
+        self.debounce = debounce
+        self.scrapers: Dict[str, ModuleType] = {}
+        self._signatures: Dict[str, Tuple[float, int]] = {}  # module name -> (mtime, size) last seen
+        self._hashes: Dict[str, str] = {}  # module name -> sha256 of the loaded source
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+        self.states: Dict[ModuleType, ScraperState] = {}
+        self._active: Dict[ModuleType, int] = {}  # Jobs running per module version
+        self._retired: Set[ModuleType] = set()  # Replaced, torn down when their last job ends
+        self._states_lock = threading.Lock()
+        # Hooks run off the event loop, one at a time except during warm_up()
+        self._hooks = ThreadPoolExecutor(max_workers=1, thread_name_prefix="scraper-hooks")
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.warmed_up = False
+        sys.path.extend(scraper_directories)
+
+    def _scan(self) -> Dict[str, Tuple[str, Tuple[float, int]]]:
+        found = {}
+        for directory in self.scraper_directories:
+            try:
+                filenames = os.listdir(directory)
+            except FileNotFoundError:
+                logger.warning(f"Scraper directory {directory} does not exist")
+                continue
+            for filename in filenames:
+                if filename.endswith(".py") and not filename.startswith("__") and filename[:-3] not in found:
+                    path = os.path.join(directory, filename)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    found[filename[:-3]] = (path, (stat.st_mtime, stat.st_size))
+        return found
+
+    def load_scrapers(self, max_workers: int = 8):
+        # Modules are read and executed in parallel, so scrapers with slow imports don't queue behind each other
+        logger.info("Loading scrapers...")
+        with self._lock:
+            found = self._scan()
+            if found:
+                with ThreadPoolExecutor(max_workers=min(max_workers, len(found)), thread_name_prefix="scraper-load") as pool:
+                    loaded = list(pool.map(lambda item: self._execute(item[0], item[1][0]), found.items()))
+                for (module_name, (_, signature)), result in zip(found.items(), loaded):
+                    self._signatures[module_name] = signature
+                    if result is not None:
+                        self._install(module_name, *result)
+        logger.info(f"Loaded {len(self.scrapers)} of {len(found)} scrapers")
+
+    def _execute(self, module_name: str, path: str) -> Optional[Tuple[ModuleType, str]]:
+        # (module, source digest), or None if unchanged or broken; touches no shared state
+        try:
+            with open(path, "rb") as f:
+                source = f.read()
+            digest = hashlib.sha256(source).hexdigest()
+            if self._hashes.get(module_name) == digest and module_name in self.scrapers:
+                return None  # Touched but not modified
+            spec = importlib.util.spec_from_file_location(module_name, path)
+            module = importlib.util.module_from_spec(spec)
+            exec(compile(source, path, "exec"), module.__dict__)
+            if not hasattr(module, "run") and hasattr(module, "FIELDS"):
+                # Declares only URL and FIELDS; the generated run() awaits the server's Fetcher on its event loop
+                if getattr(module, "MODE", "async") != "async":
+                    raise ValueError(f'a FIELDS-only scraper runs as MODE = "async", not {module.MODE!r}; define run() to use another mode')
+                module.run = declarative_run(module)
+        except Exception as e:
+            logger.error(f"Error loading scraper {module_name}: {e}")
+            return None
+        return module, digest
+
+    def load_scraper(self, module_name: str, path: str) -> bool:
+        result = self._execute(module_name, path)
+        if result is None:
+            return False
+        module, digest = result
+        if self.warmed_up and not self._set_up(module_name, module):
+            return False
+        self._install(module_name, module, digest)
+        return True
+
+    def _install(self, module_name: str, module: ModuleType, digest: str):
+        previous = self.scrapers.get(module_name)
+        scrapers = dict(self.scrapers)
+        scrapers[module_name] = module
+        self.scrapers = scrapers  # Atomic swap; readers see either the old or the new dict
+        self._hashes[module_name] = digest
+        logger.info(f"Loaded scraper: {module_name}")
+        if previous is not None:
+            self._retire(previous)
+
+    def unload_scraper(self, module_name: str):
+        previous = self.scrapers.get(module_name)
+        scrapers = dict(self.scrapers)
+        scrapers.pop(module_name, None)
+        self.scrapers = scrapers
+        self._hashes.pop(module_name, None)
+        self._signatures.pop(module_name, None)
+        logger.info(f"Unloaded scraper: {module_name}")
+        if previous is not None:
+            self._retire(previous)
+
+    def _run_hook(self, module: ModuleType, hook_name: str, state: ScraperState):
+        # Called from a hooks or watcher thread; async hooks run on the server's event loop
+        hook = getattr(module, hook_name, None)
+        if hook is None:
+            return
+        if inspect.iscoroutinefunction(hook):
+            if self.loop is None:
+                raise RuntimeError(f"async {hook_name}() needs warm_up() to have run on the event loop")
+            asyncio.run_coroutine_threadsafe(hook(state), self.loop).result()
+        else:
+            hook(state)
+
+    def _set_up(self, module_name: str, module: ModuleType) -> bool:
+        state = ScraperState(module_name)
+        started = time.perf_counter()
+        try:
+            self._run_hook(module, "setup", state)
+        except Exception as e:
+            logger.error(f"Setup of scraper {module_name} failed: {e}")
+            return False
+        with self._states_lock:
+            self.states[module] = state
+        if hasattr(module, "setup"):
+            logger.info(f"Set up scraper {module_name} in {(time.perf_counter() - started) * 1000:.0f} ms")
+        return True
+
+    def _tear_down(self, module: ModuleType):
+        with self._states_lock:
+            state = self.states.pop(module, None)
+        if state is None:
+            return
+        try:
+            self._run_hook(module, "teardown", state)
+        except Exception as e:
+            logger.error(f"Teardown of scraper {state.name} failed: {e}")
+
+    def _retire(self, module: ModuleType):
+        with self._states_lock:
+            if module not in self.states:
+                return
+            if self._active.get(module):
+                self._retired.add(module)
+                return
+        self._tear_down(module)
+
+    @contextmanager
+    def using(self, module: ModuleType) -> Iterator[Optional[ScraperState]]:
+        # Held by the executor around each job so a replaced version isn't torn down under it
+        with self._states_lock:
+            state = self.states.get(module)
+            if state is not None:
+                self._active[module] = self._active.get(module, 0) + 1
+        try:
+            yield state
+        finally:
+            if state is not None:
+                with self._states_lock:
+                    remaining = self._active.pop(module) - 1
+                    if remaining:
+                        self._active[module] = remaining
+                    idle_and_retired = not remaining and module in self._retired
+                    if idle_and_retired:
+                        self._retired.discard(module)
+                if idle_and_retired:
+                    self._hooks.submit(self._tear_down, module)
+
+    async def warm_up(self):
+        # Sets up every loaded scraper before the server advertises itself; call before start_watcher()
+        self.loop = asyncio.get_running_loop()
+        await self.loop.run_in_executor(self._hooks, self._set_up_all)
+
+    def _set_up_all(self):
+        with self._lock:
+            pending = [(name, module) for name, module in self.scrapers.items() if module not in self.states]
+            if pending:
+                with ThreadPoolExecutor(max_workers=min(8, len(pending)), thread_name_prefix="scraper-setup") as pool:
+                    results = list(pool.map(lambda item: self._set_up(*item), pending))
+                for (name, _), ok in zip(pending, results):
+                    if not ok:
+                        # Not served; the file isn't retried until it changes
+                        scrapers = dict(self.scrapers)
+                        scrapers.pop(name, None)
+                        self.scrapers = scrapers
+                        self._hashes.pop(name, None)
+            self.warmed_up = True
+
+    async def shut_down(self):
+        # Tears down every version still loaded or waiting on jobs; stop the watcher first
+        await asyncio.get_running_loop().run_in_executor(self._hooks, self._tear_down_all)
+        self._hooks.shutdown(wait=False)
+
+    def _tear_down_all(self):
+        with self._lock:
+            with self._states_lock:
+                modules = list(self.states)
+                self._retired.clear()
+            for module in modules:
+                self._tear_down(module)
+
+    def refresh(self):
+        # Reload only files whose (mtime, size) changed and then stayed put for `debounce` seconds
+        with self._lock:
+            found = self._scan()
+            now = time.time()
+            for module_name, (path, signature) in found.items():
+                if self._signatures.get(module_name) == signature:
+                    continue
+                if now - signature[0] < self.debounce:
+                    continue  # Still being written; pick it up on a later pass
+                self._signatures[module_name] = signature
+                self.load_scraper(module_name, path)
+            for module_name in set(self.scrapers) - set(found):
+                self.unload_scraper(module_name)
+
+    def _watch(self):
+        while not self._stop.wait(self.reload_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Scraper refresh failed: {e}")
+
+    def start_watcher(self):
+        if self._watcher is None and self.reload_interval > 0:
+            self._stop.clear()
+            self._watcher = threading.Thread(target=self._watch, name="scraper-watcher", daemon=True)
+            self._watcher.start()
+
+    def stop_watcher(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=self.reload_interval * 2)
+            self._watcher = None
+
+    def get_scraper(self, name: str):
+        return self.scrapers.get(name)
@@ -1,5 +0,0 @@
-# scraper_server_X/scrapers/scraper_a.py
-def run(params):
-    # Implement scraping logic here
-    # Placeholder implementation
-    return {"status": "success", "data": None}
@@ -0,0 +1,11 @@
+# scrapers/scraper_a.py
+MODE = "thread"  # "async", "thread" or "process"
+CONCURRENCY = 16  # Jobs at once on one server
+CACHE_TTL = 300  # Seconds results may be cached
+IDEMPOTENT = True  # May be retried or hedged
+
+# Optional: def setup(state) / def teardown(state), and run(params, context) for context.fetch_sync(url)
+def run(params):
+    # Implement scraping logic here
+    # Placeholder implementation
+    return {"status": "success", "data": None}
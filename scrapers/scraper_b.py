@@ -1,4 +1,4 @@
-# scraper_server_X/scrapers/scraper_b.py
+# scrapers/scraper_b.py
 def run(params):
     # Implement scraping logic here
     # Placeholder implementation
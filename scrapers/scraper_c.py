@@ -1,4 +1,4 @@
-# scraper_server_X/scrapers/scraper_c.py
+# scrapers/scraper_c.py
 def run(params):
     # Implement scraping logic here
     # Placeholder implementation